@@ -7,393 +7,1353 @@ from langchain.prompts import PromptTemplate
 from langchain_community.vectorstores import FAISS
 from langchain.schema import Document
 from langchain.tools import Tool
-import json
-
+from bson import ObjectId
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pymongo import AsyncMongoClient
+from pymongo.errors import PyMongoError
+import asyncio
+import gc
+import threading
+import time
+
+import numpy as np
 import os
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
+from agent_limits import AgentLimiter
+from agent_stream import astream_agent, preview_output
+from answer_cache import AnswerCache, index_fingerprint
+from reviews import document_hash, review_doc_id, review_to_document
+from embedding_batcher import EmbeddingBatcher
+from embedding_cache import CachedEmbeddings, aembed_queries, embed_queries
+from ann_index import (
+    compact_overlay,
+    index_kind,
+    reconstruct_documents,
+    reconstruct_rows,
+    remove_documents,
+)
+from ingest import fork_vector_store, ingest_documents
+from intent_router import IntentRouter
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from query_cache import QueryCache, normalize_query
+from reindex_jobs import ReindexJobs
+from search_batcher import SearchBatcher
+from shared_index import BuilderLock
+from single_flight import SingleFlight
+from teacher_index import TeacherIndex, blend_scores, cosine_relevance, rating_quality
+from tool_results import (
+    InvalidArgumentError,
+    NotFoundError,
+    NotReadyError,
+    Recommendations,
+    ReviewSearch,
+    TeacherReviews,
+    ToolError,
+    as_atext,
+    as_text,
+    tool_errors,
+)
+from themes import LEXICON, is_stale, review_themes, theme_features
+from vector_search import (
+    FilterColumnsCache,
+    normalize_filters,
+    search_by_vectors,
+    search_rows,
+)
+from teacher_stats import (
+    STATS_COLLECTION,
+    TeacherStatsDelta,
+    aget_teacher_stats,
+    ensure_indexes as ensure_teacher_stats_indexes,
+    get_teacher_stats,
+)
+from settings import (
+    AGENT_MAX_IN_FLIGHT,
+    AGENT_MAX_QUEUE,
+    AGENT_TIMEOUT,
+    ANSWER_CACHE_MAX_ENTRIES,
+    ANSWER_CACHE_PATH,
+    ANSWER_CACHE_SIMILARITY,
+    ANSWER_CACHE_TTL,
+    BM25_B,
+    BM25_K1,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_MODEL,
+    HYBRID_CANDIDATES,
+    HYBRID_EMBED_TIMEOUT,
+    HYBRID_RRF_K,
+    INGEST_BATCH_SIZE,
+    INGEST_CONCURRENCY,
+    INGEST_MAX_RETRIES,
+    INGEST_RATE_LIMIT,
+    QUERY_EMBED_BATCH_MAX,
+    QUERY_EMBED_BATCH_WINDOW_MS,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_CACHE_TTL,
+    REINDEX_JOB_HISTORY,
+    RESULT_CACHE_SIZE,
+    RESULT_CACHE_TTL,
+    REVIEWS_UPDATED_FIELD,
+    REVIEWS_DELETE_SCAN_INTERVAL,
+    ROUTER_ENABLED,
+    ROUTER_SEMANTIC_THRESHOLD,
+    SEARCH_MODE,
+    SHARED_INDEX,
+    SHARED_INDEX_POLL_INTERVAL,
+    SYNC_WORKERS,
+    TEACHER_REVIEWS_MAX_PAGE_SIZE,
+    TEACHER_REVIEWS_PAGE_SIZE,
+    VECTOR_SNAPSHOT_DIR,
+)
+import snapshot
+
 load_dotenv(".env")
 
 # Initialize components
 search_tool = TavilySearch(max_results=1)
-db = MongoDBDatabase.from_connection_string(
-    os.environ.get("MONGODB_URI", None), database="graidea"
-)
-
-# Debug: Print database object attributes
-print("MongoDBDatabase object attributes:")
-print(f"  Type: {type(db)}")
-print(f"  Dir: {[attr for attr in dir(db) if not attr.startswith('_')]}")
-if hasattr(db, 'database_name'):
-    print(f"  database_name: {db.database_name}")
-if hasattr(db, '_client'):
-    print(f"  _client: {type(db._client)}")
 
 llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.2)
-embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-db_tools = MongoDBDatabaseToolkit(llm=llm, db=db).get_tools()
+embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL)
+if EMBEDDING_CACHE_PATH:
+    embeddings = CachedEmbeddings(
+        embeddings,
+        model=EMBEDDING_MODEL,
+        path=EMBEDDING_CACHE_PATH,
+        max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+    )
+
+# Everything that needs MongoDB is created by initialize(), so importing this
+# module stays cheap and the API can bind its port before warming up
+db = None
+db_tools = []
+all_tools = []
+agent = None
+agent_executor = None
+async_client = None  # created on first use inside the event loop
+
+# Bounded pool for the work that is still synchronous (FAISS search, ingest)
+sync_executor = ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix="agent-sync")
+
+# Warmup progress reported by the API's /ready endpoint
+readiness = {
+    "status": "starting",  # starting -> warming_up -> ready | failed
+    "phase": None,
+    "progress": None,
+    "error": None,
+    "started_at": None,
+    "ready_at": None,
+}
 
 # Initialize in-memory vector store
 vector_store = None
 
+# One rating-weighted centroid per teacher, kept in step with vector_store
+teacher_index = TeacherIndex()
 
-def load_reviews_to_vector_store():
-    """Load reviews from MongoDB into the vector store"""
-    global vector_store
+# BM25 over review text and teacher names, kept in step with vector_store
+lexical_index = BM25Index(BM25_K1, BM25_B)
 
-    print("Loading reviews from MongoDB into vector store...")
+# Snapshot version behind vector_store, and whether it is mapped read-only
+snapshot_version = None
+index_read_only = False
 
-    try:
-        # Try different query formats to find reviews
-        reviews = []
-        
-        # Method 1: Direct MongoDB query
-        try:
-            reviews_query = {"collection": "reviews", "query": {}}
-            reviews_result = db.run(reviews_query)
-            if reviews_result and reviews_result.get("result"):
-                reviews = reviews_result["result"]
-                print(f"Found {len(reviews)} reviews using direct query")
-        except Exception as e:
-            print(f"Direct query failed: {e}")
-        
-        # Method 2: Try using MongoDB tools directly
-        if not reviews:
-            try:
-                # Use the MongoDB query tool directly
-                from langchain_mongodb.agent_toolkit.tool import MongoDBQueryTool
-                query_tool = MongoDBQueryTool(db=db)
-                result = query_tool.run({"collection": "reviews", "query": {}})
-                if result:
-                    reviews = json.loads(result) if isinstance(result, str) else result
-                    print(f"Found {len(reviews)} reviews using MongoDB tool")
-            except Exception as e:
-                print(f"MongoDB tool query failed: {e}")
-        
-        # Method 3: Try raw PyMongo connection
-        if not reviews:
-            try:
-                # Access the raw MongoDB client and database
-                client = db._client
-                db_name = db.database_name
-                raw_db = client[db_name]
-                reviews_cursor = raw_db.reviews.find({})
-                reviews = list(reviews_cursor)
-                print(f"Found {len(reviews)} reviews using raw PyMongo")
-            except Exception as e:
-                print(f"Raw PyMongo query failed: {e}")
-                # Try alternative method
-                try:
-                    # Get database name from the MongoDBDatabase object
-                    db_name = getattr(db, 'database_name', 'graidea')
-                    client = getattr(db, '_client', None)
-                    if client:
-                        raw_db = client[db_name]
-                        reviews_cursor = raw_db.reviews.find({})
-                        reviews = list(reviews_cursor)
-                        print(f"Found {len(reviews)} reviews using alternative PyMongo method")
-                except Exception as e2:
-                    print(f"Alternative PyMongo query also failed: {e2}")
-
-        if not reviews:
-            print("No reviews found in the database using any method")
-            return
-
-        print(f"Successfully loaded {len(reviews)} reviews")
-        
-        # Log the first few reviews to debug
-        print("\n" + "="*50)
-        print("DEBUG: Sample of fetched reviews:")
-        print("="*50)
-        for i, review in enumerate(reviews[:3]):  # Show first 3 reviews
-            print(f"Review {i+1}:")
-            print(f"  Type: {type(review)}")
-            print(f"  Content: {review}")
-            print(f"  Keys: {list(review.keys()) if isinstance(review, dict) else 'Not a dict'}")
-            print("-" * 30)
-        
-        if len(reviews) > 3:
-            print(f"... and {len(reviews) - 3} more reviews")
-        print("="*50)
+# Shared mode (SHARED_INDEX): the lock electing the one worker that builds the index
+builder_lock = (
+    BuilderLock(os.path.join(VECTOR_SNAPSHOT_DIR, "builder.lock")) if SHARED_INDEX else None
+)
 
-        # Convert reviews to documents
-        documents = []
-        print("\nConverting reviews to documents...")
-        
-        for i, review in enumerate(reviews):
-            try:
-                # Create a text representation of the review
-                text = f"Student: {review.get('studentName', 'Unknown')} | "
-                text += f"Teacher: {review.get('teacherName', 'Unknown')} | "
-                text += f"Rating: {review.get('rating', 'N/A')} | "
-                text += f"Review: {review.get('review', 'No review text')}"
-
-                doc = Document(
-                    page_content=text,
-                    metadata={
-                        "studentId": review.get("studentId"),
-                        "teacherId": review.get("teacherId"),
-                        "studentName": review.get("studentName"),
-                        "teacherName": review.get("teacherName"),
-                        "rating": review.get("rating"),
-                        "review": review.get("review"),
-                    },
-                )
-                documents.append(doc)
-                
-                # Log first few document conversions
-                if i < 2:
-                    print(f"Document {i+1} created:")
-                    print(f"  Text: {text[:100]}...")
-                    print(f"  Metadata: {doc.metadata}")
-                    print("-" * 20)
-                    
-            except Exception as e:
-                print(f"Error converting review {i+1}: {e}")
-                print(f"Problematic review: {review}")
-                continue
+# Background reindex jobs; in shared mode they are files the builder worker runs
+reindex_jobs = ReindexJobs(
+    lambda mode: reindex(mode),
+    os.path.join(VECTOR_SNAPSHOT_DIR, "jobs") if SHARED_INDEX else None,
+    REINDEX_JOB_HISTORY,
+)
 
-        # Create vector store
-        print(f"\nCreating vector store with {len(documents)} documents...")
-        if documents:
-            try:
-                print("Generating embeddings...")
-                vector_store = FAISS.from_documents(documents, embeddings)
-                print(f"✓ Vector store created successfully with {len(documents)} documents")
-                print(f"✓ Vector store dimensions: {getattr(vector_store, 'd', 'Unknown')}")
-                print(f"✓ Vector store total documents: {getattr(vector_store, 'ntotal', len(documents))}")
-            except Exception as e:
-                print(f"✗ Error creating vector store: {e}")
-                print("This might be due to embedding generation issues")
+# Bumped whenever the index is rebuilt or synced; part of every result cache key
+index_version = 0
+
+# Held while a new index version is published, so a tool never mixes two versions
+index_lock = threading.Lock()
+
+# Query embedding and search result caches
+query_embedding_cache = QueryCache(QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL)
+result_cache = QueryCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+
+# Concurrent async query embeddings are sent to the model in small batches
+query_embedder = EmbeddingBatcher(
+    lambda texts: aembed_queries(embeddings, texts),
+    window=QUERY_EMBED_BATCH_WINDOW_MS / 1000,
+    max_batch=QUERY_EMBED_BATCH_MAX,
+)
+
+# Caps concurrent agent runs, queues a bounded number more and enforces deadlines
+agent_limiter = AgentLimiter(AGENT_MAX_IN_FLIGHT, AGENT_MAX_QUEUE, AGENT_TIMEOUT)
+
+# Agent answers reused for repeated or paraphrased questions, tied to the index content
+answer_cache = (
+    AnswerCache(
+        ANSWER_CACHE_PATH, ANSWER_CACHE_TTL, ANSWER_CACHE_SIMILARITY, ANSWER_CACHE_MAX_ENTRIES
+    )
+    if ANSWER_CACHE_PATH
+    else None
+)
+
+# Structured questions skip the agent and call their tool directly
+intent_router = (
+    IntentRouter(lambda text: aembed_query_cached(text), ROUTER_SEMANTIC_THRESHOLD)
+    if ROUTER_ENABLED
+    else None
+)
+
+# Identical concurrent tool calls share one computation
+in_flight = SingleFlight()
+
+# Searches whose query embeddings arrive together run as one batch on the worker pool
+search_batcher = SearchBatcher(
+    lambda group, queries, vectors: _afind_reviews_batch(group, queries, vectors),
+    max_batch=QUERY_EMBED_BATCH_MAX,
+)
+
+# Metadata columns for filtered search, rebuilt lazily per index version
+filter_columns = FilterColumnsCache()
+
+# Delta sync bookkeeping. Documents in the vector store are keyed by the
+# review's ObjectId, so a review can be replaced or removed in place.
+sync_state = {
+    "last_id": None,  # highest review _id indexed so far
+    "last_synced_at": None,  # compared against REVIEWS_UPDATED_FIELD
+    "doc_hashes": {},  # doc id -> hash of the indexed review text and fields
+    "retry_ids": [],  # reviews whose ingest batch failed permanently
+    "deletes_resume_token": None,  # change stream position of the last delete seen
+    "last_delete_scan_at": None,  # when every review id was last checked for deletions
+}
+
+
+def get_raw_db():
+    """Return the raw PyMongo database behind the MongoDBDatabase wrapper"""
+    db_name = getattr(db, 'database_name', 'graidea')
+    return db._client[db_name]
+
+
+def _record_synced(newest_id, failed_ids, started_at):
+    """Advance the delta sync watermark and remember reviews to retry"""
+    if newest_id is not None and (
+        sync_state["last_id"] is None or newest_id > sync_state["last_id"]
+    ):
+        sync_state["last_id"] = newest_id
+    sync_state["retry_ids"] = list(failed_ids)
+    sync_state["last_synced_at"] = started_at
+
+
+def _report_progress(message):
+    # Warmup progress is /ready's; once serving, progress belongs to the running job
+    if readiness["status"] == "ready":
+        reindex_jobs.report(message)
+    else:
+        readiness["progress"] = message
+    print(message)
+
+
+def _ingest(
+    documents, target, doc_hashes, total=None, stats_delta=None, teachers=None, lexical=None
+):
+    """Run documents through the ingest pipeline, tracking their hashes and ids"""
+    newest = {"id": None}
+
+    def on_indexed(batch, vectors):
+        # Indexed documents are recorded first, so a failing step below
+        # never leaves one in the index that the next sync would add again
+        for doc in batch:
+            doc_hashes[doc.id] = document_hash(doc)
+            if ObjectId.is_valid(doc.id):
+                review_id = ObjectId(doc.id)
+                if newest["id"] is None or review_id > newest["id"]:
+                    newest["id"] = review_id
+        if stats_delta is not None:
+            stats_delta.add(batch)
+        if teachers is not None:
+            teachers.add(batch, vectors)
+        if lexical is not None:
+            lexical.add(batch)
+
+    new_store, report = ingest_documents(
+        documents,
+        embeddings,
+        vector_store=target,
+        batch_size=INGEST_BATCH_SIZE,
+        concurrency=INGEST_CONCURRENCY,
+        rate_limit=INGEST_RATE_LIMIT,
+        max_retries=INGEST_MAX_RETRIES,
+        on_indexed=on_indexed,
+        progress=_report_progress,
+        total=total,
+    )
+    return new_store, doc_hashes, newest["id"], report
+
+
+def _live_index():
+    """The served vector store, its version, teacher index and BM25 index"""
+    with index_lock:
+        return vector_store, index_version, teacher_index, lexical_index
+
+
+def _publish(store, teachers, lexical, doc_hashes=None):
+    """Swap in a new index version; searches already running finish on the old one"""
+    global vector_store, teacher_index, lexical_index, index_version
+    with index_lock:
+        vector_store, teacher_index, lexical_index = store, teachers, lexical
+        if doc_hashes is not None:
+            sync_state["doc_hashes"] = doc_hashes
+        index_version += 1
+    # Results cached meanwhile are keyed by the old version and never read again
+    result_cache.clear()
+    if answer_cache is not None:
+        # Unlike index_version this survives restarts, so cached answers do too
+        answer_cache.set_index(
+            index_fingerprint(sync_state["doc_hashes"], EMBEDDING_MODEL, LEXICON.version)
+        )
+
+
+def _write_teacher_stats(stats_delta, replace=False):
+    """Apply accumulated teacher stats, replacing the collection after a full load"""
+    try:
+        if replace:
+            stats_delta.replace_all(get_raw_db())
         else:
-            print("✗ No documents to add to vector store")
+            stats_delta.apply(get_raw_db())
+    except Exception as e:
+        print(f"✗ Failed to update teacher stats: {e}")
+
 
+def persist_vector_store():
+    """Save the current vector store as a new on-disk snapshot"""
+    global snapshot_version
+    store, _, teachers, lexical = _live_index()
+    if store is None:
+        return
+    try:
+        snapshot_version = snapshot.save_snapshot(
+            store, sync_state, teachers=teachers, lexical=lexical
+        )["version"]
     except Exception as e:
-        print(f"Error loading reviews: {e}")
+        print(f"✗ Failed to save vector store snapshot: {e}")
 
 
-def search_reviews_tool(query: str) -> str:
-    """Search for reviews using vector similarity"""
-    if vector_store is None:
-        return "Vector store not initialized. Please load reviews first."
+def refresh_theme_features(store):
+    """Recompute theme features of reviews counted with another lexicon
+
+    Runs on a store that is not published yet, before the teacher index is
+    built from it. Returns the teacher stats delta moving their theme counts
+    to the current lexicon, or None when every review is up to date.
+    """
+    stale = [doc for doc in store.docstore.documents() if is_stale(doc.metadata)]
+    if not stale:
+        return None
+
+    print(f"Recomputing theme features for {len(stale)} reviews (lexicon {LEXICON.version})...")
+    stats_delta = TeacherStatsDelta().add(stale, sign=-1)
+    for doc in stale:
+        doc.metadata.update(theme_features(doc.metadata.get("review")))
+    # Documents are materialized on demand, so the new features are written back
+    store.docstore.replace({doc.id: doc for doc in stale})
+    stats_delta.add(stale)
+    return stats_delta
+
+
+def _loaded_indexes(store, teachers, lexical, rebuild_teachers=False):
+    """The teacher and BM25 indexes saved with a snapshot, rebuilding any it lacks"""
+    if teachers is None or rebuild_teachers:
+        teachers = TeacherIndex.from_vector_store(store)
+    if lexical is None:
+        lexical = BM25Index.from_documents(store.docstore.documents(), BM25_K1, BM25_B)
+    # Scoring parameters are settings, not part of the saved postings
+    lexical.k1, lexical.b = BM25_K1, BM25_B
+    return teachers, lexical
+
+
+def load_or_build_vector_store():
+    """Load the on-disk snapshot and catch up with MongoDB, rebuilding only if needed"""
+    global snapshot_version, index_read_only
 
     try:
-        # Search for similar documents
-        docs = vector_store.similarity_search(query, k=5)
+        # Checksums are verified here, once per snapshot; readers only compare file sizes
+        store, loaded_state, manifest, (teachers, lexical) = snapshot.load_snapshot(
+            embeddings, verify=True
+        )
+    except snapshot.SnapshotError as e:
+        print(f"No usable vector store snapshot ({e}), rebuilding...")
+        load_reviews_to_vector_store()
+        return
+    except Exception as e:
+        print(f"✗ Error loading vector store snapshot: {e}, rebuilding...")
+        load_reviews_to_vector_store()
+        return
+
+    # Theme counts go into the teacher index, so they are brought up to date first
+    themes_delta = refresh_theme_features(store)
+    teachers, lexical = _loaded_indexes(
+        store, teachers, lexical, rebuild_teachers=themes_delta is not None
+    )
+    snapshot_version, index_read_only = manifest["version"], False
+    sync_state.update(loaded_state)
+    _publish(store, teachers, lexical)
+    if themes_delta is not None:
+        persist_vector_store()
+
+    # Seed the teacher stats from the snapshot if they have never been built
+    if get_raw_db()[STATS_COLLECTION].estimated_document_count() == 0:
+        print("Building teacher stats from the vector store snapshot...")
+        stats_delta = TeacherStatsDelta().add(vector_store.docstore.documents())
+        _write_teacher_stats(stats_delta, replace=True)
+    elif themes_delta is not None:
+        _write_teacher_stats(themes_delta)
+
+    # Only reviews written since the snapshot need embedding
+    sync_reviews_to_vector_store()
 
-        if not docs:
-            return "No relevant reviews found."
 
-        results = []
-        for doc in docs:
-            results.append(
-                {
-                    "student": doc.metadata.get("studentName", "Unknown"),
-                    "teacher": doc.metadata.get("teacherName", "Unknown"),
-                    "rating": doc.metadata.get("rating", "N/A"),
-                    "review": doc.metadata.get("review", "No review text"),
-                    "content": doc.page_content,
-                }
-            )
+def load_reviews_to_vector_store():
+    """Stream reviews from MongoDB into a new vector store, published once built"""
+    global index_read_only
+    if is_index_reader():
+        raise RuntimeError(READ_ONLY_MESSAGE)
 
-        return json.dumps(results, indent=2)
+    print("Loading reviews from MongoDB into vector store...")
+
+    try:
+        reviews = get_raw_db().reviews
+        total = reviews.estimated_document_count()
+        if not total:
+            print("No reviews found in the database")
+            return None
+
+        print(f"Streaming {total} reviews in batches of {INGEST_BATCH_SIZE}...")
+        started_at = datetime.now(timezone.utc)
+        cursor = reviews.find({}).batch_size(INGEST_BATCH_SIZE)
+        documents = (review_to_document(review) for review in cursor)
+        stats_delta = TeacherStatsDelta()
+        teachers = TeacherIndex()
+        lexical = BM25Index(BM25_K1, BM25_B)
+        new_store, doc_hashes, newest_id, report = _ingest(
+            documents, None, {}, total, stats_delta, teachers, lexical
+        )
+
+        if new_store is None:
+            print("✗ No reviews could be embedded, keeping the previous vector store")
+            return report
+
+        # A partially built index is still published; failed reviews are retried
+        # by the next delta sync
+        _publish(new_store, teachers, lexical, doc_hashes)
+        index_read_only = False
+        sync_state["last_id"] = None
+        sync_state["last_delete_scan_at"] = started_at
+        _record_synced(newest_id, report["failed_ids"], started_at)
+        _write_teacher_stats(stats_delta, replace=True)
+        persist_vector_store()
+        print(
+            f"✓ Vector store created with {new_store.index.ntotal} documents "
+            f"({report['failed']} failed) in {report['elapsed']}s"
+        )
+        return report
 
     except Exception as e:
-        return f"Error searching reviews: {e}"
+        print(f"Error loading reviews: {e}")
+        return None
+
+
+def _full_load():
+    load_reviews_to_vector_store()
+    total = len(vector_store.index_to_docstore_id) if vector_store else 0
+    return {"mode": "full", "added": total, "updated": 0, "removed": 0, "total": total}
+
+
+def _scan_deleted_ids(reviews, started_at):
+    """Indexed review ids missing from MongoDB, found by reading every review id"""
+    live_ids = {review_doc_id(review) for review in reviews.find({}, {"_id": 1})}
+    sync_state["last_delete_scan_at"] = started_at
+    return [doc_id for doc_id in sync_state["doc_hashes"] if doc_id not in live_ids]
+
 
+def _deleted_review_ids(reviews, started_at, count_dropped):
+    """Indexed review ids deleted since the last sync
 
-def get_teacher_reviews_tool(teacher_id: str) -> str:
-    """Get all reviews for a specific teacher by teacherId"""
+    Deletes are read from a change stream resumed at the last sync. Without
+    change streams (a standalone server) every id is scanned when the review
+    count drops, and at least every REVIEWS_DELETE_SCAN_INTERVAL seconds for a
+    delete hidden by an insert in the same window.
+    """
+    token = sync_state["deletes_resume_token"]
     try:
-        reviews = []
-        
-        # Method 1: Direct MongoDB query
-        try:
-            teacher_query = {
-                "collection": "reviews",
-                "query": {"teacherId": int(teacher_id)},
-            }
-            reviews_result = db.run(teacher_query)
-            if reviews_result and reviews_result.get("result"):
-                reviews = reviews_result["result"]
-        except Exception as e:
-            print(f"Direct teacher query failed: {e}")
-        
-        # Method 2: Try raw PyMongo connection
-        if not reviews:
+        with reviews.watch(
+            [{"$match": {"operationType": "delete"}}], resume_after=token, max_await_time_ms=100
+        ) as stream:
+            deleted = set()
+            while (change := stream.try_next()) is not None:
+                deleted.add(review_doc_id(change["documentKey"]))
+            sync_state["deletes_resume_token"] = stream.resume_token
+            if token is not None:
+                return [doc_id for doc_id in deleted if doc_id in sync_state["doc_hashes"]]
+            # A new stream only reports later deletes; one scan finds the earlier ones
+            return _scan_deleted_ids(reviews, started_at)
+    except PyMongoError as e:
+        if token is not None:
+            print(f"✗ Review delete stream lost ({e}), scanning every review id")
+            sync_state["deletes_resume_token"] = None
+            return _scan_deleted_ids(reviews, started_at)
+
+    last_scan = sync_state["last_delete_scan_at"]
+    if (
+        count_dropped
+        or last_scan is None
+        or (started_at - last_scan).total_seconds() >= REVIEWS_DELETE_SCAN_INTERVAL
+    ):
+        return _scan_deleted_ids(reviews, started_at)
+    return []
+
+
+def sync_reviews_to_vector_store():
+    """Apply new, changed and removed reviews to a copy of the vector store, then publish it"""
+    if is_index_reader():
+        raise RuntimeError(READ_ONLY_MESSAGE)
+    # A mapped snapshot cannot be written to, so a builder still serving one rebuilds
+    if vector_store is None or index_read_only or sync_state["last_id"] is None:
+        print("No synced vector store yet, running a full load...")
+        return _full_load()
+
+    started_at = datetime.now(timezone.utc)
+    reviews = get_raw_db().reviews
+    # Counted first, so a review inserted meanwhile can only cause a spare scan below
+    live_count = reviews.count_documents({})
+
+    # Only reviews past the watermark, touched since the last sync, or left
+    # over from failed ingest batches
+    conditions = [{"_id": {"$gt": sync_state["last_id"]}}]
+    if sync_state["last_synced_at"] is not None:
+        conditions.append({REVIEWS_UPDATED_FIELD: {"$gt": sync_state["last_synced_at"]}})
+    retry_ids = [ObjectId(i) for i in sync_state.get("retry_ids", []) if ObjectId.is_valid(i)]
+    if retry_ids:
+        conditions.append({"_id": {"$in": retry_ids}})
+    changed = list(reviews.find({"$or": conditions}))
+    print(f"Delta sync: {len(changed)} new or modified reviews since last sync")
+
+    to_add = []
+    to_replace = []
+    for review in changed:
+        doc = review_to_document(review)
+        known_hash = sync_state["doc_hashes"].get(doc.id)
+        if known_hash is None:
+            to_add.append(doc)
+        elif known_hash != document_hash(doc):
+            to_replace.append(doc)
+
+    count_dropped = live_count < len(sync_state["doc_hashes"]) + len(to_add)
+    removed_ids = _deleted_review_ids(reviews, started_at, count_dropped)
+
+    stale_ids = removed_ids + [doc.id for doc in to_replace]
+    new_docs = to_add + to_replace
+    stats_delta = TeacherStatsDelta()
+    failed_ids = []
+    newest_id = None
+    if stale_ids or new_docs:
+        # Changes go to a fork sharing the unchanged data, so searches keep
+        # the current version until it is published
+        store = fork_vector_store(vector_store)
+        teachers, lexical = teacher_index.fork(), lexical_index.fork()
+        doc_hashes = dict(sync_state["doc_hashes"])
+        if stale_ids:
+            stale_docs = [store.docstore.search(doc_id) for doc_id in stale_ids]
+            stats_delta.add(stale_docs, sign=-1)
+            teachers.add(stale_docs, reconstruct_documents(store, stale_ids), sign=-1)
+            remove_documents(store, stale_ids)
+            lexical.remove(stale_ids)
+            for doc_id in stale_ids:
+                doc_hashes.pop(doc_id, None)
+
+        if new_docs:
+            print(f"Embedding {len(new_docs)} reviews...")
+            _, _, newest_id, report = _ingest(
+                new_docs, store, doc_hashes, len(new_docs), stats_delta, teachers, lexical
+            )
+            failed_ids = report["failed_ids"]
+
+        if compact_overlay(store):
+            print(f"✓ Folded the delta sync overlay into the {index_kind(store.index)} index")
+        _publish(store, teachers, lexical, doc_hashes)
+
+    _record_synced(newest_id, failed_ids, started_at)
+    _write_teacher_stats(stats_delta)
+    if stale_ids or new_docs:
+        persist_vector_store()
+
+    result = {
+        "mode": "delta",
+        "added": len(to_add),
+        "updated": len(to_replace),
+        "removed": len(removed_ids),
+        "total": len(vector_store.index_to_docstore_id),
+    }
+    print(
+        f"✓ Delta sync complete: {result['added']} added, {result['updated']} updated, "
+        f"{result['removed']} removed ({result['total']} total)"
+    )
+    return result
+
+
+def reindex(mode="delta"):
+    """Build a new index version from MongoDB and publish it; run by reindex jobs"""
+    previous = vector_store
+    result = _full_load() if mode == "full" else sync_reviews_to_vector_store()
+    if result["mode"] == "full" and vector_store is previous:
+        raise RuntimeError("No new index was built; the previous version is still served")
+    return result
+
+
+READ_ONLY_MESSAGE = "This worker serves a read-only shared index; the builder worker syncs it"
+
+
+def is_index_reader():
+    """True for a shared-mode worker serving the builder's snapshots read-only"""
+    return builder_lock is not None and not builder_lock.held
+
+
+def index_role():
+    if builder_lock is None:
+        return "standalone"
+    return "builder" if builder_lock.held else "reader"
+
+
+def load_shared_snapshot():
+    """Map the current snapshot read-only and swap it in, on a reader worker"""
+    global snapshot_version, index_read_only
+
+    store, loaded_state, manifest, (teachers, lexical) = snapshot.load_snapshot(
+        embeddings, read_only=True
+    )
+    # The indexes are mapped too; only snapshots older than format 4 need a rebuild,
+    # and requests keep using the previous version until it is done
+    teachers, lexical = _loaded_indexes(store, teachers, lexical)
+    sync_state.update(loaded_state)
+    _publish(store, teachers, lexical)
+    snapshot_version, index_read_only = manifest["version"], True
+
+
+def _serve_shared_index():
+    """Wait until this worker is elected builder or a snapshot exists to map"""
+    last_error = None
+    while not builder_lock.acquire():
+        if snapshot.current_version() is not None:
             try:
-                client = db._client
-                db_name = db.database_name
-                raw_db = client[db_name]
-                reviews_cursor = raw_db.reviews.find({"teacherId": int(teacher_id)})
-                reviews = list(reviews_cursor)
+                load_shared_snapshot()
+                return
             except Exception as e:
-                print(f"Raw PyMongo teacher query failed: {e}")
-                # Try alternative method
-                try:
-                    db_name = getattr(db, 'database_name', 'graidea')
-                    client = getattr(db, '_client', None)
-                    if client:
-                        raw_db = client[db_name]
-                        reviews_cursor = raw_db.reviews.find({"teacherId": int(teacher_id)})
-                        reviews = list(reviews_cursor)
-                except Exception as e2:
-                    print(f"Alternative PyMongo teacher query also failed: {e2}")
-
-        if not reviews:
-            return f"No reviews found for teacher with ID: {teacher_id}"
-
-        # Calculate statistics
-        ratings = [
-            review.get("rating", 0)
-            for review in reviews
-            if review.get("rating") is not None
-        ]
-        avg_rating = sum(ratings) / len(ratings) if ratings else 0
+                if str(e) != last_error:
+                    print(f"✗ Could not map the shared snapshot ({e}), retrying...")
+                    last_error = str(e)
+        time.sleep(SHARED_INDEX_POLL_INTERVAL)
 
-        # Format results
-        results = {
-            "teacher_id": teacher_id,
-            "total_reviews": len(reviews),
-            "average_rating": round(avg_rating, 2),
-            "teacher_name": reviews[0].get("teacherName", "Unknown")
-            if reviews
-            else "Unknown",
-            "reviews": [],
-        }
+    print(f"✓ Elected index builder (pid {os.getpid()})")
+    reindex_jobs.fail_interrupted()
+    load_or_build_vector_store()
 
-        for review in reviews:
-            results["reviews"].append(
-                {
-                    "student": review.get("studentName", "Unknown"),
-                    "rating": review.get("rating", "N/A"),
-                    "review": review.get("review", "No review text"),
-                    "student_id": review.get("studentId", "N/A"),
-                }
-            )
 
-        return json.dumps(results, indent=2)
+def _watch_shared_index():
+    """Readers swap in new snapshot versions; the builder runs queued reindex jobs"""
+    failed_version = None
+    while True:
+        time.sleep(SHARED_INDEX_POLL_INTERVAL)
+        try:
+            if builder_lock.held:
+                reindex_jobs.run_pending()
+            elif builder_lock.acquire():
+                # The previous builder exited and released the lock
+                print(f"✓ Took over as index builder (pid {os.getpid()})")
+                reindex_jobs.fail_interrupted()
+                load_or_build_vector_store()
+            else:
+                version = snapshot.current_version()
+                if version not in (None, snapshot_version, failed_version):
+                    failed_version = version
+                    load_shared_snapshot()
+                    failed_version = None
+        except Exception as e:
+            print(f"✗ Shared index watcher: {e}")
+
 
-    except ValueError:
-        return f"Invalid teacher ID: {teacher_id}. Please provide a valid number."
-    except Exception as e:
-        return f"Error fetching teacher reviews: {e}"
+async def run_sync(func, *args):
+    """Run blocking work on the bounded sync worker pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(sync_executor, partial(func, *args))
 
 
-def get_recommendations_tool(query: str) -> str:
-    """Get recommendations based on user query using vector similarity and analysis"""
-    if vector_store is None:
-        return "Vector store not initialized. Please load reviews first."
+def get_async_db():
+    """Return the database on the async Mongo client"""
+    global async_client
+    if async_client is None:
+        async_client = AsyncMongoClient(os.environ.get("MONGODB_URI", None))
+    return async_client[getattr(db, 'database_name', 'graidea')]
+
+
+NOT_READY_MESSAGE = "Vector store not initialized. Please load reviews first."
+
+
+def _format_search_results(docs, mode="vector") -> ReviewSearch:
+    results = []
+    for doc in docs:
+        results.append(
+            {
+                "student": doc.metadata.get("studentName", "Unknown"),
+                "teacher": doc.metadata.get("teacherName", "Unknown"),
+                "rating": doc.metadata.get("rating", "N/A"),
+                "review": doc.metadata.get("review", "No review text"),
+                "content": doc.page_content,
+            }
+        )
+
+    return ReviewSearch(results, mode)
+
+
+def embed_query_cached(query: str):
+    """Embed a query, reusing the embedding of any equivalent recent query"""
+    key = normalize_query(query)
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = embeddings.embed_query(key)
+        query_embedding_cache.set(key, embedding)
+    return embedding
+
+
+async def aembed_query_cached(query: str):
+    """Async variant of embed_query_cached"""
+    key = normalize_query(query)
+    embedding = query_embedding_cache.get(key)
+    if embedding is None:
+        embedding = await query_embedder.embed(key)
+        query_embedding_cache.set(key, embedding)
+    return embedding
+
+
+def _embed_batch(queries):
+    """Embed queries with one call, returning a vector or an exception per query
+
+    If the batch call fails, each query is retried on its own so one bad
+    query cannot fail the whole batch.
+    """
+    keys = [normalize_query(query) for query in queries]
+    vectors = {key: query_embedding_cache.get(key) for key in keys}
+    missing = [key for key, vector in vectors.items() if vector is None]
+    if missing:
+        try:
+            fresh = embed_queries(embeddings, missing)
+        except Exception:
+            fresh = None
+        for position, key in enumerate(missing):
+            try:
+                vectors[key] = fresh[position] if fresh is not None else embeddings.embed_query(key)
+                query_embedding_cache.set(key, vectors[key])
+            except Exception as e:
+                vectors[key] = e
+    return [vectors[key] for key in keys]
+
+
+def _run_batch(
+    kind, version, queries, k, filters, effort, compute, error_message, mode=None, fallback=None
+):
+    """Serve a batch of queries from the result cache, one embedding call and one search
+
+    ``compute(queries, vectors)`` returns one result per query; lexical
+    batches skip the embedding call and get None vectors. A query whose
+    embedding failed is answered by ``fallback(query, error)`` when given.
+    Failures are returned as the query's ToolError and never cached.
+    """
+    keys = [_result_key(kind, version, query, k, filters, effort, mode) for query in queries]
+    results = [result_cache.get(key) for key in keys]
+    for i, query in enumerate(queries):
+        if results[i] is None and not normalize_query(query):
+            results[i] = InvalidArgumentError(f"{error_message}: empty query")
+
+    pending = [i for i, result in enumerate(results) if result is None]
+    if mode == "lexical":
+        vectors = [None] * len(pending)
+    else:
+        vectors = _embed_batch([queries[i] for i in pending])
+    ready = []
+    for i, vector in zip(pending, vectors):
+        if not isinstance(vector, Exception):
+            ready.append((i, vector))
+        elif fallback is None:
+            results[i] = ToolError(f"{error_message}: {vector}")
+        else:
+            try:
+                results[i] = fallback(queries[i], vector)
+            except Exception as e:
+                results[i] = ToolError(f"{error_message}: {e}")
+    if not ready:
+        return results
 
     try:
-        # Search for similar documents
-        docs = vector_store.similarity_search(query, k=10)
-
-        if not docs:
-            return "No relevant reviews found for recommendations."
-
-        # Analyze the reviews to provide recommendations
-        teacher_stats = {}
-        common_themes = []
-
-        for doc in docs:
-            teacher_name = doc.metadata.get("teacherName", "Unknown")
-            rating = doc.metadata.get("rating", 0)
-            review_text = doc.metadata.get("review", "").lower()
-
-            if teacher_name not in teacher_stats:
-                teacher_stats[teacher_name] = {
-                    "ratings": [],
-                    "reviews": [],
-                    "teacher_id": doc.metadata.get("teacherId", "N/A"),
-                }
-
-            teacher_stats[teacher_name]["ratings"].append(rating)
-            teacher_stats[teacher_name]["reviews"].append(review_text)
-
-        # Calculate recommendations
-        recommendations = []
-
-        for teacher, stats in teacher_stats.items():
-            if stats["ratings"]:
-                avg_rating = sum(stats["ratings"]) / len(stats["ratings"])
-                review_count = len(stats["ratings"])
-
-                # Analyze common themes in reviews
-                all_reviews = " ".join(stats["reviews"])
-                themes = []
-
-                # Check for common positive themes
-                positive_themes = [
-                    "excellent",
-                    "great",
-                    "amazing",
-                    "wonderful",
-                    "helpful",
-                    "clear",
-                    "engaging",
-                    "knowledgeable",
-                ]
-                negative_themes = [
-                    "difficult",
-                    "hard",
-                    "confusing",
-                    "boring",
-                    "unclear",
-                    "unhelpful",
-                ]
-
-                pos_count = sum(1 for theme in positive_themes if theme in all_reviews)
-                neg_count = sum(1 for theme in negative_themes if theme in all_reviews)
-
-                recommendations.append(
-                    {
-                        "teacher_name": teacher,
-                        "teacher_id": stats["teacher_id"],
-                        "average_rating": round(avg_rating, 2),
-                        "review_count": review_count,
-                        "positive_themes": pos_count,
-                        "negative_themes": neg_count,
-                        "recommendation_score": round(
-                            avg_rating + (pos_count - neg_count) * 0.1, 2
-                        ),
-                    }
-                )
-
-        # Sort by recommendation score
-        recommendations.sort(key=lambda x: x["recommendation_score"], reverse=True)
-
-        # Generate summary
-        result = {
-            "query": query,
-            "total_reviews_analyzed": len(docs),
-            "recommendations": recommendations[:5],  # Top 5 recommendations
-            "summary": f"Based on {len(docs)} reviews, here are the top recommendations for your query: '{query}'",
-        }
+        computed = compute([queries[i] for i, _ in ready], [vector for _, vector in ready])
+    except Exception as e:
+        for i, _ in ready:
+            results[i] = ToolError(f"{error_message}: {e}")
+        return results
+    for (i, _), result in zip(ready, computed):
+        result_cache.set(keys[i], result)
+        results[i] = result
+    return results
+
+
+def search_reviews_batch(queries, k: int = 5, filters=None, effort=None, mode=None):
+    """Search reviews for several queries, returning a result or ToolError per query"""
+    store, version, _, lexical = _live_index()
+    if store is None:
+        raise NotReadyError(NOT_READY_MESSAGE)
+
+    filters = normalize_filters(filters)
+    mode = _search_mode(mode)
+
+    def compute(batch_queries, vectors):
+        return _find_reviews_many(
+            store, version, lexical, batch_queries, vectors, k, filters, effort, mode
+        )
+
+    def fallback(query, error):
+        return _lexical_fallback(store, lexical, query, k, filters, error)
+
+    return _run_batch(
+        "search",
+        version,
+        queries,
+        k,
+        filters,
+        effort,
+        compute,
+        "Error searching reviews",
+        mode,
+        fallback if mode == "hybrid" else None,
+    )
+
+
+def get_recommendations_batch(queries, limit: int = 5, filters=None, effort=None):
+    """Recommend teachers for several queries, returning a result or ToolError per query"""
+    store, version, teachers, _ = _live_index()
+    if store is None:
+        raise NotReadyError(NOT_READY_MESSAGE)
+
+    filters = normalize_filters(filters)
+
+    def compute(batch_queries, vectors):
+        return _recommend_many(
+            store, version, teachers, batch_queries, vectors, limit, filters, effort
+        )
+
+    return _run_batch(
+        "recommendations",
+        version,
+        queries,
+        limit,
+        filters,
+        effort,
+        compute,
+        "Error generating recommendations",
+    )
+
+
+def _result_key(kind, version, query, k, filters=None, effort=None, mode=None):
+    return (kind, normalize_query(query), k, filters, effort, mode, version)
+
+
+SEARCH_MODES = ("hybrid", "vector", "lexical")
+
+
+def _search_mode(mode=None) -> str:
+    mode = mode or SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise InvalidArgumentError(
+            f"Unknown search mode: {mode}. Use one of: {', '.join(SEARCH_MODES)}"
+        )
+    return mode
+
+
+def _require_query(query, error_message):
+    # Same rule as the batch tools, which report it per query
+    if not normalize_query(query):
+        raise InvalidArgumentError(f"{error_message}: empty query")
+
+
+def _documents(store, ids):
+    """Documents for ids, skipping any removed from the store since they were ranked"""
+    docs = (store.docstore.search(doc_id) for doc_id in ids)
+    return [doc for doc in docs if isinstance(doc, Document)]
+
+
+def _lexical_docs(store, lexical, query, k, filters=None):
+    """Top-k documents by BM25, prefiltered by metadata"""
+    return _documents(store, [doc_id for doc_id, _ in lexical.search(query, k, filters)])
+
+
+def _find_reviews_many(store, version, lexical, queries, vectors, k, filters, effort, mode):
+    """Reviews for several queries by vector similarity, BM25, or both fused by rank"""
+    if mode == "lexical":
+        return [
+            _format_search_results(_lexical_docs(store, lexical, query, k, filters), mode)
+            for query in queries
+        ]
+
+    columns = filter_columns.get(store, version) if filters else None
+    if mode == "vector":
+        hits = search_by_vectors(store, vectors, k, filters, columns, effort)
+        return [_format_search_results([doc for doc, _ in query_hits], mode) for query_hits in hits]
+
+    # Hybrid search over-fetches from both rankers so a review ranked well by
+    # only one of them can still make the fused top k. Candidates are ranked
+    # by id; only the fused top k are materialized
+    pool = k * HYBRID_CANDIDATES
+    _, rows = search_rows(store, vectors, pool, filters, columns, effort)
+    mapping = store.index_to_docstore_id
+    results = []
+    for query, query_rows in zip(queries, rows):
+        vector_ids = [mapping[int(row)] for row in query_rows if row != -1]
+        lexical_ids = [doc_id for doc_id, _ in lexical.search(query, pool, filters)]
+        fused = reciprocal_rank_fusion([vector_ids, lexical_ids], HYBRID_RRF_K)
+        results.append(_format_search_results(_documents(store, fused[:k]), mode))
+    return results
+
+
+def _find_reviews(store, version, lexical, query, embedding, k, filters, effort, mode):
+    return _find_reviews_many(
+        store, version, lexical, [query], [embedding], k, filters, effort, mode
+    )[0]
+
+
+async def _afind_reviews_batch(group, queries, vectors):
+    """``_find_reviews_many`` on the worker pool for a SearchBatcher group"""
+    store, version, lexical, k, filters, effort, mode = group
+    return await run_sync(
+        _find_reviews_many, store, version, lexical, queries, vectors, k, filters, effort, mode
+    )
+
+
+def _lexical_fallback(store, lexical, query, k, filters, error) -> ReviewSearch:
+    """Answer a hybrid search from BM25 alone when its query embedding failed
+
+    The result is not cached, so the next identical query tries the
+    embedding again.
+    """
+    print(f"✗ Query embedding failed ({error!r}), answering lexically")
+    return _format_search_results(_lexical_docs(store, lexical, query, k, filters), "lexical")
+
+
+def search_reviews_tool(
+    query: str, k: int = 5, filters=None, effort=None, mode=None
+) -> ReviewSearch:
+    """Search for reviews by vector similarity, BM25, or both"""
+    store, version, _, lexical = _live_index()
+    if store is None:
+        raise NotReadyError(NOT_READY_MESSAGE)
+
+    _require_query(query, "Error searching reviews")
+    filters = normalize_filters(filters)
+    mode = _search_mode(mode)
+    key = _result_key("search", version, query, k, filters, effort, mode)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with tool_errors("Error searching reviews"):
+        # Lexical search needs no embedding call
+        embedding = None
+        if mode != "lexical":
+            try:
+                embedding = embed_query_cached(query)
+            except Exception as e:
+                if mode == "vector":
+                    raise
+                return _lexical_fallback(store, lexical, query, k, filters, e)
+        result = _find_reviews(
+            store, version, lexical, query, embedding, k, filters, effort, mode
+        )
+        result_cache.set(key, result)
+        return result
+
+
+async def asearch_reviews_tool(
+    query: str, k: int = 5, filters=None, effort=None, mode=None
+) -> ReviewSearch:
+    """Search for reviews without blocking the event loop"""
+    store, version, _, lexical = _live_index()
+    if store is None:
+        raise NotReadyError(NOT_READY_MESSAGE)
+
+    _require_query(query, "Error searching reviews")
+    filters = normalize_filters(filters)
+    mode = _search_mode(mode)
+    key = _result_key("search", version, query, k, filters, effort, mode)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with tool_errors("Error searching reviews"):
+        return await in_flight.do(
+            key, _asearch_reviews, key, store, version, lexical, query, k, filters, effort, mode
+        )
+
+
+async def _aembed_for_search(query, mode):
+    if mode != "hybrid" or HYBRID_EMBED_TIMEOUT <= 0:
+        return await aembed_query_cached(query)
+    # Shielded, so a slow embedding still completes and warms the cache for the next query
+    return await asyncio.wait_for(
+        asyncio.shield(aembed_query_cached(query)), HYBRID_EMBED_TIMEOUT
+    )
+
+
+async def _asearch_reviews(key, store, version, lexical, query, k, filters, effort, mode):
+    embedding = None
+    if mode != "lexical":
+        try:
+            embedding = await _aembed_for_search(query, mode)
+        except Exception as e:
+            if mode == "vector":
+                raise
+            return await run_sync(_lexical_fallback, store, lexical, query, k, filters, e)
+    result = await search_batcher.search(
+        (store, version, lexical, k, filters, effort, mode), query, embedding
+    )
+    result_cache.set(key, result)
+    return result
+
+
+REVIEW_PROJECTION = {"studentName": 1, "rating": 1, "review": 1, "studentId": 1}
+
+
+def _review_summary(review) -> dict:
+    return {
+        "id": str(review["_id"]),
+        "student": review.get("studentName", "Unknown"),
+        "rating": review.get("rating", "N/A"),
+        "review": review.get("review", "No review text"),
+        "student_id": review.get("studentId", "N/A"),
+    }
+
+
+def teacher_reviews_query(teacher_id, after=None) -> dict:
+    """Keyset query over the (teacherId, _id) index"""
+    query = {"teacherId": int(teacher_id)}
+    if after:
+        if not ObjectId.is_valid(after):
+            raise ValueError(f"Invalid cursor: {after}")
+        query["_id"] = {"$gt": ObjectId(after)}
+    return query
+
+
+def _clamp_page_size(limit) -> int:
+    return max(1, min(limit or TEACHER_REVIEWS_PAGE_SIZE, TEACHER_REVIEWS_MAX_PAGE_SIZE))
+
+
+def _teacher_reviews_page(teacher_id, stats, reviews, limit):
+    if stats is None and not reviews:
+        return None
+    # One extra review is fetched to know whether another page exists
+    has_more = len(reviews) > limit
+    reviews = reviews[:limit]
+    return {
+        **(stats or {}),
+        "teacher_id": teacher_id,
+        "reviews": [_review_summary(review) for review in reviews],
+        "next_cursor": str(reviews[-1]["_id"]) if has_more else None,
+    }
+
+
+def get_teacher_reviews_page(teacher_id, after=None, limit=None):
+    """One page of a teacher's reviews plus their stats, or None"""
+    limit = _clamp_page_size(limit)
+    raw_db = get_raw_db()
+    query = teacher_reviews_query(teacher_id, after)
+    stats = get_teacher_stats(raw_db, int(teacher_id))
+    reviews = list(
+        raw_db.reviews.find(query, REVIEW_PROJECTION).sort("_id", 1).limit(limit + 1)
+    )
+    return _teacher_reviews_page(teacher_id, stats, reviews, limit)
+
+
+async def aget_teacher_reviews_page(teacher_id, after=None, limit=None):
+    """One page of a teacher's reviews plus their stats, using the async driver
+
+    Concurrent requests for the same page share one pair of Mongo queries.
+    """
+    limit = _clamp_page_size(limit)
+    query = teacher_reviews_query(teacher_id, after)
+    key = ("teacher_reviews", query["teacherId"], after or None, limit)
+    page = await in_flight.do(key, _aget_teacher_reviews_page, teacher_id, query, limit)
+    # Waiters may have spelled the id differently ("07" and "7")
+    return page and {**page, "teacher_id": teacher_id}
+
+
+async def _aget_teacher_reviews_page(teacher_id, query, limit):
+    async_db = get_async_db()
+    stats = await aget_teacher_stats(async_db, query["teacherId"])
+    cursor = async_db.reviews.find(query, REVIEW_PROJECTION).sort("_id", 1).limit(limit + 1)
+    reviews = await cursor.to_list()
+    return _teacher_reviews_page(teacher_id, stats, reviews, limit)
+
+
+async def astream_teacher_reviews(teacher_id, after=None):
+    """Yield a teacher's reviews one by one as the cursor produces them"""
+    cursor = get_async_db().reviews.find(
+        teacher_reviews_query(teacher_id, after), REVIEW_PROJECTION
+    ).sort("_id", 1).batch_size(TEACHER_REVIEWS_PAGE_SIZE)
+    async for review in cursor:
+        yield _review_summary(review)
+
+
+def get_teacher_reviews_tool(teacher_id: str) -> TeacherReviews:
+    """Get the reviews for a specific teacher by teacherId"""
+    try:
+        page = get_teacher_reviews_page(teacher_id)
+    except ValueError:
+        raise InvalidArgumentError(
+            f"Invalid teacher ID: {teacher_id}. Please provide a valid number."
+        ) from None
+    except Exception as e:
+        raise ToolError(f"Error fetching teacher reviews: {e}") from e
+    if page is None:
+        raise NotFoundError(f"No reviews found for teacher with ID: {teacher_id}")
+    return TeacherReviews(page)
 
-        return json.dumps(result, indent=2)
 
+async def aget_teacher_reviews_tool(teacher_id: str) -> TeacherReviews:
+    """Get the reviews for a specific teacher using the async Mongo driver"""
+    try:
+        page = await aget_teacher_reviews_page(teacher_id)
+    except ValueError:
+        raise InvalidArgumentError(
+            f"Invalid teacher ID: {teacher_id}. Please provide a valid number."
+        ) from None
     except Exception as e:
-        return f"Error generating recommendations: {e}"
+        raise ToolError(f"Error fetching teacher reviews: {e}") from e
+    if page is None:
+        raise NotFoundError(f"No reviews found for teacher with ID: {teacher_id}")
+    return TeacherReviews(page)
+
+
+def _build_recommendations(query: str, docs, relevance, limit: int = 5) -> Recommendations:
+    """Rank the teachers behind the retrieved reviews
+
+    Scored like ``TeacherIndex.rank``: a teacher's relevance is that of their
+    closest retrieved review, and quality comes from the retrieved reviews.
+    """
+    if not docs:
+        return Recommendations(
+            query, [], "No relevant reviews found for recommendations.", reviews_analyzed=0
+        )
+
+    # Aggregate ratings, theme mentions and the best relevance per teacher
+    teacher_stats = {}
+
+    for doc, doc_relevance in zip(docs, relevance):
+        teacher_id = doc.metadata.get("teacherId", "N/A")
+        rating = doc.metadata.get("rating")
+
+        if teacher_id not in teacher_stats:
+            teacher_stats[teacher_id] = {
+                "teacher_name": doc.metadata.get("teacherName") or "Unknown",
+                "ratings": [],
+                "review_count": 0,
+                "positive": 0,
+                "negative": 0,
+                "relevance": 0.0,
+            }
+
+        stats = teacher_stats[teacher_id]
+        stats["review_count"] += 1
+        if isinstance(rating, (int, float)):
+            stats["ratings"].append(rating)
+        positive, negative = LEXICON.polarity(review_themes(doc.metadata))
+        stats["positive"] += positive
+        stats["negative"] += negative
+        stats["relevance"] = max(stats["relevance"], float(doc_relevance))
+
+    teachers = list(teacher_stats.items())
+    average_ratings = [
+        sum(stats["ratings"]) / len(stats["ratings"]) if stats["ratings"] else 0.0
+        for _, stats in teachers
+    ]
+    quality = rating_quality(
+        average_ratings,
+        [stats["positive"] for _, stats in teachers],
+        [stats["negative"] for _, stats in teachers],
+        [stats["review_count"] for _, stats in teachers],
+    )
+    scores = blend_scores(np.array([stats["relevance"] for _, stats in teachers]), quality)
+
+    recommendations = [
+        {
+            "teacher_name": stats["teacher_name"],
+            "teacher_id": teacher_id,
+            "average_rating": round(average_rating, 2),
+            "review_count": stats["review_count"],
+            "positive_themes": stats["positive"],
+            "negative_themes": stats["negative"],
+            "relevance": round(stats["relevance"], 4),
+            "recommendation_score": round(float(score), 4),
+        }
+        for (teacher_id, stats), average_rating, score in zip(teachers, average_ratings, scores)
+    ]
+    recommendations.sort(key=lambda x: x["recommendation_score"], reverse=True)
+
+    # Generate summary
+    return Recommendations(
+        query,
+        recommendations[:limit],
+        f"Based on {len(docs)} reviews, here are the top recommendations for your query: '{query}'",
+        reviews_analyzed=len(docs),
+    )
+
+
+def _recommendation_pool_size(limit: int) -> int:
+    # Retrieve enough reviews to rank `limit` distinct teachers
+    return max(10, limit * 2)
+
+
+def _format_teacher_ranking(query: str, teachers, recommendations) -> Recommendations:
+    if not recommendations:
+        return Recommendations(
+            query,
+            [],
+            "No matching teachers found for recommendations.",
+            teachers_ranked=len(teachers),
+        )
+
+    return Recommendations(
+        query,
+        recommendations,
+        f"Based on {len(teachers)} teachers, here are the top recommendations for your query: '{query}'",
+        teachers_ranked=len(teachers),
+    )
+
+
+def _recommend_many(store, version, teachers, queries, vectors, limit, filters, effort):
+    """Recommend teachers for several query embeddings at once"""
+    options = dict(filters or ())
+    # A student filter selects reviews, not teachers, so rank the matching reviews
+    if "student_id" in options or not len(teachers):
+        k = _recommendation_pool_size(limit)
+        columns = filter_columns.get(store, version) if filters else None
+        _, rows = search_rows(store, vectors, k, filters, columns, effort)
+        # Relevance is measured like the teacher index's, against the review vectors
+        found = np.unique(rows[rows != -1]).tolist()
+        found_vectors = dict(zip(found, reconstruct_rows(store.index, found))) if found else {}
+        results = []
+        for query, vector, query_rows in zip(queries, vectors, rows):
+            query_rows = [int(row) for row in query_rows if row != -1]
+            docs = [store.docstore.search(store.index_to_docstore_id[row]) for row in query_rows]
+            relevance = (
+                cosine_relevance([vector], [found_vectors[row] for row in query_rows])[0]
+                if query_rows
+                else []
+            )
+            results.append(_build_recommendations(query, docs, relevance, limit))
+        return results
+
+    # Every teacher's centroid is scored against every query in one product
+    rankings = teachers.rank_many(
+        vectors,
+        limit,
+        teacher_id=options.get("teacher_id"),
+        min_rating=options.get("min_rating"),
+        max_rating=options.get("max_rating"),
+    )
+    return [
+        _format_teacher_ranking(query, teachers, recommendations)
+        for query, recommendations in zip(queries, rankings)
+    ]
+
+
+def _recommend(store, version, teachers, query, embedding, limit, filters, effort):
+    """Recommend teachers from the teacher index, or from nearby reviews"""
+    return _recommend_many(
+        store, version, teachers, [query], [embedding], limit, filters, effort
+    )[0]
+
+
+def get_recommendations_tool(
+    query: str, limit: int = 5, filters=None, effort=None
+) -> Recommendations:
+    """Get recommendations based on user query using vector similarity and analysis"""
+    store, version, teachers, _ = _live_index()
+    if store is None:
+        raise NotReadyError(NOT_READY_MESSAGE)
+
+    _require_query(query, "Error generating recommendations")
+    filters = normalize_filters(filters)
+    key = _result_key("recommendations", version, query, limit, filters, effort)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with tool_errors("Error generating recommendations"):
+        result = _recommend(
+            store, version, teachers, query, embed_query_cached(query), limit, filters, effort
+        )
+        result_cache.set(key, result)
+        return result
+
+
+async def aget_recommendations_tool(
+    query: str, limit: int = 5, filters=None, effort=None
+) -> Recommendations:
+    """Get recommendations without blocking the event loop"""
+    store, version, teachers, _ = _live_index()
+    if store is None:
+        raise NotReadyError(NOT_READY_MESSAGE)
+
+    _require_query(query, "Error generating recommendations")
+    filters = normalize_filters(filters)
+    key = _result_key("recommendations", version, query, limit, filters, effort)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with tool_errors("Error generating recommendations"):
+        return await in_flight.do(
+            key, _arecommend, key, store, version, teachers, query, limit, filters, effort
+        )
+
+
+async def _arecommend(key, store, version, teachers, query, limit, filters, effort):
+    embedding = await aembed_query_cached(query)
+    result = await run_sync(
+        _recommend, store, version, teachers, query, embedding, limit, filters, effort
+    )
+    result_cache.set(key, result)
+    return result
 
 
 # Create the tools
 vector_search_tool = Tool(
     name="search_reviews",
-    description="Search for teacher reviews using vector similarity. Use this to find relevant reviews based on the user's query.",
-    func=search_reviews_tool,
+    description="Search for teacher reviews by meaning and by keywords such as teacher names. Use this to find relevant reviews based on the user's query.",
+    func=as_text(search_reviews_tool),
+    coroutine=as_atext(asearch_reviews_tool),
 )
 
 teacher_reviews_tool = Tool(
     name="get_teacher_reviews",
-    description="Get all reviews for a specific teacher by their teacherId. Use this when you need to see all reviews for a particular teacher.",
-    func=get_teacher_reviews_tool,
+    description="Get rating statistics and reviews for a specific teacher by their teacherId. Use this when you need to see the reviews for a particular teacher.",
+    func=as_text(get_teacher_reviews_tool),
+    coroutine=as_atext(aget_teacher_reviews_tool),
 )
 
 recommendations_tool = Tool(
     name="get_recommendations",
     description="Get recommendations based on user query. This analyzes reviews to provide teacher recommendations with scores and themes.",
-    func=get_recommendations_tool,
+    func=as_text(get_recommendations_tool),
+    coroutine=as_atext(aget_recommendations_tool),
 )
 
 # Test database connection and collections
@@ -501,26 +1461,6 @@ def create_sample_data():
     except Exception as e:
         print(f"Error creating sample data: {e}")
 
-# Test database connection first
-test_database_connection()
-
-# Create sample data if needed
-create_sample_data()
-
-# Load reviews into vector store
-load_reviews_to_vector_store()
-
-# Print available tools for debugging
-print("\nAvailable tools:")
-all_tools = [
-    search_tool,
-    vector_search_tool,
-    teacher_reviews_tool,
-    recommendations_tool,
-] + db_tools
-for i, tool in enumerate(all_tools):
-    print(f"{i}: {tool.name} - {tool.description}")
-
 # Create the ReAct prompt template
 react_prompt = PromptTemplate.from_template("""
 You are a helpful assistant that can answer questions about teacher reviews and provide recommendations.
@@ -560,19 +1500,204 @@ Question: {input}
 Thought: {agent_scratchpad}
 """)
 
-# Create the agent with all tools including vector search
-agent = create_react_agent(llm=llm, tools=all_tools, prompt=react_prompt)
 
-# Create agent executor
-agent_executor = AgentExecutor(
-    agent=agent,
-    tools=all_tools,
-    verbose=True,
-    max_iterations=5,
-    handle_parsing_errors=True,
-)
+def connect():
+    """Connect to MongoDB and build the ReAct agent with all tools"""
+    global db, db_tools, all_tools, agent, agent_executor
+
+    db = MongoDBDatabase.from_connection_string(
+        os.environ.get("MONGODB_URI", None), database="graidea"
+    )
+
+    # Debug: Print database object attributes
+    print("MongoDBDatabase object attributes:")
+    print(f"  Type: {type(db)}")
+    print(f"  Dir: {[attr for attr in dir(db) if not attr.startswith('_')]}")
+    if hasattr(db, 'database_name'):
+        print(f"  database_name: {db.database_name}")
+    if hasattr(db, '_client'):
+        print(f"  _client: {type(db._client)}")
+
+    db_tools = MongoDBDatabaseToolkit(llm=llm, db=db).get_tools()
+
+    # Print available tools for debugging
+    print("\nAvailable tools:")
+    all_tools = [
+        search_tool,
+        vector_search_tool,
+        teacher_reviews_tool,
+        recommendations_tool,
+    ] + db_tools
+    for i, tool in enumerate(all_tools):
+        print(f"{i}: {tool.name} - {tool.description}")
+
+    # Create the agent with all tools including vector search
+    agent = create_react_agent(llm=llm, tools=all_tools, prompt=react_prompt)
+
+    # Create agent executor
+    agent_executor = AgentExecutor(
+        agent=agent,
+        tools=all_tools,
+        verbose=True,
+        max_iterations=5,
+        handle_parsing_errors=True,
+    )
+
+
+# Prefix of the answer returned when the agent runs out of iterations
+_STOPPED_ANSWER = "Agent stopped"
+
+
+async def _cached_answer(query: str):
+    """(answer, "exact" or "semantic", query embedding) from the answer cache"""
+    if answer_cache is None:
+        return None, None, None
+    answer = await answer_cache.aget_exact(query)
+    if answer is not None:
+        return answer, "exact", None
+    if not answer_cache.semantic:
+        answer_cache.miss()
+        return None, None, None
+    try:
+        vector = await aembed_query_cached(query)
+    except Exception as e:
+        print(f"✗ Answer cache lookup failed: {e}")
+        answer_cache.miss()
+        return None, None, None
+    answer = await answer_cache.aget_similar(vector)
+    return answer, "semantic" if answer is not None else None, vector
+
+
+async def _remember_answer(query, vector, answer, fingerprint):
+    if answer_cache is not None and not answer.startswith(_STOPPED_ANSWER):
+        await answer_cache.aput(query, vector, answer, fingerprint)
+
+
+# Tools the intent router calls directly, by intent
+ROUTED_TOOLS = {
+    "teacher_reviews": ("get_teacher_reviews", lambda argument: aget_teacher_reviews_tool(argument)),
+    "recommendations": ("get_recommendations", lambda argument: aget_recommendations_tool(argument)),
+    "search_reviews": ("search_reviews", lambda argument: asearch_reviews_tool(argument)),
+}
+
+
+async def _route(query: str):
+    if intent_router is None:
+        return None
+    try:
+        return await intent_router.aroute(query)
+    except Exception as e:
+        print(f"✗ Intent routing failed, using the agent: {e}")
+        return None
+
+
+async def _call_routed(route):
+    """(text answer, structured data or None) of a routed tool call"""
+    name, tool = ROUTED_TOOLS[route.intent]
+    try:
+        result = await tool(route.argument)
+    except ToolError as e:
+        return str(e), None
+    return result.to_text(), result.payload()
+
+
+async def aanswer_query(query: str) -> dict:
+    """Answer a question with a routed tool call, the answer cache or the agent"""
+    route = await _route(query)
+    if route is not None:
+        output, data = await _call_routed(route)
+        return {"output": output, "data": data, "cached": None, "routed": route.intent}
+
+    fingerprint = answer_cache.fingerprint if answer_cache is not None else None
+    answer, cached, vector = await _cached_answer(query)
+    if answer is None:
+        async with agent_limiter.slot():
+            result = await agent_executor.ainvoke({"input": query})
+        answer = result["output"]
+        await _remember_answer(query, vector, answer, fingerprint)
+    return {"output": answer, "data": None, "cached": cached, "routed": None}
+
+
+async def astream_answer(query: str):
+    """astream_agent events for a question, or a single final event when cached"""
+    route = await _route(query)
+    if route is not None:
+        name, _ = ROUTED_TOOLS[route.intent]
+        yield "tool_start", {"tool": name, "input": route.argument}
+        output, data = await _call_routed(route)
+        yield "tool_end", {"tool": name, "output": preview_output(output)}
+        yield "final", {"output": output, "data": data, "routed": route.intent}
+        return
+
+    fingerprint = answer_cache.fingerprint if answer_cache is not None else None
+    answer, cached, vector = await _cached_answer(query)
+    if answer is not None:
+        yield "final", {"output": answer, "cached": cached}
+        return
+    async with agent_limiter.slot():
+        async for event, data in astream_agent(agent_executor, query):
+            if event == "final":
+                await _remember_answer(query, vector, data["output"], fingerprint)
+            yield event, data
+
+
+def _set_phase(phase):
+    readiness["phase"] = phase
+    readiness["progress"] = None
+    print(f"Warmup: {phase}")
+
+
+def initialize():
+    """Connect, seed sample data and load the vector store
+
+    Blocking; the API runs it in a background thread from its lifespan hook.
+    """
+    readiness.update(
+        status="warming_up", error=None, started_at=datetime.now(timezone.utc).isoformat()
+    )
+    try:
+        _set_phase("connecting")
+        connect()
+
+        # Test database connection first
+        _set_phase("checking_database")
+        test_database_connection()
+        ensure_teacher_stats_indexes(get_raw_db())
+        get_raw_db().reviews.create_index([("teacherId", 1), ("_id", 1)])
+
+        # In shared mode only the elected builder writes to MongoDB and the index
+        builder = builder_lock is None or builder_lock.acquire()
+
+        # Create sample data if needed
+        if builder:
+            create_sample_data()
+
+        # Load reviews into vector store, preferring the on-disk snapshot
+        _set_phase("loading_index")
+        if builder_lock is None:
+            load_or_build_vector_store()
+        else:
+            _serve_shared_index()
+            threading.Thread(target=_watch_shared_index, name="shared-index", daemon=True).start()
+
+        # The loaded indexes live for the whole process; keeping them out of
+        # the collector spares every request a full-heap scan of them
+        gc.collect()
+        gc.freeze()
+
+        readiness.update(
+            status="ready", phase=None, ready_at=datetime.now(timezone.utc).isoformat()
+        )
+        print("✓ Agent ready")
+    except Exception as e:
+        readiness.update(status="failed", error=str(e))
+        print(f"✗ Agent initialization failed: {e}")
+        raise
+
 
 if __name__ == "__main__":
+    initialize()
+
     # Interactive loop
     print("\n" + "=" * 60)
     print("Teacher Review Chatbot with Advanced Analytics")
@@ -581,7 +1706,8 @@ if __name__ == "__main__":
     print("- Ask questions about teacher reviews")
     print("- Get recommendations for specific needs")
     print("- Analyze specific teachers by ID")
-    print("- Type 'reload' to reload reviews from MongoDB")
+    print("- Type 'reload' to sync new and changed reviews from MongoDB")
+    print("- Type 'reload full' to rebuild the vector store from scratch")
     print("- Type 'quit', 'exit', or 'q' to exit")
     print("\nExample Queries:")
     print("- 'Show me reviews for teacher ID 123'")
@@ -598,6 +1724,11 @@ if __name__ == "__main__":
             break
 
         if user_input.lower() == "reload":
+            print("Syncing reviews from MongoDB...")
+            sync_reviews_to_vector_store()
+            continue
+
+        if user_input.lower() == "reload full":
             print("Reloading reviews from MongoDB...")
             load_reviews_to_vector_store()
             continue
@@ -0,0 +1,134 @@
+"""Admission control and deadlines for agent runs.
+
+At most ``max_in_flight`` agent runs execute at once and at most
+``max_queue`` more wait for a slot; anything beyond that is refused
+straight away instead of piling onto the LLM. Every admitted request gets
+one deadline of ``timeout`` seconds, counted from its arrival, that covers
+its time in the queue and every LLM and tool call of the run: when it
+passes, whatever the run is awaiting is cancelled.
+"""
+
+from collections import deque
+from contextlib import asynccontextmanager
+import asyncio
+import time
+
+import numpy as np
+
+
+class AgentLimitError(Exception):
+    """An agent request refused or stopped by the execution limits"""
+
+    status_code = 503
+    retry_after = None
+
+
+class AgentQueueFull(AgentLimitError):
+    status_code = 429
+    retry_after = 1
+
+
+class AgentQueueTimeout(AgentLimitError):
+    status_code = 503
+    retry_after = 5
+
+
+class AgentDeadlineExceeded(AgentLimitError):
+    status_code = 504
+
+
+class AgentLimiter:
+    """Bounded concurrency, a bounded wait queue and a per-request deadline"""
+
+    def __init__(self, max_in_flight: int, max_queue: int, timeout: float):
+        self.max_in_flight = max(max_in_flight, 1)
+        self.max_queue = max(max_queue, 0)
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self.running = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.queue_timeouts = 0
+        self.deadline_exceeded = 0
+        self._waits = deque(maxlen=1000)
+        self._runs = deque(maxlen=1000)
+
+    @property
+    def saturated(self) -> bool:
+        """Whether a new request would be refused right now"""
+        return self.running >= self.max_in_flight and self.queued >= self.max_queue
+
+    def rejected_error(self) -> AgentQueueFull:
+        """Count a refused request and build its error"""
+        self.rejected += 1
+        return AgentQueueFull(
+            f"Agent is at capacity ({self.running} running, {self.queued} queued)"
+        )
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one execution slot for the body, within the request's deadline"""
+        if self.saturated:
+            raise self.rejected_error()
+
+        deadline = asyncio.get_running_loop().time() + self.timeout
+        arrived = time.perf_counter()
+        if not self._slots.locked():
+            await self._slots.acquire()
+        else:
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+            try:
+                async with asyncio.timeout_at(deadline):
+                    await self._slots.acquire()
+            except TimeoutError:
+                self.queue_timeouts += 1
+                raise AgentQueueTimeout(
+                    f"Timed out after {self.timeout}s waiting for an agent slot"
+                ) from None
+            finally:
+                self.queued -= 1
+
+        started = time.perf_counter()
+        self._waits.append(started - arrived)
+        self.admitted += 1
+        self.running += 1
+        try:
+            async with asyncio.timeout_at(deadline):
+                yield
+        except TimeoutError:
+            self.deadline_exceeded += 1
+            raise AgentDeadlineExceeded(
+                f"Agent did not finish within {self.timeout}s"
+            ) from None
+        finally:
+            self.running -= 1
+            self._slots.release()
+            self._runs.append(time.perf_counter() - started)
+
+    def stats(self):
+        """Queue depth, wait and run time metrics for /stats"""
+        waits = np.array(self._waits) * 1000
+        runs = np.array(self._runs) * 1000
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "timeout_s": self.timeout,
+            "running": self.running,
+            "queue_depth": self.queued,
+            "peak_queue_depth": self.peak_queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "queue_timeouts": self.queue_timeouts,
+            "deadline_exceeded": self.deadline_exceeded,
+            "recent_wait_ms": {
+                "p50": round(float(np.percentile(waits, 50)), 3) if len(waits) else 0.0,
+                "p99": round(float(np.percentile(waits, 99)), 3) if len(waits) else 0.0,
+            },
+            "recent_run_ms": {
+                "p50": round(float(np.percentile(runs, 50)), 3) if len(runs) else 0.0,
+                "p99": round(float(np.percentile(runs, 99)), 3) if len(runs) else 0.0,
+            },
+        }
@@ -0,0 +1,85 @@
+"""Progress events for one ReAct agent run.
+
+``astream_agent`` turns the executor's callback events into a short, stable
+sequence a client can render while the agent works:
+
+    tool_start   {"tool": ..., "input": ...}
+    tool_end     {"tool": ..., "output": ...}   output trimmed to a preview
+    token        {"text": ...}                 final answer text as it streams
+    final        {"output": ...}               the complete answer
+
+The model streams its whole ReAct transcript (thoughts, actions, answer);
+only the text after "Final Answer:" is forwarded as tokens.
+"""
+
+FINAL_ANSWER_PREFIX = "Final Answer:"
+
+# Characters of a tool's output included in its tool_end event
+TOOL_OUTPUT_PREVIEW = 500
+
+
+class FinalAnswerFilter:
+    """Passes through only the streamed text after the final answer prefix"""
+
+    def __init__(self, prefix=FINAL_ANSWER_PREFIX):
+        self.prefix = prefix
+        self._buffer = ""
+        self._found = False
+        self._started = False
+
+    def feed(self, text: str) -> str:
+        if not self._found:
+            # The prefix may be split across chunks, so search the whole buffer
+            self._buffer += text
+            position = self._buffer.find(self.prefix)
+            if position < 0:
+                return ""
+            self._found = True
+            text = self._buffer[position + len(self.prefix):]
+            self._buffer = ""
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+
+def _chunk_text(chunk) -> str:
+    content = getattr(chunk, "content", None)
+    if content is None:
+        return getattr(chunk, "text", "") or ""
+    if isinstance(content, list):
+        # Multi-part messages (e.g. Gemini) carry text in typed parts
+        return "".join(
+            part if isinstance(part, str) else part.get("text", "") for part in content
+        )
+    return content
+
+
+def preview_output(output) -> str:
+    """A tool output trimmed for a tool_end event"""
+    text = output if isinstance(output, str) else str(output)
+    if len(text) > TOOL_OUTPUT_PREVIEW:
+        return text[:TOOL_OUTPUT_PREVIEW] + "..."
+    return text
+
+
+async def astream_agent(executor, query: str):
+    """Yield (event, data) pairs for one agent run as they happen"""
+    answers = {}
+    async for event in executor.astream_events({"input": query}, version="v2"):
+        kind = event["event"]
+        if kind in ("on_chat_model_stream", "on_llm_stream"):
+            # Each LLM call of the loop gets its own filter
+            answer = answers.setdefault(event["run_id"], FinalAnswerFilter())
+            text = answer.feed(_chunk_text(event["data"]["chunk"]))
+            if text:
+                yield "token", {"text": text}
+        elif kind == "on_chain_stream" and not event["parent_ids"]:
+            # The executor's own chunks: actions it chose, their results, the answer
+            chunk = event["data"]["chunk"]
+            for action in chunk.get("actions", []):
+                yield "tool_start", {"tool": action.tool, "input": action.tool_input}
+            for step in chunk.get("steps", []):
+                yield "tool_end", {"tool": step.action.tool, "output": preview_output(step.observation)}
+            if "output" in chunk:
+                yield "final", {"output": chunk["output"]}
@@ -0,0 +1,444 @@
+"""FAISS index construction and maintenance for the review vector store.
+
+The index type is configurable:
+
+    flat    exact search, cost grows linearly with the number of reviews
+    ivf     inverted lists over k-means cells; needs a training step and
+            searches ``nprobe`` of ``nlist`` cells
+    hnsw    graph index; no training, searches with a candidate list of
+            ``efSearch``
+
+IVF and HNSW trade recall for latency through one per-query "effort" knob
+(nprobe for IVF, efSearch for HNSW). Neither can drop vectors the way the
+flat index does, so removals rebuild their storage here instead of going
+through ``FAISS.delete``.
+
+Delta syncs do not copy or rebuild the served index. They change an
+``OverlayIndex``: the served index as a shared, never written base, plus a
+small flat index of rows added since and a list of removed rows. Searches
+merge the two and skip removed rows. Once the changes pass
+``VECTOR_OVERLAY_MAX_FRACTION`` of the documents, ``compact_overlay`` folds
+them into a plain index again; that is the only time an HNSW graph is
+rebuilt for removals.
+"""
+
+import faiss
+import numpy as np
+
+from settings import (
+    VECTOR_HNSW_EF_CONSTRUCTION,
+    VECTOR_HNSW_EF_SEARCH,
+    VECTOR_HNSW_M,
+    VECTOR_INDEX_TYPE,
+    VECTOR_IVF_NLIST,
+    VECTOR_IVF_NPROBE,
+    VECTOR_OVERLAY_MAX_FRACTION,
+)
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+
+# FAISS warns below 39 training points per IVF cell
+IVF_POINTS_PER_LIST = 39
+
+
+def create_index(dimension, index_type=VECTOR_INDEX_TYPE, nlist=VECTOR_IVF_NLIST):
+    """Create an empty index of the configured type"""
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dimension)
+    if index_type == "ivf":
+        index = faiss.index_factory(dimension, f"IVF{nlist},Flat")
+        index.nprobe = min(VECTOR_IVF_NPROBE, nlist)
+        return index
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, VECTOR_HNSW_M)
+        index.hnsw.efConstruction = VECTOR_HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = VECTOR_HNSW_EF_SEARCH
+        return index
+    raise ValueError(f"Unknown VECTOR_INDEX_TYPE {index_type!r}, expected one of {INDEX_TYPES}")
+
+
+def index_kind(index) -> str:
+    """Short name of an index's type: flat, ivf or hnsw"""
+    if isinstance(index, OverlayIndex):
+        return index_kind(index.base)
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def describe_index(index) -> dict:
+    """Type and parameters of an index, as reported by /stats"""
+    if isinstance(index, OverlayIndex):
+        return dict(
+            describe_index(index.base),
+            overlay_added=index.added.ntotal,
+            overlay_removed=len(index.removed),
+        )
+    info = {
+        "type": index_kind(index),
+        "class": type(index).__name__,
+        "trained": bool(index.is_trained),
+    }
+    # Search defaults are the ones queries actually use, not those saved in the index
+    if isinstance(index, faiss.IndexIVF):
+        info.update(nlist=index.nlist, nprobe=min(VECTOR_IVF_NPROBE, index.nlist))
+    elif isinstance(index, faiss.IndexHNSW):
+        info.update(
+            M=index.hnsw.nb_neighbors(1),
+            ef_construction=index.hnsw.efConstruction,
+            ef_search=VECTOR_HNSW_EF_SEARCH,
+        )
+    return info
+
+
+def training_size(index) -> int:
+    """Vectors to collect before training; 0 when the index needs no training"""
+    if index.is_trained:
+        return 0
+    return index.nlist * IVF_POINTS_PER_LIST
+
+
+def train_index(index, vectors):
+    """Train an empty index, shrinking nlist when there are too few vectors
+
+    Returns the trained index, which is a new object if nlist was reduced.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if index.is_trained:
+        return index
+    if isinstance(index, faiss.IndexIVF) and len(vectors) < training_size(index):
+        nlist = max(1, len(vectors) // IVF_POINTS_PER_LIST)
+        if nlist != index.nlist:
+            print(
+                f"Only {len(vectors)} vectors to train on, "
+                f"using nlist={nlist} instead of {index.nlist}"
+            )
+            index = create_index(index.d, "ivf", nlist)
+    index.train(vectors)
+    return index
+
+
+def search_parameters(index, k, selector=None, effort=None):
+    """FAISS search parameters for one query
+
+    ``effort`` is the per-query accuracy/speed knob: nprobe for IVF,
+    efSearch for HNSW. It is ignored by the flat index.
+    """
+    if isinstance(index, faiss.IndexIVF):
+        nprobe = min(effort or VECTOR_IVF_NPROBE, index.nlist)
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        # HNSW cannot return more hits than its candidate list
+        ef_search = max(effort or VECTOR_HNSW_EF_SEARCH, k)
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
+
+
+def _empty_ivf(index):
+    # An IVF index with a clone of another's coarse quantizer and empty lists
+    quantizer = faiss.clone_index(index.quantizer)
+    empty = faiss.IndexIVFFlat(quantizer, index.d, index.nlist, index.metric_type)
+    empty.own_fields = True
+    quantizer.this.disown()
+    empty.nprobe = index.nprobe
+    return empty
+
+
+def search_index(index, queries, k, mask=None, effort=None):
+    """FAISS (distances, rows) of the k nearest rows, restricted to ``mask`` if given"""
+    if isinstance(index, OverlayIndex):
+        return index.search(queries, k, mask, effort)
+    selector = bitmap = None
+    if mask is not None:
+        # Bit i of the bitmap selects FAISS row i; the bitmap must outlive the search
+        bitmap = np.packbits(mask, bitorder="little")
+        selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+    return index.search(queries, k, params=search_parameters(index, k, selector, effort))
+
+
+class OverlayIndex:
+    """Copy-on-write view of an index: a shared base, rows added since and removed rows
+
+    Rows are numbered through the base, then the added rows. The base is
+    never written to, so ``fork`` copies only the added rows and the removed
+    row numbers, however large the base is.
+    """
+
+    def __init__(self, base, added=None, removed=None):
+        self.base = base
+        self.added = faiss.IndexFlatL2(base.d) if added is None else added
+        self.removed = np.zeros(0, dtype=np.int64) if removed is None else removed
+        self._live = None
+
+    @property
+    def d(self):
+        return self.base.d
+
+    @property
+    def ntotal(self):
+        return self.base.ntotal + self.added.ntotal
+
+    @property
+    def is_trained(self):
+        return True
+
+    def fork(self):
+        """Overlay over the same base to change while this one serves searches"""
+        return OverlayIndex(self.base, faiss.clone_index(self.added), self.removed.copy())
+
+    def changes(self) -> int:
+        """Rows added or removed since the base"""
+        return self.added.ntotal + len(self.removed)
+
+    def add(self, vectors):
+        self.added.add(np.asarray(vectors, dtype=np.float32))
+        self._live = None
+
+    def remove_rows(self, rows):
+        self.removed = np.union1d(self.removed, np.asarray(rows, dtype=np.int64))
+        self._live = None
+
+    def truncate(self, ntotal):
+        self.added.remove_ids(faiss.IDSelectorRange(ntotal - self.base.ntotal, self.added.ntotal))
+        self.removed = self.removed[self.removed < ntotal]
+        self._live = None
+
+    def live(self) -> np.ndarray:
+        """Boolean mask of the rows not removed"""
+        # Built once per overlay; a published overlay no longer changes
+        live = self._live
+        if live is None:
+            live = np.ones(self.ntotal, dtype=bool)
+            live[self.removed] = False
+            self._live = live
+        return live
+
+    def search(self, queries, k, mask=None, effort=None):
+        """``search_index`` over the base and the added rows, merged by distance"""
+        mask = self.live() if mask is None else mask & self.live()
+        split = self.base.ntotal
+        distances, rows = [], []
+        for index, part, offset in ((self.base, mask[:split], 0), (self.added, mask[split:], split)):
+            matches = int(part.sum())
+            if not matches:
+                continue
+            part_k = min(k, matches)
+            part_distances, part_rows = search_index(
+                index, queries, part_k, None if matches == len(part) else part, effort
+            )
+            distances.append(part_distances)
+            rows.append(np.where(part_rows >= 0, part_rows + offset, -1))
+        if not rows:
+            empty = np.zeros((len(queries), 0), dtype=np.float32)
+            return empty, empty.astype(np.int64)
+        distances, rows = np.concatenate(distances, axis=1), np.concatenate(rows, axis=1)
+        # Both parts are L2; empty slots sort last
+        distances[rows < 0] = np.finfo(np.float32).max
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(distances, order, 1), np.take_along_axis(rows, order, 1)
+
+    def reconstruct_rows(self, rows):
+        """``reconstruct_rows`` over the base and the added rows"""
+        rows = np.asarray(rows, dtype=np.int64)
+        vectors = np.empty((len(rows), self.d), dtype=np.float32)
+        in_base = rows < self.base.ntotal
+        if in_base.any():
+            vectors[in_base] = reconstruct_rows(self.base, rows[in_base])
+        if not in_base.all():
+            vectors[~in_base] = self.added.reconstruct_batch(rows[~in_base] - self.base.ntotal)
+        return vectors
+
+
+def _compact_ivf(index, keep, target=None):
+    # Copy the inverted lists, dropping removed rows and renumbering the rest
+    # so FAISS ids stay equal to positions in index_to_docstore_id. The lists
+    # go to ``target``, by default the index itself
+    target = index if target is None else target
+    invlists = index.invlists
+    code_size = invlists.code_size
+    new_ids = np.cumsum(keep, dtype=np.int64) - 1
+    compacted = faiss.ArrayInvertedLists(index.nlist, code_size)
+    for list_no in range(index.nlist):
+        size = invlists.list_size(list_no)
+        if not size:
+            continue
+        ids_ptr = invlists.get_ids(list_no)
+        codes_ptr = invlists.get_codes(list_no)
+        ids = faiss.rev_swig_ptr(ids_ptr, size).copy()
+        codes = faiss.rev_swig_ptr(codes_ptr, size * code_size).reshape(size, code_size)
+        selected = keep[ids]
+        if selected.any():
+            # swig_ptr does not keep its array alive, so hold both here
+            kept_ids = np.ascontiguousarray(new_ids[ids[selected]])
+            kept_codes = np.ascontiguousarray(codes[selected])
+            compacted.add_entries(
+                list_no, len(kept_ids), faiss.swig_ptr(kept_ids), faiss.swig_ptr(kept_codes)
+            )
+        invlists.release_codes(list_no, codes_ptr)
+        invlists.release_ids(list_no, ids_ptr)
+    target.replace_invlists(compacted, True)
+    compacted.this.disown()
+    target.ntotal = int(keep.sum())
+    return target
+
+
+def _copy_rows(index, keep, target, chunk_size=65536):
+    # Add the kept vectors of an index to another one, a chunk at a time
+    for start in range(0, index.ntotal, chunk_size):
+        stop = min(start + chunk_size, index.ntotal)
+        vectors = index.reconstruct_n(start, stop - start)
+        target.add(vectors[keep[start:stop]])
+    return target
+
+
+def _rebuild_hnsw(index, keep):
+    # HNSW graphs cannot drop nodes; re-insert the surviving vectors
+    rebuilt = faiss.IndexHNSWFlat(index.d, index.hnsw.nb_neighbors(1))
+    rebuilt.hnsw.efConstruction = index.hnsw.efConstruction
+    rebuilt.hnsw.efSearch = index.hnsw.efSearch
+    return _copy_rows(index, keep, rebuilt)
+
+
+def truncate_index(index, ntotal):
+    """Drop the rows past ``ntotal``, undoing a partial add; returns the index"""
+    if index.ntotal <= ntotal:
+        return index
+    if isinstance(index, OverlayIndex):
+        index.truncate(ntotal)
+        return index
+    if isinstance(index, faiss.IndexHNSW):
+        keep = np.zeros(index.ntotal, dtype=bool)
+        keep[:ntotal] = True
+        return _rebuild_hnsw(index, keep)
+    index.remove_ids(faiss.IDSelectorRange(ntotal, index.ntotal))
+    return index
+
+
+def reconstruct_rows(index, rows):
+    """Stored vectors for the given FAISS rows, in the same order"""
+    if isinstance(index, OverlayIndex):
+        return index.reconstruct_rows(rows)
+    rows = np.asarray(rows, dtype=np.int64)
+    if not isinstance(index, faiss.IndexIVF):
+        return index.reconstruct_batch(rows)
+
+    # IVF keeps no row -> list map; find the rows in one pass over the lists
+    position = np.full(index.ntotal, -1, dtype=np.int64)
+    position[rows] = np.arange(len(rows))
+    vectors = np.empty((len(rows), index.d), dtype=np.float32)
+    invlists = index.invlists
+    for list_no in range(index.nlist):
+        size = invlists.list_size(list_no)
+        if not size:
+            continue
+        ids_ptr = invlists.get_ids(list_no)
+        codes_ptr = invlists.get_codes(list_no)
+        found = position[faiss.rev_swig_ptr(ids_ptr, size)]
+        hit = found >= 0
+        if hit.any():
+            # IVFFlat codes are the raw float32 vectors
+            codes = faiss.rev_swig_ptr(codes_ptr, size * invlists.code_size)
+            vectors[found[hit]] = codes.view(np.float32).reshape(size, index.d)[hit]
+        invlists.release_codes(list_no, codes_ptr)
+        invlists.release_ids(list_no, ids_ptr)
+    return vectors
+
+
+def reconstruct_documents(vector_store, ids):
+    """Stored vectors for documents of a vector store, in the order given"""
+    rows_by_id = {doc_id: row for row, doc_id in vector_store.index_to_docstore_id.items()}
+    return reconstruct_rows(vector_store.index, [rows_by_id[doc_id] for doc_id in ids])
+
+
+def make_writable(index):
+    """Copy memory-mapped IVF lists into memory so vectors can be added
+
+    ``IO_FLAG_MMAP`` maps only IVF lists, which are read-only; flat and HNSW
+    indexes read with it are loaded into memory and already writable. Indexes
+    read with ``IO_FLAG_MMAP_IFC`` are mapped read-only whatever their type
+    and are not handled here.
+    """
+    if isinstance(index, faiss.IndexIVF) and not isinstance(
+        faiss.downcast_InvertedLists(index.invlists), faiss.ArrayInvertedLists
+    ):
+        return _compact_ivf(index, np.ones(index.ntotal, dtype=bool))
+    return index
+
+
+def remove_documents(vector_store, ids):
+    """Remove documents from a vector store whatever its index type"""
+    index = vector_store.index
+    if isinstance(index, OverlayIndex):
+        # Rows are only marked removed; their numbers stay unused until compaction
+        ids = set(ids)
+        mapping = vector_store.index_to_docstore_id
+        rows = [row for row, doc_id in mapping.items() if doc_id in ids]
+        if not rows:
+            return
+        index.remove_rows(rows)
+        vector_store.docstore.delete([mapping.pop(row) for row in rows])
+        return
+    if index_kind(index) == "flat":
+        vector_store.delete(ids)
+        return
+
+    ids = set(ids)
+    mapping = vector_store.index_to_docstore_id
+    keep = np.ones(index.ntotal, dtype=bool)
+    for row, doc_id in mapping.items():
+        if doc_id in ids:
+            keep[row] = False
+    if keep.all():
+        return
+
+    if isinstance(index, faiss.IndexIVF):
+        vector_store.index = _compact_ivf(index, keep)
+    else:
+        vector_store.index = _rebuild_hnsw(index, keep)
+    kept_rows = np.flatnonzero(keep)
+    vector_store.index_to_docstore_id = {
+        new_row: mapping[int(old_row)] for new_row, old_row in enumerate(kept_rows)
+    }
+    vector_store.docstore.delete([doc_id for doc_id in mapping.values() if doc_id in ids])
+
+
+def overlay_index(index):
+    """Copy-on-write overlay over an index, or a fork of an overlay"""
+    if isinstance(index, OverlayIndex):
+        return index.fork()
+    return OverlayIndex(index)
+
+
+def compact_overlay(vector_store, max_fraction=VECTOR_OVERLAY_MAX_FRACTION):
+    """Fold a large enough overlay into a plain index, renumbering the rows
+
+    Returns whether it did. The base is read, never modified, so the
+    published store keeps serving meanwhile. For HNSW this rebuilds the
+    graph from every live vector.
+    """
+    index = vector_store.index
+    mapping = vector_store.index_to_docstore_id
+    if not isinstance(index, OverlayIndex) or index.changes() <= max_fraction * len(mapping):
+        return False
+
+    base, keep = index.base, index.live()
+    split = base.ntotal
+    kind = index_kind(base)
+    if kind == "ivf":
+        compacted = _compact_ivf(base, keep[:split], _empty_ivf(base))
+    elif kind == "hnsw":
+        compacted = _rebuild_hnsw(base, keep[:split])
+    else:
+        compacted = _copy_rows(base, keep[:split], faiss.IndexFlatL2(base.d))
+    _copy_rows(index.added, keep[split:], compacted)
+
+    new_rows = np.cumsum(keep) - 1
+    vector_store.index = compacted
+    vector_store.index_to_docstore_id = {
+        int(new_rows[row]): doc_id for row, doc_id in sorted(mapping.items())
+    }
+    return True
@@ -0,0 +1,228 @@
+"""Persistent cache of agent answers with exact and semantic lookup.
+
+Answers are stored in SQLite with the query that produced them, the query's
+embedding and the fingerprint of the review index they were computed from.
+A question is served from the cache when its normalized text matches a
+stored query exactly, or when its embedding is at least ``threshold``
+cosine-similar to a stored one. Entries expire after ``ttl`` seconds, and
+all entries of another index fingerprint are dropped when the index changes,
+so a restart against an unchanged index keeps the cache warm.
+
+The ``a``-prefixed methods run lookups and writes on a worker thread, so
+SQLite never blocks the event loop; hits note their last_used time in
+memory and write it out in batches.
+"""
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from query_cache import normalize_query
+
+# Hits whose last_used time is noted before it is written out
+_TOUCH_BATCH = 100
+
+
+def index_fingerprint(doc_hashes, *parts) -> str:
+    """Content hash of an index from its (doc id -> text hash) map"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(f"{part}\0".encode("utf-8"))
+    for doc_id, text_hash in sorted(doc_hashes.items()):
+        digest.update(f"{doc_id}:{text_hash}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class AnswerCache:
+    """SQLite-backed answer cache with an in-memory matrix for semantic lookup"""
+
+    def __init__(self, path: str, ttl: float, threshold: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_entries = max(max_entries, 1)
+        self.fingerprint = None
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self._lock = threading.Lock()
+        self._touched = {}  # key -> last_used not yet written
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " key TEXT PRIMARY KEY, query TEXT NOT NULL, vector BLOB,"
+            " answer TEXT NOT NULL, fingerprint TEXT NOT NULL,"
+            " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        self._load_vectors()
+
+    @property
+    def semantic(self) -> bool:
+        return self.threshold <= 1.0
+
+    def set_index(self, fingerprint: str):
+        """Drop answers computed from any other version of the index"""
+        with self._lock:
+            self.fingerprint = fingerprint
+            cursor = self._conn.execute(
+                "DELETE FROM answers WHERE fingerprint != ? OR created_at < ?",
+                (fingerprint, time.time() - self.ttl),
+            )
+            self.invalidated += cursor.rowcount
+            self._entries -= cursor.rowcount
+            self._conn.commit()
+            self._load_vectors()
+
+    def _load_vectors(self):
+        # Unit-length query embeddings of the live entries, one row each
+        rows = self._conn.execute(
+            "SELECT key, vector, created_at FROM answers"
+            " WHERE fingerprint = ? AND vector IS NOT NULL",
+            (self.fingerprint or "",),
+        ).fetchall()
+        self._keys = [key for key, _, _ in rows]
+        self._created = np.array([created for _, _, created in rows], dtype=np.float64)
+        vectors = [np.frombuffer(blob, dtype=np.float32) for _, blob, _ in rows]
+        self._matrix = np.vstack(vectors) if vectors else None
+
+    def get_exact(self, query: str):
+        """Cached answer for the same normalized question, or None"""
+        key = normalize_query(query)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer FROM answers"
+                " WHERE key = ? AND fingerprint = ? AND created_at >= ?",
+                (key, self.fingerprint or "", time.time() - self.ttl),
+            ).fetchone()
+            if row is None:
+                return None
+            self.exact_hits += 1
+            self._touch(key)
+            return row[0]
+
+    def get_similar(self, vector):
+        """Cached answer for the most similar earlier question above the threshold"""
+        with self._lock:
+            if self._matrix is not None:
+                query = _unit(vector)
+                similarity = self._matrix @ query
+                similarity[self._created < time.time() - self.ttl] = -1.0
+                best = int(np.argmax(similarity))
+                if similarity[best] >= self.threshold:
+                    row = self._conn.execute(
+                        "SELECT answer FROM answers WHERE key = ?", (self._keys[best],)
+                    ).fetchone()
+                    if row is not None:
+                        self.semantic_hits += 1
+                        self._touch(self._keys[best])
+                        return row[0]
+            self.misses += 1
+            return None
+
+    async def aget_exact(self, query: str):
+        return await asyncio.to_thread(self.get_exact, query)
+
+    async def aget_similar(self, vector):
+        return await asyncio.to_thread(self.get_similar, vector)
+
+    def miss(self):
+        """Count a lookup that skipped the semantic layer"""
+        with self._lock:
+            self.misses += 1
+
+    def _touch(self, key):
+        # Callers hold the lock
+        self._touched[key] = time.time()
+        if len(self._touched) >= _TOUCH_BATCH:
+            self._write_touched()
+            self._conn.commit()
+
+    def _write_touched(self):
+        # Callers hold the lock and commit
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE answers SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def put(self, query: str, vector, answer: str, fingerprint: str):
+        """Store an answer computed against the index with ``fingerprint``"""
+        with self._lock:
+            # The index changed while the agent was running
+            if fingerprint != self.fingerprint:
+                return
+            now = time.time()
+            key = normalize_query(query)
+            unit = _unit(vector) if vector is not None else None
+            blob = unit.tobytes() if unit is not None else None
+            exists = self._conn.execute(
+                "SELECT 1 FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers"
+                " (key, query, vector, answer, fingerprint, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, query, blob, answer, fingerprint, now, now),
+            )
+            self._entries += exists is None
+            if self._entries > self.max_entries:
+                # Eviction must see recent hits, so their times are written first
+                self._write_touched()
+                # Trim to 90% so eviction is not triggered on every insert
+                cursor = self._conn.execute(
+                    "DELETE FROM answers WHERE key IN ("
+                    " SELECT key FROM answers ORDER BY last_used LIMIT ?)",
+                    (self._entries - int(self.max_entries * 0.9),),
+                )
+                self._entries -= cursor.rowcount
+                self._conn.commit()
+                self._load_vectors()
+                return
+            self._conn.commit()
+            if unit is not None:
+                self._add_vector(key, unit, now)
+
+    async def aput(self, query: str, vector, answer: str, fingerprint: str):
+        await asyncio.to_thread(self.put, query, vector, answer, fingerprint)
+
+    def _add_vector(self, key, unit, created_at):
+        if key in self._keys:
+            row = self._keys.index(key)
+            self._matrix[row] = unit
+            self._created[row] = created_at
+            return
+        self._keys.append(key)
+        self._created = np.append(self._created, created_at)
+        self._matrix = unit[None, :] if self._matrix is None else np.vstack([self._matrix, unit])
+
+    def stats(self):
+        """Hit rates per layer for /stats"""
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "lookups": lookups,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+            "exact_hit_rate": round(self.exact_hits / lookups, 4) if lookups else 0.0,
+            "semantic_hit_rate": round(self.semantic_hits / lookups, 4) if lookups else 0.0,
+            "entries": self._entries,
+            "invalidated": self.invalidated,
+            "similarity_threshold": self.threshold,
+            "ttl": self.ttl,
+            "index_fingerprint": self.fingerprint,
+        }
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
@@ -1,49 +1,167 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List, Literal, Union
+import asyncio
+import os
 import uvicorn
-import json
+import orjson
 import agent
+from agent_limits import AgentLimitError
+from ann_index import describe_index, index_kind
+from columnar_docstore import ColumnarDocstore
+from embedding_cache import CachedEmbeddings
+from settings import BATCH_MAX_QUERIES
+from teacher_stats import aget_leaderboard
+from tool_results import InvalidArgumentError, NotFoundError, ReviewSearch, ToolError
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up the agent in the background so the port binds immediately"""
+    app.state.warmup = asyncio.create_task(asyncio.to_thread(agent.initialize))
+    yield
+
 
 app = FastAPI(
     title="Teacher Review API",
     description="API for caching teacher reviews and providing recommendations",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 
+def require_ready():
+    """Fail fast with 503 until the agent has finished warming up"""
+    if agent.readiness["status"] != "ready":
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service is warming up ({agent.readiness['phase'] or agent.readiness['status']})",
+            headers={"Retry-After": "5"},
+        )
+
+
 # Pydantic models for request/response
 class TeacherQuery(BaseModel):
     teacher_id: int
+    after: Optional[str] = None  # next_cursor from the previous page
+    limit: Optional[int] = Field(None, ge=1)
+
+
+class ReviewFilters(BaseModel):
+    teacher_id: Optional[int] = None
+    student_id: Optional[int] = None
+    min_rating: Optional[float] = None
+    max_rating: Optional[float] = None
 
 
 class SearchQuery(BaseModel):
     query: str
-    limit: Optional[int] = 5
+    limit: int = Field(5, ge=1, le=100)
+    filters: Optional[ReviewFilters] = None
+    # ANN accuracy/speed knob: nprobe for IVF, efSearch for HNSW
+    effort: Optional[int] = Field(None, ge=1, le=4096)
+    # lexical answers from the BM25 index alone, without an embedding call
+    mode: Optional[Literal["hybrid", "vector", "lexical"]] = None
 
 
 class RecommendationQuery(BaseModel):
     query: str
-    limit: Optional[int] = 5
+    limit: int = Field(5, ge=1, le=100)
+    filters: Optional[ReviewFilters] = None
+    effort: Optional[int] = Field(None, ge=1, le=4096)
+
+
+class BatchQuery(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_QUERIES)
+    limit: int = Field(5, ge=1, le=100)
+    filters: Optional[ReviewFilters] = None
+    effort: Optional[int] = Field(None, ge=1, le=4096)
+
+
+class BatchSearchQuery(BatchQuery):
+    mode: Optional[Literal["hybrid", "vector", "lexical"]] = None
+
+
+class BatchRecommendationQuery(BatchQuery):
+    pass
 
 
 class CacheResponse(BaseModel):
     success: bool
     message: str
+    job_id: Optional[str] = None
+    status: Optional[str] = None  # queued, running, succeeded or failed
+    progress: Optional[str] = None
     total_reviews: Optional[int] = None
+    added: Optional[int] = None
+    updated: Optional[int] = None
+    removed: Optional[int] = None
     error: Optional[str] = None
 
 
 class ReviewResponse(BaseModel):
     success: bool
-    data: Optional[Dict[str, Any]] = None
+    data: Optional[Union[Dict[str, Any], List[Dict[str, Any]]]] = None
     error: Optional[str] = None
+    error_code: Optional[str] = None
+    search_mode: Optional[str] = None  # hybrid, vector or lexical, for review searches
 
 
 class RecommendationResponse(BaseModel):
     success: bool
     data: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
+    error_code: Optional[str] = None
+
+
+class BatchItem(BaseModel):
+    query: str
+    success: bool
+    data: Optional[Union[Dict[str, Any], List[Dict[str, Any]]]] = None
+    error: Optional[str] = None
+    error_code: Optional[str] = None
+    search_mode: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    success: bool
+    results: List[BatchItem] = []
+    error: Optional[str] = None
+
+
+def _filters(filters: Optional[ReviewFilters]):
+    return filters.model_dump(exclude_none=True) if filters else None
+
+
+def _tool_response(result, **extra) -> ORJSONResponse:
+    """Serialize a tool result once, straight from its payload"""
+    return ORJSONResponse(
+        {"success": True, "data": result.payload(), "error": None, "error_code": None, **extra}
+    )
+
+
+def _tool_error(e: ToolError) -> ORJSONResponse:
+    return ORJSONResponse(
+        {"success": False, "data": None, "error": str(e), "error_code": e.code},
+        status_code=e.status_code,
+    )
+
+
+def _batch_response(queries, results) -> ORJSONResponse:
+    """Pair each query with its result payload or its error"""
+    items = []
+    for query, result in zip(queries, results):
+        if isinstance(result, ToolError):
+            item = {"success": False, "data": None, "error": str(result), "error_code": result.code}
+        else:
+            item = {"success": True, "data": result.payload(), "error": None, "error_code": None}
+            if isinstance(result, ReviewSearch):
+                item["search_mode"] = result.mode
+        items.append({"query": query, **item})
+    return ORJSONResponse({"success": True, "results": items, "error": None})
 
 
 @app.get("/")
@@ -53,11 +171,18 @@ async def root():
         "message": "Teacher Review API",
         "version": "1.0.0",
         "endpoints": {
-            "cache_reviews": "POST /cache-reviews - Cache all reviews from MongoDB",
-            "get_teacher_reviews": "POST /teacher-reviews - Get reviews for specific teacher",
-            "search_reviews": "POST /search-reviews - Search reviews using vector similarity",
+            "cache_reviews": "POST /cache-reviews?mode=delta|full - Start a background sync of reviews from MongoDB",
+            "cache_reviews_status": "GET /cache-reviews/{job_id} - Status and progress of a sync job",
+            "get_teacher_reviews": "POST /teacher-reviews - Get a page of reviews for specific teacher",
+            "stream_teacher_reviews": "POST /teacher-reviews/stream - Stream all reviews for a teacher as NDJSON",
+            "search_reviews": "POST /search-reviews - Search reviews (hybrid, vector or lexical)",
             "get_recommendations": "POST /recommendations - Get teacher recommendations",
+            "search_reviews_batch": "POST /search-reviews/batch - Search reviews for many queries at once",
+            "get_recommendations_batch": "POST /recommendations/batch - Get recommendations for many queries at once",
+            "agent_query_stream": "POST /agent-query/stream - Stream agent steps and answer tokens as Server-Sent Events",
+            "leaderboard": "GET /leaderboard?limit=10&min_reviews=1 - Top rated teachers",
             "health": "GET /health - Check API health",
+            "ready": "GET /ready - Check warmup progress",
         },
     }
 
@@ -72,127 +197,300 @@ async def health_check():
     }
 
 
-@app.post("/cache-reviews", response_model=CacheResponse)
-async def cache_reviews():
-    """Cache all reviews from MongoDB into the vector store"""
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint reporting warmup progress"""
+    ready = agent.readiness["status"] == "ready"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            **agent.readiness,
+            "total_documents": len(agent.vector_store.index_to_docstore_id) if agent.vector_store else 0,
+        },
+    )
+
+
+def _job_response(job) -> CacheResponse:
+    result = job.result or {}
+    messages = {
+        "queued": f"Queued a {job.mode} sync; the current index is served until it is published.",
+        "running": f"Running a {job.mode} sync; the current index is served until it is published.",
+        "succeeded": (
+            f"Successfully cached reviews. Added {result.get('added')}, "
+            f"updated {result.get('updated')}, removed {result.get('removed')} reviews."
+        ),
+        "failed": "Failed to cache reviews; the previous index is still served",
+    }
+    return CacheResponse(
+        success=job.status != "failed",
+        message=messages[job.status],
+        job_id=job.id,
+        status=job.status,
+        progress=job.progress,
+        total_reviews=result.get("total"),
+        added=result.get("added"),
+        updated=result.get("updated"),
+        removed=result.get("removed"),
+        error=job.error,
+    )
+
+
+@app.post(
+    "/cache-reviews",
+    response_model=CacheResponse,
+    status_code=202,
+    dependencies=[Depends(require_ready)],
+)
+async def cache_reviews(mode: Literal["delta", "full"] = "delta"):
+    """Start a background sync of reviews from MongoDB into the vector store
+
+    ``delta`` (default) embeds only new or changed reviews and drops removed
+    ones; ``full`` rebuilds the whole index from scratch. Either way the new
+    index version is built next to the live one and swapped in once complete.
+    Returns the job id to poll at ``GET /cache-reviews/{job_id}``. With a
+    shared index the builder worker runs the job and every worker swaps in
+    the snapshot version it publishes.
+    """
+    job = await agent.run_sync(agent.reindex_jobs.submit, mode)
+    return _job_response(job)
+
+
+@app.get("/cache-reviews/{job_id}", response_model=CacheResponse)
+async def cache_reviews_status(job_id: str):
+    """Status, progress and outcome of a sync job"""
+    job = await agent.run_sync(agent.reindex_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown sync job: {job_id}")
+    return _job_response(job)
+
+
+@app.post(
+    "/teacher-reviews",
+    response_model=ReviewResponse,
+    dependencies=[Depends(require_ready)],
+)
+async def get_teacher_reviews(query: TeacherQuery):
+    """Get one page of reviews for a specific teacher by teacherId"""
     try:
-        # Store the current vector store state
-        old_count = agent.vector_store.ntotal if agent.vector_store else 0
-
-        # Load reviews into vector store
-        agent.load_reviews_to_vector_store()
-
-        # Get new count
-        new_count = agent.vector_store.ntotal if agent.vector_store else 0
-        added_reviews = new_count - old_count
+        data = await agent.aget_teacher_reviews_page(
+            query.teacher_id, query.after, query.limit
+        )
+        if data is None:
+            raise NotFoundError(f"No reviews found for teacher with ID: {query.teacher_id}")
 
-        return CacheResponse(
-            success=True,
-            message=f"Successfully cached reviews. Added {added_reviews} new reviews.",
-            total_reviews=new_count,
+        return ORJSONResponse(
+            {"success": True, "data": data, "error": None, "error_code": None}
         )
+    except ToolError as e:
+        return _tool_error(e)
+    except ValueError as e:
+        return _tool_error(InvalidArgumentError(str(e)))
     except Exception as e:
-        return CacheResponse(
-            success=False, message="Failed to cache reviews", error=str(e)
-        )
+        return _tool_error(ToolError(str(e)))
 
 
-@app.post("/teacher-reviews", response_model=ReviewResponse)
-async def get_teacher_reviews(query: TeacherQuery):
-    """Get all reviews for a specific teacher by teacherId"""
+@app.post("/teacher-reviews/stream", dependencies=[Depends(require_ready)])
+async def stream_teacher_reviews(query: TeacherQuery):
+    """Stream every review for a teacher as NDJSON, one review per line"""
     try:
-        if agent.vector_store is None:
-            raise HTTPException(
-                status_code=400,
-                detail="Vector store not initialized. Please cache reviews first.",
-            )
-
-        # Get teacher reviews using the tool
-        result = agent.get_teacher_reviews_tool(str(query.teacher_id))
+        # Validate the cursor before the response starts
+        agent.teacher_reviews_query(query.teacher_id, query.after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Parse the JSON result
-        data = json.loads(result)
+    async def lines():
+        async for review in agent.astream_teacher_reviews(query.teacher_id, query.after):
+            yield orjson.dumps(review) + b"\n"
 
-        return ReviewResponse(success=True, data=data)
-    except json.JSONDecodeError:
-        return ReviewResponse(
-            success=False, error="Invalid response format from database"
-        )
-    except Exception as e:
-        return ReviewResponse(success=False, error=str(e))
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
-@app.post("/search-reviews", response_model=ReviewResponse)
+@app.post(
+    "/search-reviews",
+    response_model=ReviewResponse,
+    dependencies=[Depends(require_ready)],
+)
 async def search_reviews(query: SearchQuery):
-    """Search for reviews using vector similarity"""
+    """Search for reviews by vector similarity, BM25, or both fused by rank"""
     try:
-        if agent.vector_store is None:
-            raise HTTPException(
-                status_code=400,
-                detail="Vector store not initialized. Please cache reviews first.",
-            )
-
         # Search reviews using the tool
-        result = agent.search_reviews_tool(query.query)
-
-        # Parse the JSON result
-        data = json.loads(result)
-
-        return ReviewResponse(success=True, data=data)
-    except json.JSONDecodeError:
-        return ReviewResponse(
-            success=False, error="Invalid response format from vector store"
+        result = await agent.asearch_reviews_tool(
+            query.query, query.limit, _filters(query.filters), query.effort, query.mode
         )
+        return _tool_response(result, search_mode=result.mode)
+    except ToolError as e:
+        return _tool_error(e)
     except Exception as e:
-        return ReviewResponse(success=False, error=str(e))
+        return _tool_error(ToolError(str(e)))
 
 
-@app.post("/recommendations", response_model=RecommendationResponse)
+@app.post(
+    "/recommendations",
+    response_model=RecommendationResponse,
+    dependencies=[Depends(require_ready)],
+)
 async def get_recommendations(query: RecommendationQuery):
     """Get teacher recommendations based on query"""
     try:
-        if agent.vector_store is None:
-            raise HTTPException(
-                status_code=400,
-                detail="Vector store not initialized. Please cache reviews first.",
-            )
-
         # Get recommendations using the tool
-        result = agent.get_recommendations_tool(query.query)
+        result = await agent.aget_recommendations_tool(
+            query.query, query.limit, _filters(query.filters), query.effort
+        )
+        return _tool_response(result)
+    except ToolError as e:
+        return _tool_error(e)
+    except Exception as e:
+        return _tool_error(ToolError(str(e)))
 
-        # Parse the JSON result
-        data = json.loads(result)
 
-        return RecommendationResponse(success=True, data=data)
-    except json.JSONDecodeError:
-        return RecommendationResponse(
-            success=False, error="Invalid response format from recommendation engine"
+@app.post(
+    "/search-reviews/batch",
+    response_model=BatchResponse,
+    dependencies=[Depends(require_ready)],
+)
+async def search_reviews_batch(batch: BatchSearchQuery):
+    """Search reviews for many queries with one embedding call and one vector search"""
+    try:
+        results = await agent.run_sync(
+            agent.search_reviews_batch,
+            batch.queries,
+            batch.limit,
+            _filters(batch.filters),
+            batch.effort,
+            batch.mode,
         )
+        return _batch_response(batch.queries, results)
+    except ToolError as e:
+        return _tool_error(e)
     except Exception as e:
-        return RecommendationResponse(success=False, error=str(e))
+        return _tool_error(ToolError(str(e)))
 
 
-@app.post("/agent-query")
+@app.post(
+    "/recommendations/batch",
+    response_model=BatchResponse,
+    dependencies=[Depends(require_ready)],
+)
+async def get_recommendations_batch(batch: BatchRecommendationQuery):
+    """Get recommendations for many queries with one embedding call and one ranking pass"""
+    try:
+        results = await agent.run_sync(
+            agent.get_recommendations_batch,
+            batch.queries,
+            batch.limit,
+            _filters(batch.filters),
+            batch.effort,
+        )
+        return _batch_response(batch.queries, results)
+    except ToolError as e:
+        return _tool_error(e)
+    except Exception as e:
+        return _tool_error(ToolError(str(e)))
+
+
+@app.get(
+    "/leaderboard",
+    response_model=ReviewResponse,
+    dependencies=[Depends(require_ready)],
+)
+async def get_leaderboard(
+    limit: int = Query(10, ge=1, le=100), min_reviews: int = Query(1, ge=1)
+):
+    """Top teachers by average rating from the materialized teacher stats"""
+    try:
+        data = await aget_leaderboard(agent.get_async_db(), limit, min_reviews)
+        return ReviewResponse(success=True, data=data)
+    except Exception as e:
+        return _tool_error(ToolError(str(e)))
+
+
+@app.post(
+    "/agent-query",
+    dependencies=[Depends(require_ready)],
+)
 async def agent_query(query: SearchQuery):
     """Use the full agent to process a query and provide intelligent responses"""
     try:
-        if agent.vector_store is None:
-            raise HTTPException(
-                status_code=400,
-                detail="Vector store not initialized. Please cache reviews first.",
-            )
-
-        # Use the agent executor to process the query
-        result = agent.agent_executor.invoke({"input": query.query})
+        # Use the agent executor to process the query, unless already answered
+        result = await agent.aanswer_query(query.query)
 
         return {
             "success": True,
             "query": query.query,
             "response": result["output"],
-            "agent_used": True,
+            "data": result["data"],
+            "agent_used": result["routed"] is None,
+            "cached": result["cached"],
+            "routed": result["routed"],
         }
+    except AgentLimitError as e:
+        raise _limit_error(e)
     except Exception as e:
-        return {"success": False, "error": str(e), "agent_used": True}
+        return _tool_error(ToolError(str(e)))
+
+
+def _limit_error(e: AgentLimitError) -> HTTPException:
+    headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {orjson.dumps(data, default=str).decode()}\n\n"
+
+
+async def _agent_events(text: str, request: Request):
+    """SSE frames for one agent run, stopped as soon as the client disconnects"""
+    events = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for event, data in agent.astream_answer(text):
+                await events.put((event, data))
+        except AgentLimitError as e:
+            await events.put(("error", {"error": str(e), "status": e.status_code}))
+        except Exception as e:
+            await events.put(("error", {"error": str(e)}))
+        finally:
+            events.put_nowait(None)
+
+    async def watch():
+        # The body has been read, so the next message is the disconnect
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+        print("✗ Agent stream cancelled: client disconnected")
+        producer.cancel()
+
+    producer = asyncio.ensure_future(produce())
+    watcher = asyncio.ensure_future(watch())
+    try:
+        while (item := await events.get()) is not None:
+            yield _sse(*item)
+    finally:
+        # Also reached when the server cancels the response, e.g. on a failed send
+        producer.cancel()
+        watcher.cancel()
+
+
+@app.post("/agent-query/stream", dependencies=[Depends(require_ready)])
+async def agent_query_stream(query: SearchQuery, request: Request):
+    """Stream the agent's tool steps and final answer as Server-Sent Events
+
+    Events are tool_start, tool_end, token and final (see agent_stream), or
+    a single error event if the run fails. A cached answer is sent as one
+    final event with a "cached" field, a routed question as its tool call
+    and a final event with a "routed" field.
+    """
+    # Refuse before the stream opens; a slot lost to a race afterwards is
+    # reported as an error event with the same status
+    if agent.agent_limiter.saturated:
+        raise _limit_error(agent.agent_limiter.rejected_error())
+
+    return StreamingResponse(
+        _agent_events(query.query, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/stats")
@@ -201,10 +499,39 @@ async def get_stats():
     try:
         stats = {
             "vector_store_loaded": agent.vector_store is not None,
-            "total_documents": getattr(agent.vector_store, 'ntotal', 0) if agent.vector_store else 0,
-            "vector_dimension": getattr(agent.vector_store, 'd', 0) if agent.vector_store else 0,
-            "index_type": type(agent.vector_store).__name__ if agent.vector_store else "None",
+            "total_documents": len(agent.vector_store.index_to_docstore_id) if agent.vector_store else 0,
+            "vector_dimension": agent.vector_store.index.d if agent.vector_store else 0,
+            "index_type": index_kind(agent.vector_store.index) if agent.vector_store else "None",
+        }
+        if agent.vector_store is not None:
+            stats["index"] = describe_index(agent.vector_store.index)
+            if isinstance(agent.vector_store.docstore, ColumnarDocstore):
+                stats["docstore"] = agent.vector_store.docstore.stats()
+            stats["lexical_index"] = agent.lexical_index.stats()
+        if isinstance(agent.embeddings, CachedEmbeddings):
+            stats["embedding_cache"] = agent.embeddings.stats()
+        stats["index_version"] = agent.index_version
+        stats["reindex_jobs"] = await agent.run_sync(agent.reindex_jobs.stats)
+        if agent.builder_lock is not None:
+            stats["shared_index"] = {
+                "role": agent.index_role(),
+                "pid": os.getpid(),
+                "builder_pid": agent.builder_lock.holder(),
+                "snapshot_version": agent.snapshot_version,
+                "read_only": agent.index_read_only,
+            }
+        stats["query_cache"] = {
+            "embeddings": agent.query_embedding_cache.stats(),
+            "results": agent.result_cache.stats(),
         }
+        stats["query_embedding_batcher"] = agent.query_embedder.stats()
+        stats["single_flight"] = agent.in_flight.stats()
+        stats["search_batcher"] = agent.search_batcher.stats()
+        stats["agent_limits"] = agent.agent_limiter.stats()
+        if agent.intent_router is not None:
+            stats["intent_router"] = agent.intent_router.stats()
+        if agent.answer_cache is not None:
+            stats["answer_cache"] = agent.answer_cache.stats()
 
         return {"success": True, "stats": stats}
     except Exception as e:
@@ -0,0 +1,108 @@
+"""Recall and latency of the IVF and HNSW indexes against the flat baseline.
+
+Builds each index type over synthetic clustered vectors (real embeddings
+are clustered too, which is what IVF relies on), then runs single-query
+searches at several effort settings and reports recall@k against exact
+flat search together with p50/p99 latency.
+
+    cd agent && python -m benchmarks.ann [--sizes 10000,100000,1000000] [--dim 128]
+"""
+
+import argparse
+import math
+import time
+
+import faiss
+import numpy as np
+
+from ann_index import create_index, search_parameters, train_index, training_size
+
+
+def clustered_vectors(rng, count, dimension, centers, chunk_size=100000):
+    """Gaussian blobs around fixed centers, generated in chunks to bound memory"""
+    vectors = np.empty((count, dimension), dtype=np.float32)
+    for start in range(0, count, chunk_size):
+        stop = min(start + chunk_size, count)
+        assignment = rng.integers(0, len(centers), stop - start)
+        noise = rng.standard_normal((stop - start, dimension)).astype(np.float32)
+        vectors[start:stop] = centers[assignment] + 0.35 * noise
+    return vectors
+
+
+def build(index_type, vectors, nlist):
+    started = time.perf_counter()
+    index = create_index(vectors.shape[1], index_type, nlist)
+    if training_size(index):
+        rng = np.random.default_rng(1)
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), training_size(index)), replace=False)]
+        index = train_index(index, sample)
+    index.add(vectors)
+    return index, time.perf_counter() - started
+
+
+def measure(index, queries, k, effort, ground_truth):
+    latencies = []
+    hits = 0
+    for query, truth in zip(queries, ground_truth):
+        params = search_parameters(index, k, effort=effort)
+        started = time.perf_counter()
+        _, rows = index.search(query[None, :], k, params=params)
+        latencies.append(time.perf_counter() - started)
+        hits += len(np.intersect1d(rows[0], truth))
+    latencies = np.array(latencies) * 1000
+    return (
+        hits / (len(queries) * k),
+        float(np.percentile(latencies, 50)),
+        float(np.percentile(latencies, 99)),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma-separated index sizes")
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, help="IVF cells (default: 4 * sqrt(size))")
+    parser.add_argument("--nprobe", default="1,4,16,64", help="IVF efforts to measure")
+    parser.add_argument("--ef-search", default="16,32,64,128,256", help="HNSW efforts to measure")
+    parser.add_argument("--types", default="flat,ivf,hnsw")
+    parser.add_argument("--threads", type=int, default=1, help="FAISS threads per query")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((1000, args.dim)).astype(np.float32)
+    queries = clustered_vectors(rng, args.queries, args.dim, centers)
+    efforts = {
+        "flat": [None],
+        "ivf": [int(x) for x in args.nprobe.split(",")],
+        "hnsw": [int(x) for x in args.ef_search.split(",")],
+    }
+
+    print(
+        f"{'size':>9} {'index':>6} {'effort':>7} {'build s':>8} "
+        f"{'recall@' + str(args.k):>10} {'p50 ms':>8} {'p99 ms':>8}"
+    )
+    for size in (int(x) for x in args.sizes.split(",")):
+        vectors = clustered_vectors(rng, size, args.dim, centers)
+        nlist = args.nlist or int(4 * math.sqrt(size))
+
+        exact = faiss.IndexFlatL2(args.dim)
+        exact.add(vectors)
+        _, ground_truth = exact.search(queries, args.k)
+        del exact
+
+        for index_type in args.types.split(","):
+            index, build_seconds = build(index_type, vectors, nlist)
+            for effort in efforts[index_type]:
+                recall, p50, p99 = measure(index, queries, args.k, effort, ground_truth)
+                print(
+                    f"{size:>9} {index_type:>6} {effort or '-':>7} {build_seconds:>8.1f} "
+                    f"{recall:>10.3f} {p50:>8.3f} {p99:>8.3f}"
+                )
+            del index
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Check that request latency stays flat as in-flight requests grow.
+
+Runs the API in-process against a synthetic vector store and an embeddings
+stub with a fixed remote latency, then fires batches of concurrent
+/search-reviews requests. On the async path p50 latency should stay close to
+the stub latency plus the "floor" column, the wall time of as many concurrent
+/health calls; on the old blocking path it grows linearly with the number
+of requests in flight.
+
+The client runs in the same process, so each request's HTTP handling on
+both sides is CPU work that requests in flight take turns at. On one core
+that alone adds about 0.5 ms per request in flight at once, which is what
+the floor shows; it is not time spent searching.
+
+    cd agent && python -m benchmarks.concurrency [--latency 0.05] [--blocking]
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import statistics
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+
+import httpx
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+import agent
+import api
+from ingest import empty_vector_store
+from lexical_index import BM25Index
+
+DIMENSION = 64
+
+
+class SlowEmbeddings(Embeddings):
+    """Deterministic embeddings that simulate a remote call"""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def _vector(self, text):
+        rng = np.random.default_rng(abs(hash(text)) % (2**32))
+        return rng.standard_normal(DIMENSION).astype("float32").tolist()
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return self._vector(text)
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(self.latency)
+        return self._vector(text)
+
+
+def build_store(embeddings, size):
+    store = empty_vector_store(embeddings, DIMENSION)
+    vectors = np.random.default_rng(0).standard_normal((size, DIMENSION)).astype("float32")
+    texts = [f"review {i}" for i in range(size)]
+    store.add_embeddings(
+        zip(texts, vectors.tolist()),
+        metadatas=[{"teacherName": f"Teacher {i % 50}", "rating": i % 5 + 1, "review": t} for i, t in enumerate(texts)],
+        ids=[str(i) for i in range(size)],
+    )
+    return store
+
+
+async def measure(client, concurrency, path="/search-reviews"):
+    async def one(i):
+        started = time.perf_counter()
+        if path == "/health":
+            response = await client.get(path)
+        else:
+            # Queries are unique across levels, so no result comes from the cache
+            response = await client.post(path, json={"query": f"query {concurrency} {i}"})
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    latencies = sorted(await asyncio.gather(*(one(i) for i in range(concurrency))))
+    wall = time.perf_counter() - started
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return statistics.median(latencies), p99, wall
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated embedding latency (s)")
+    parser.add_argument("--documents", type=int, default=10000)
+    parser.add_argument("--levels", default="1,8,32,128", help="Comma-separated concurrency levels")
+    parser.add_argument("--blocking", action="store_true", help="Use the old synchronous tool path")
+    args = parser.parse_args()
+
+    agent.embeddings = SlowEmbeddings(args.latency)
+    agent.vector_store = build_store(agent.embeddings, args.documents)
+    agent.lexical_index = BM25Index.from_documents(agent.vector_store.docstore.documents())
+    # As initialize() does, so a full collection does not land mid-measurement
+    gc.collect()
+    gc.freeze()
+    agent.readiness["status"] = "ready"
+
+    if args.blocking:
+        async def blocking_search(query):
+            return agent.search_reviews_tool(query)
+
+        agent.asearch_reviews_tool = blocking_search
+
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"CPUs: {os.cpu_count()}")
+        print(f"{'in-flight':>10} {'p50 ms':>10} {'p99 ms':>10} {'wall ms':>10} {'floor ms':>10}")
+        for level in (int(x) for x in args.levels.split(",")):
+            _, _, floor = await measure(client, level, "/health")
+            p50, p99, wall = await measure(client, level)
+            print(
+                f"{level:>10} {p50 * 1000:>10.1f} {p99 * 1000:>10.1f} {wall * 1000:>10.1f} "
+                f"{floor * 1000:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,141 @@
+"""Memory and lookup cost of the columnar docstore against InMemoryDocstore.
+
+Builds the same synthetic reviews into both docstores and reports the
+memory each one retains (traced with tracemalloc, after the input documents
+are released), its pickled snapshot size, the time to add the documents, the
+latency of materializing one document by id, and the time to build the
+metadata filter columns.
+
+    cd agent && python -m benchmarks.docstore [--sizes 10000,100000,1000000]
+"""
+
+import argparse
+import gc
+import pickle
+import time
+import tracemalloc
+
+from bson import ObjectId
+from langchain_community.docstore.in_memory import InMemoryDocstore
+import numpy as np
+
+from columnar_docstore import ColumnarDocstore
+from reviews import review_to_document
+from vector_search import FilterColumns
+
+WORDS = (
+    "clear helpful engaging boring confusing organized patient knowledgeable fast "
+    "lectures homework exams feedback grading explains examples office hours course "
+    "material really very always never the and but with a of to is was"
+).split()
+
+
+def synthetic_reviews(count, seed=0):
+    """Reviews with realistic repetition: 1 teacher per 100 reviews, 1 student per 10"""
+    rng = np.random.default_rng(seed)
+    for i in range(count):
+        teacher = int(rng.integers(0, max(count // 100, 1)))
+        student = int(rng.integers(0, max(count // 10, 1)))
+        words = rng.choice(WORDS, int(rng.integers(12, 60)))
+        yield {
+            "_id": ObjectId(),
+            "studentId": student,
+            "teacherId": teacher,
+            "studentName": f"Student {student}",
+            "teacherName": f"Teacher {teacher}",
+            "rating": int(rng.integers(1, 6)),
+            "review": " ".join(words).capitalize() + ".",
+        }
+
+
+class _Store:
+    """The slice of a vector store FilterColumns reads"""
+
+    def __init__(self, docstore, mapping):
+        self.docstore = docstore
+        self.index_to_docstore_id = mapping
+        self.index = type("Index", (), {"ntotal": len(mapping)})()
+
+
+def measure(make_store, size, lookup_rows):
+    # Time the add on its own: tracemalloc slows every allocation down
+    documents = [review_to_document(review) for review in synthetic_reviews(size)]
+    ids = [doc.id for doc in documents]
+    started = time.perf_counter()
+    make_store({doc.id: doc for doc in documents})
+    add_seconds = time.perf_counter() - started
+    del documents
+    gc.collect()
+
+    # Trace from document creation, so the documents the store keeps are counted
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    documents = [review_to_document(review) for review in synthetic_reviews(size)]
+    docstore = make_store({doc.id: doc for doc in documents})
+    ids = [doc.id for doc in documents]
+    del documents
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    latencies = []
+    for row in lookup_rows:
+        started = time.perf_counter()
+        docstore.search(ids[row])
+        latencies.append(time.perf_counter() - started)
+    latencies = np.array(latencies) * 1e6
+
+    started = time.perf_counter()
+    FilterColumns.from_vector_store(_Store(docstore, dict(enumerate(ids))))
+    columns_seconds = time.perf_counter() - started
+
+    return {
+        "retained_mb": retained / 2**20,
+        "pickle_mb": len(pickle.dumps(docstore, protocol=pickle.HIGHEST_PROTOCOL)) / 2**20,
+        "add_s": add_seconds,
+        "lookup_p50_us": float(np.percentile(latencies, 50)),
+        "lookup_p99_us": float(np.percentile(latencies, 99)),
+        "columns_s": columns_seconds,
+    }
+
+
+def in_memory(texts):
+    docstore = InMemoryDocstore()
+    docstore.add(texts)
+    return docstore
+
+
+def columnar(texts):
+    docstore = ColumnarDocstore()
+    docstore.add(texts)
+    return docstore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000", help="Comma-separated review counts")
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(
+        f"{'reviews':>9} {'docstore':>10} {'memory MB':>10} {'B/review':>9} {'pickle MB':>10} "
+        f"{'add s':>7} {'get p50 us':>11} {'get p99 us':>11} {'filter s':>9}"
+    )
+    for size in (int(size) for size in args.sizes.split(",")):
+        lookup_rows = np.random.default_rng(size).integers(0, size, args.lookups)
+        results = {}
+        for name, make_store in (("in-memory", in_memory), ("columnar", columnar)):
+            results[name] = measure(make_store, size, lookup_rows)
+        for name, result in results.items():
+            print(
+                f"{size:>9} {name:>10} {result['retained_mb']:>10.1f} "
+                f"{result['retained_mb'] * 2**20 / size:>9.0f} {result['pickle_mb']:>10.1f} "
+                f"{result['add_s']:>7.2f} {result['lookup_p50_us']:>11.1f} "
+                f"{result['lookup_p99_us']:>11.1f} {result['columns_s']:>9.3f}"
+            )
+        saving = 1 - results["columnar"]["retained_mb"] / results["in-memory"]["retained_mb"]
+        print(f"{'':>9} columnar retains {saving:.0%} less memory")
+
+
+if __name__ == "__main__":
+    main()
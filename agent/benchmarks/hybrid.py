@@ -0,0 +1,103 @@
+"""Latency and keyword precision of hybrid, vector and lexical review search.
+
+Indexes synthetic reviews into a vector store and the BM25 index, then runs
+queries that name a teacher ("Teacher 17 homework") through
+search_reviews_tool in each mode, against an embeddings stub with a fixed
+remote latency. Reports the BM25 build time, per-mode latency, embedding
+calls, and the share of returned reviews written about the named teacher.
+The stub's vectors carry no meaning, so vector precision here is the floor
+an embedding model starts from on exact names, not its real quality.
+
+    cd agent && python -m benchmarks.hybrid [--reviews 100000] [--latency 0.05]
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+os.environ.setdefault("ANSWER_CACHE_PATH", "")
+
+import numpy as np
+
+import agent
+from benchmarks.concurrency import DIMENSION, SlowEmbeddings
+from benchmarks.docstore import synthetic_reviews
+from ingest import empty_vector_store
+from lexical_index import BM25Index
+from reviews import review_to_document
+from settings import BM25_B, BM25_K1
+
+
+class CountingEmbeddings(SlowEmbeddings):
+    calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return super().embed_query(text)
+
+
+def build(size, embeddings):
+    documents = [review_to_document(review) for review in synthetic_reviews(size)]
+    store = empty_vector_store(embeddings, DIMENSION)
+    vectors = np.random.default_rng(0).standard_normal((size, DIMENSION)).astype("float32")
+    store.add_embeddings(
+        zip([doc.page_content for doc in documents], vectors.tolist()),
+        metadatas=[doc.metadata for doc in documents],
+        ids=[doc.id for doc in documents],
+    )
+    started = time.perf_counter()
+    lexical = BM25Index.from_documents(documents, BM25_K1, BM25_B)
+    return store, lexical, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated embedding latency (s)")
+    args = parser.parse_args()
+
+    embeddings = CountingEmbeddings(args.latency)
+    agent.embeddings = embeddings
+    agent.vector_store, agent.lexical_index, build_seconds = build(args.reviews, embeddings)
+    stats = agent.lexical_index.stats()
+    print(
+        f"BM25 index: {stats['documents']} reviews, {stats['terms']} terms, "
+        f"built in {build_seconds:.2f}s"
+    )
+
+    teachers = max(args.reviews // 100, 1)
+    rng = np.random.default_rng(1)
+    topics = ["homework", "exams", "lectures", "feedback", "grading"]
+    queries = [
+        (f"Teacher {teacher} {topics[i % len(topics)]}", f"Teacher {teacher}")
+        for i, teacher in enumerate(rng.integers(0, teachers, args.queries))
+    ]
+
+    print(f"{'mode':>8} {'p50 ms':>8} {'p99 ms':>8} {'embed calls':>12} {'precision':>10}")
+    for mode in agent.SEARCH_MODES:
+        agent.result_cache.clear()
+        agent.query_embedding_cache.clear()
+        embeddings.calls = 0
+        timings, precision = [], []
+        for query, teacher in queries:
+            started = time.perf_counter()
+            result = agent.search_reviews_tool(query, args.k, mode=mode)
+            timings.append(time.perf_counter() - started)
+            matches = [review["teacher"] == teacher for review in result.reviews]
+            precision.append(sum(matches) / args.k)
+        timings = sorted(t * 1000 for t in timings)
+        print(
+            f"{mode:>8} {statistics.median(timings):>8.2f} "
+            f"{timings[int(len(timings) * 0.99)]:>8.2f} {embeddings.calls:>12} "
+            f"{statistics.mean(precision):>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Accuracy of the intent router and the latency it saves over the agent.
+
+Routes a labeled set of questions and reports how many go to the right tool,
+how many fall back to the agent although a rule could have handled them,
+and how many are misrouted (sent to a tool when the agent or another tool
+was expected). Then answers the routable questions through /agent-query
+in-process, once with the router and once without, using a stub ReAct LLM
+with a fixed per-call latency that picks the labeled tool, so the
+difference is the LLM round trips the router removes.
+
+    cd agent && python -m benchmarks.router [--llm-latency 0.5] [--embed-latency 0.05]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+os.environ.setdefault("TAVILY_API_KEY", "benchmark")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+os.environ.setdefault("ANSWER_CACHE_PATH", "")
+
+import httpx
+from langchain.agents import AgentExecutor, create_react_agent
+from langchain.tools import Tool
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import agent
+import api
+from benchmarks.concurrency import SlowEmbeddings, build_store
+from intent_router import route
+from tool_results import TeacherReviews, as_atext
+
+# (question, expected intent or None when the agent should answer it)
+LABELED_QUERIES = [
+    ("Show me reviews for teacher ID 123", "teacher_reviews"),
+    ("show reviews for teacher 42", "teacher_reviews"),
+    ("Get the ratings of teacher #7", "teacher_reviews"),
+    ("teacher 15", "teacher_reviews"),
+    ("What do students say about teacher 9?", "teacher_reviews"),
+    ("Analyze teacher ID 31", "teacher_reviews"),
+    ("teacherId: 88 reviews", "teacher_reviews"),
+    ("List feedback for professor 5", "teacher_reviews"),
+    ("I want to see the reviews of instructor number 12", "teacher_reviews"),
+    ("stats for teacher 3", "teacher_reviews"),
+    ("Recommend teachers for math courses", "recommendations"),
+    ("recommend a teacher for beginners", "recommendations"),
+    ("Find the best teachers for beginners", "recommendations"),
+    ("Who is the best teacher for calculus?", "recommendations"),
+    ("which teacher should I take for physics", "recommendations"),
+    ("Suggest some good tutors for chemistry", "recommendations"),
+    ("best professors for machine learning", "recommendations"),
+    ("Can you recommend teachers who explain clearly?", "recommendations"),
+    ("recommend some good math tutors", "recommendations"),
+    ("Which teachers are good for exam preparation", "recommendations"),
+    ("Give me the top instructors in statistics", "recommendations"),
+    ("please suggest teachers with engaging lectures", "recommendations"),
+    ("What do students say about homework?", "search_reviews"),
+    ("What do students think about group projects", "search_reviews"),
+    ("Find reviews about exam difficulty", "search_reviews"),
+    ("reviews mentioning late grading", "search_reviews"),
+    ("search reviews for boring lectures", "search_reviews"),
+    ("Are there any reviews about office hours?", "search_reviews"),
+    ("show me reviews that mention helpful feedback", "search_reviews"),
+    ("what did people say about the workload", "search_reviews"),
+    ("Compare teacher 1 and teacher 2", None),
+    ("Why is teacher 3 rated so low?", None),
+    ("teacher 4 vs teacher 6 for algebra", None),
+    ("Which teachers have 4 stars or more?", None),
+    ("What is the latest news about online learning?", None),
+    ("How many reviews are in the database?", None),
+    ("Summarize the overall sentiment of all reviews", None),
+    ("Is it better to take calculus in the first year?", None),
+    ("Explain why students like Dr. Smith", None),
+    ("What's the difference between the top two math teachers?", None),
+    ("Hello, what can you do?", None),
+    ("Which courses have the most negative reviews and why?", None),
+    ("Tell me something interesting about the teachers", None),
+    ("Find teachers whose ratings dropped this year", None),
+    ("What percentage of reviews are 5 stars?", None),
+]
+
+
+class StubReActModel(BaseChatModel):
+    """Chat model that waits like a remote LLM and answers in ReAct format"""
+
+    latency: float = 0.5
+    labels: dict = {}
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-react"
+
+    def _reply(self, messages):
+        prompt = messages[-1].content
+        question = prompt.split("Question:")[-1].split("\n")[0].strip()
+        if "Observation:" in prompt.split("Question:")[-1]:
+            return "Thought: I now know the final answer\nFinal Answer: Here is what I found."
+        intent, argument = self.labels.get(question, (None, question))
+        tool = agent.ROUTED_TOOLS[intent][0] if intent else "search_reviews"
+        return f"Thought: I should use {tool}\nAction: {tool}\nAction Input: {argument}"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._reply(messages)))])
+
+
+def accuracy():
+    correct = missed = misrouted = routable = routed = 0
+    timings = []
+    for question, expected in LABELED_QUERIES:
+        started = time.perf_counter()
+        result = route(question)
+        timings.append(time.perf_counter() - started)
+        routable += expected is not None
+        if result is None:
+            if expected is None:
+                correct += 1
+            else:
+                missed += 1
+                print(f"  missed     {question!r} (expected {expected})")
+            continue
+        routed += 1
+        if result.intent == expected:
+            correct += 1
+        else:
+            misrouted += 1
+            print(f"  misrouted  {question!r} -> {result.intent} (expected {expected})")
+
+    total = len(LABELED_QUERIES)
+    timings = sorted(t * 1e6 for t in timings)
+    print(f"questions:          {total} ({routable} routable, {total - routable} for the agent)")
+    print(f"accuracy:           {correct / total:.3f}")
+    print(f"routing precision:  {(routed - misrouted) / routed if routed else 0:.3f}")
+    print(f"routing recall:     {(routed - misrouted) / routable if routable else 0:.3f}")
+    print(f"missed / misrouted: {missed} / {misrouted}")
+    print(f"router p50 / p99:   {statistics.median(timings):.1f} / {timings[int(len(timings) * 0.99)]:.1f} us")
+
+
+async def fake_teacher_reviews(teacher_id: str) -> TeacherReviews:
+    await asyncio.sleep(0.005)
+    return TeacherReviews({"teacher_id": teacher_id, "reviews": []})
+
+
+async def latency(args):
+    agent.embeddings = SlowEmbeddings(args.embed_latency)
+    agent.vector_store = build_store(agent.embeddings, args.documents)
+    agent.readiness["status"] = "ready"
+    # The benchmark has no MongoDB; teacher pages come from a stub with DB-like latency
+    agent.aget_teacher_reviews_tool = fake_teacher_reviews
+    teacher_reviews_tool = Tool(
+        name="get_teacher_reviews",
+        description=agent.teacher_reviews_tool.description,
+        func=lambda teacher_id: teacher_id,
+        coroutine=as_atext(fake_teacher_reviews),
+    )
+
+    labels = {}
+    for question, expected in LABELED_QUERIES:
+        result = route(question)
+        if expected is not None:
+            labels[question] = (expected, result.argument if result else question)
+    tools = [agent.vector_search_tool, teacher_reviews_tool, agent.recommendations_tool]
+    llm = StubReActModel(latency=args.llm_latency, labels=labels)
+    agent.agent_executor = AgentExecutor(
+        agent=create_react_agent(llm=llm, tools=tools, prompt=agent.react_prompt),
+        tools=tools,
+        max_iterations=5,
+        handle_parsing_errors=True,
+    )
+
+    questions = list(labels)
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        results = {}
+        for mode, router in (("agent", None), ("router", agent.intent_router or agent.IntentRouter())):
+            agent.intent_router = router
+            agent.result_cache.clear()
+            timings = []
+            for question in questions:
+                started = time.perf_counter()
+                response = await client.post("/agent-query", json={"query": question})
+                response.raise_for_status()
+                timings.append(time.perf_counter() - started)
+            results[mode] = timings
+
+    print(f"\nroutable questions answered end to end ({len(questions)}, llm latency {args.llm_latency}s):")
+    print(f"{'path':>8} {'mean ms':>10} {'p50 ms':>10} {'max ms':>10}")
+    for mode, timings in results.items():
+        print(
+            f"{mode:>8} {statistics.mean(timings) * 1000:>10.1f} "
+            f"{statistics.median(timings) * 1000:>10.1f} {max(timings) * 1000:>10.1f}"
+        )
+    saved = statistics.mean(results["agent"]) - statistics.mean(results["router"])
+    print(f"saved per routed question: {saved * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Simulated LLM call latency (s)")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Simulated embedding latency (s)")
+    parser.add_argument("--documents", type=int, default=10000)
+    parser.add_argument("--skip-latency", action="store_true", help="Only measure routing accuracy")
+    args = parser.parse_args()
+
+    accuracy()
+    if not args.skip_latency:
+        asyncio.run(latency(args))
+
+
+if __name__ == "__main__":
+    main()
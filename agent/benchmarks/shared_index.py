@@ -0,0 +1,113 @@
+"""Total memory of N API workers serving one index, private copies against a shared map.
+
+Writes a synthetic snapshot, then starts N worker processes that each load
+it the way an API worker does and run a few searches. The snapshot carries
+the teacher and BM25 indexes, so shared readers map them with the rest
+instead of building private copies. With every worker alive, each reports its proportional set
+size (PSS), which splits shared pages between the processes mapping them,
+so the PSS sum is the RAM the workers really use together. Private workers
+hold one copy of the index each; shared readers map one copy between them.
+Linux only (reads /proc/self/smaps_rollup).
+
+    cd agent && python -m benchmarks.shared_index [--reviews 100000] [--workers 1,2,4]
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+
+os.environ.setdefault("EMBEDDING_CACHE_PATH", "")
+
+from langchain_core.embeddings import FakeEmbeddings
+import numpy as np
+
+from benchmarks.docstore import synthetic_reviews
+from ingest import empty_vector_store
+from lexical_index import BM25Index
+from reviews import review_to_document
+from settings import BM25_B, BM25_K1, EMBEDDING_MODEL
+import snapshot
+from teacher_index import TeacherIndex
+from vector_search import search_by_vector
+
+
+def build_snapshot(path, size, dimension):
+    documents = [review_to_document(review) for review in synthetic_reviews(size)]
+    store = empty_vector_store(FakeEmbeddings(size=dimension), dimension)
+    vectors = np.random.default_rng(0).standard_normal((size, dimension)).astype("float32")
+    store.add_embeddings(
+        zip([doc.page_content for doc in documents], vectors.tolist()),
+        metadatas=[doc.metadata for doc in documents],
+        ids=[doc.id for doc in documents],
+    )
+    teachers = TeacherIndex()
+    teachers.add(documents, vectors)
+    lexical = BM25Index.from_documents(documents, BM25_K1, BM25_B)
+    snapshot.save_snapshot(
+        store, {"doc_hashes": {}}, path, EMBEDDING_MODEL, teachers=teachers, lexical=lexical
+    )
+
+
+def pss_mb():
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def worker(path, read_only, dimension, barrier, results):
+    embeddings = FakeEmbeddings(size=dimension)
+    store, _, _, (teachers, lexical) = snapshot.load_snapshot(
+        embeddings, path, EMBEDDING_MODEL, read_only=read_only
+    )
+    rng = np.random.default_rng(os.getpid())
+    for _ in range(20):
+        vector = rng.standard_normal(dimension).astype("float32")
+        search_by_vector(store, vector, 5)
+        teachers.rank(vector, 5)
+        lexical.search("helpful homework", 5)
+    # Measure with every worker alive, so shared pages are split between them
+    barrier.wait()
+    results.put(pss_mb())
+    barrier.wait()
+    return teachers, lexical
+
+
+def measure(path, workers, read_only, dimension):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(path, read_only, dimension, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    pss = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return sum(pss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reviews", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as path:
+        build_snapshot(path, args.reviews, args.dimension)
+        index_mb = os.path.getsize(os.path.join(path, snapshot.current_version(path), "index.faiss")) / 2**20
+        print(f"{args.reviews} reviews, index file {index_mb:.0f} MB")
+        print(f"{'workers':>8} {'private MB':>11} {'shared MB':>10} {'saved':>7}")
+        for workers in (int(count) for count in args.workers.split(",")):
+            private = measure(path, workers, False, args.dimension)
+            shared = measure(path, workers, True, args.dimension)
+            print(f"{workers:>8} {private:>11.0f} {shared:>10.0f} {1 - shared / private:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,459 @@
+"""Columnar docstore for review documents.
+
+``InMemoryDocstore`` keeps one LangChain ``Document`` per review: a pydantic
+object, a metadata dict with a nested theme dict, and the review text twice
+(in ``page_content`` and in ``metadata["review"]``). At millions of reviews
+that per-object overhead dominates the process's memory.
+
+``ColumnarDocstore`` holds the same data as columns instead:
+
+- NumPy arrays for student and teacher ids, ratings and the lexicon version
+- interned string codes for student and teacher names and theme terms
+- one UTF-8 buffer with an offset array for the review texts
+- packed (term, count) arrays with offsets for the theme counts
+
+``page_content`` is not stored at all; it is rebuilt from the columns with
+``review_text``. ``search`` materializes a ``Document`` only when one is
+asked for. Metadata outside the review schema, and values the columns cannot
+represent, are kept per document in a small override dict so every document
+round-trips unchanged.
+
+Deleting or replacing a document only drops its id; the freed slots are
+compacted away once they outnumber the live ones, as in the BM25 index.
+Between compactions the columns are only appended to, so ``fork`` shares
+them with the copy a delta sync changes while this docstore serves reads.
+
+The columns pickle out of band, so a snapshot can hand them to reader
+workers as read-only memory maps instead of copies (see ``snapshot``).
+"""
+
+from typing import Dict, List, Union
+import threading
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+import numpy as np
+
+from reviews import review_text
+
+# Integer ids of documents without one
+MISSING_ID = int(np.iinfo(np.int64).min)
+_MAX_INT = int(np.iinfo(np.int64).max)
+
+# Rating column kinds, so an integer rating comes back as an int
+_NO_RATING, _INT_RATING, _FLOAT_RATING = 0, 1, 2
+
+_SCHEMA = (
+    "studentId",
+    "teacherId",
+    "studentName",
+    "teacherName",
+    "rating",
+    "review",
+    "themes",
+    "themeLexicon",
+)
+
+
+class _Absent:
+    """Override marking a schema key the original metadata did not have"""
+
+
+class StringTable:
+    """Interned strings addressed by integer code"""
+
+    def __init__(self):
+        self.strings = []
+        self.codes = {}
+
+    def code(self, text: str) -> int:
+        code = self.codes.get(text)
+        if code is None:
+            code = len(self.strings)
+            self.codes[text] = code
+            self.strings.append(text)
+        return code
+
+    def __getstate__(self):
+        return self.strings
+
+    def __setstate__(self, strings):
+        self.strings = strings
+        self.codes = {text: code for code, text in enumerate(strings)}
+
+
+def _is_int(value) -> bool:
+    return (
+        isinstance(value, int)
+        and not isinstance(value, bool)
+        and MISSING_ID < value <= _MAX_INT
+    )
+
+
+def _grown(array, capacity):
+    grown = np.empty(capacity, dtype=array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+def _packed_keep(offsets, keep):
+    """Element mask and new offsets keeping the ``keep`` segments of a packed buffer"""
+    lengths = np.diff(offsets)
+    elements = np.repeat(keep, lengths)
+    new_offsets = np.zeros(int(keep.sum()) + 1, dtype=np.int64)
+    np.cumsum(lengths[keep], out=new_offsets[1:])
+    return elements, new_offsets
+
+
+class ColumnarDocstore(Docstore, AddableMixin):
+    """Review metadata in NumPy columns and packed buffers, one slot per document"""
+
+    def __init__(self, capacity: int = 1024):
+        self._lock = threading.Lock()
+        self._slots = {}  # doc id -> slot
+        self._count = 0  # slots used, freed ones included
+        self._freed = 0
+        self._owns_tail = True  # may append into the arrays in place
+        self._strings = StringTable()
+        self._extra = {}  # slot -> metadata overrides and custom page_content
+        self.student_ids = np.empty(capacity, dtype=np.int64)
+        self.teacher_ids = np.empty(capacity, dtype=np.int64)
+        self.ratings = np.empty(capacity, dtype=np.float64)
+        self._rating_kinds = np.empty(capacity, dtype=np.int8)
+        self._student_names = np.empty(capacity, dtype=np.int32)
+        self._teacher_names = np.empty(capacity, dtype=np.int32)
+        self._lexicons = np.empty(capacity, dtype=np.int32)
+        self._text = bytearray()
+        self._text_offsets = np.zeros(capacity + 1, dtype=np.int64)
+        self._theme_terms = np.empty(capacity, dtype=np.int32)
+        self._theme_counts = np.empty(capacity, dtype=np.int32)
+        self._theme_offsets = np.zeros(capacity + 1, dtype=np.int64)
+
+    @classmethod
+    def from_docstore(cls, docstore):
+        """Columnar copy of an ``InMemoryDocstore``"""
+        columnar = cls(max(len(docstore._dict), 1))
+        columnar.add(docstore._dict)
+        return columnar
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._slots
+
+    def ids(self):
+        """Ids of every document, in slot order"""
+        with self._lock:
+            return list(self._slots)
+
+    def fork(self):
+        """Copy to change while this docstore keeps serving reads
+
+        The copy shares the columns and appends past this docstore's last
+        slot; this docstore copies its columns before its own next append.
+        """
+        with self._lock:
+            forked = ColumnarDocstore.__new__(ColumnarDocstore)
+            forked.__dict__.update(self.__dict__)
+            forked._lock = threading.Lock()
+            forked._slots = dict(self._slots)
+            forked._extra = dict(self._extra)
+            self._owns_tail = False
+        return forked
+
+    # Docstore interface
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """Append documents; ids must be new"""
+        with self._lock:
+            overlapping = set(texts).intersection(self._slots)
+            if overlapping:
+                raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+            self._reserve(self._count + len(texts))
+            for doc_id, document in texts.items():
+                self._append(doc_id, document)
+
+    def delete(self, ids: List) -> None:
+        """Drop documents; their slots are freed"""
+        with self._lock:
+            slots = [self._slots.pop(doc_id) for doc_id in set(ids) if doc_id in self._slots]
+            if not slots:
+                raise ValueError(f"Tried to delete ids that does not  exist: {ids}")
+            self._free(slots)
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Materialize the document with this id"""
+        with self._lock:
+            slot = self._slots.get(search)
+            if slot is None:
+                return f"ID {search} not found."
+            return self._document(search, slot)
+
+    def replace(self, texts: Dict[str, Document]) -> None:
+        """Swap in new versions of existing documents in one step"""
+        with self._lock:
+            self._free([self._slots.pop(doc_id) for doc_id in texts])
+            self._reserve(self._count + len(texts))
+            for doc_id, document in texts.items():
+                self._append(doc_id, document)
+
+    def documents(self, ids=None):
+        """Yield documents one at a time, by default all of them"""
+        for doc_id in self.ids() if ids is None else ids:
+            document = self.search(doc_id)
+            if isinstance(document, Document):
+                yield document
+
+    # Columns
+
+    def filter_columns(self, index_to_docstore_id, size):
+        """teacher id, student id and rating arrays aligned with FAISS rows
+
+        Also returns the (row, doc id) pairs whose values live in the
+        override dict, for the caller to fill in from their metadata.
+        """
+        with self._lock:
+            rows = np.fromiter(index_to_docstore_id.keys(), dtype=np.int64)
+            slots = np.fromiter(
+                (self._slots[doc_id] for doc_id in index_to_docstore_id.values()),
+                dtype=np.int64,
+                count=len(rows),
+            )
+            teacher_ids = np.full(size, -1, dtype=np.int64)
+            student_ids = np.full(size, -1, dtype=np.int64)
+            ratings = np.full(size, np.nan, dtype=np.float32)
+            for target, column in ((teacher_ids, self.teacher_ids), (student_ids, self.student_ids)):
+                values = column[slots]
+                target[rows] = np.where(values == MISSING_ID, -1, values)
+            ratings[rows] = self.ratings[slots]
+
+            overridden = [
+                slot for slot, extra in self._extra.items()
+                if not extra.keys().isdisjoint(("teacherId", "studentId", "rating"))
+            ]
+            pending = [
+                (int(row), index_to_docstore_id[int(row)])
+                for row in rows[np.isin(slots, overridden)]
+            ]
+            return teacher_ids, student_ids, ratings, pending
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by the columns, buffers and string table"""
+        arrays = (
+            self.student_ids, self.teacher_ids, self.ratings, self._rating_kinds,
+            self._student_names, self._teacher_names, self._lexicons,
+            self._text_offsets, self._theme_terms, self._theme_counts, self._theme_offsets,
+        )
+        strings = sum(len(text) + 49 for text in self._strings.strings)
+        return sum(array.nbytes for array in arrays) + len(self._text) + strings
+
+    def stats(self):
+        """Document count and memory footprint for /stats"""
+        return {
+            "documents": len(self._slots),
+            "freed_pending_compaction": self._freed,
+            "interned_strings": len(self._strings.strings),
+            "overrides": len(self._extra),
+            "column_bytes": self.nbytes(),
+        }
+
+    # Internals; callers hold the lock
+
+    def _reserve(self, count):
+        capacity = len(self.ratings)
+        if count <= capacity and self._owns_tail:
+            return
+        if count > capacity:
+            capacity = max(count, 2 * capacity)
+        for name in (
+            "student_ids", "teacher_ids", "ratings", "_rating_kinds",
+            "_student_names", "_teacher_names", "_lexicons",
+        ):
+            setattr(self, name, _grown(getattr(self, name), capacity))
+        self._text_offsets = _grown(self._text_offsets, capacity + 1)
+        self._theme_offsets = _grown(self._theme_offsets, capacity + 1)
+        if not self._owns_tail:
+            # A fork appends into the shared buffers; copy them up to this docstore's end
+            self._text = bytearray(self._text[: self._text_offsets[self._count]])
+            self._theme_terms = self._theme_terms.copy()
+            self._theme_counts = self._theme_counts.copy()
+            self._owns_tail = True
+
+    def _reserve_themes(self, count):
+        if count > len(self._theme_terms):
+            capacity = max(count, 2 * len(self._theme_terms))
+            self._theme_terms = _grown(self._theme_terms, capacity)
+            self._theme_counts = _grown(self._theme_counts, capacity)
+
+    def _append(self, doc_id, document):
+        metadata = document.metadata
+        slot = self._count
+        extra = {key: value for key, value in metadata.items() if key not in _SCHEMA}
+        for key in _SCHEMA:
+            if key not in metadata:
+                extra[key] = _Absent
+
+        for key, column in (("studentId", self.student_ids), ("teacherId", self.teacher_ids)):
+            value = metadata.get(key)
+            column[slot] = value if _is_int(value) else MISSING_ID
+            if value is not None and not _is_int(value):
+                extra[key] = value
+
+        rating = metadata.get("rating")
+        if _is_int(rating):
+            self.ratings[slot], self._rating_kinds[slot] = rating, _INT_RATING
+        elif isinstance(rating, float):
+            self.ratings[slot], self._rating_kinds[slot] = rating, _FLOAT_RATING
+        else:
+            self.ratings[slot], self._rating_kinds[slot] = np.nan, _NO_RATING
+            if rating is not None:
+                extra["rating"] = rating
+
+        for key, column in (
+            ("studentName", self._student_names),
+            ("teacherName", self._teacher_names),
+            ("themeLexicon", self._lexicons),
+        ):
+            value = metadata.get(key)
+            column[slot] = self._strings.code(value) if isinstance(value, str) else -1
+            if value is not None and not isinstance(value, str):
+                extra[key] = value
+
+        review = metadata.get("review")
+        if isinstance(review, str):
+            self._text += review.encode("utf-8")
+        elif "review" in metadata:
+            extra["review"] = review
+        self._text_offsets[slot + 1] = len(self._text)
+
+        themes = metadata.get("themes")
+        start = self._theme_offsets[slot]
+        if isinstance(themes, dict) and all(
+            isinstance(term, str) and _is_int(count) for term, count in themes.items()
+        ):
+            self._reserve_themes(start + len(themes))
+            for i, (term, count) in enumerate(themes.items()):
+                self._theme_terms[start + i] = self._strings.code(term)
+                self._theme_counts[start + i] = count
+            self._theme_offsets[slot + 1] = start + len(themes)
+        else:
+            self._theme_offsets[slot + 1] = start
+            if "themes" in metadata:
+                extra["themes"] = themes
+
+        self._slots[doc_id] = slot
+        self._count += 1
+        if extra:
+            self._extra[slot] = extra
+        # page_content is only stored when it is not the text built from the metadata
+        if document.page_content != review_text(self._metadata(slot)):
+            self._extra.setdefault(slot, {})["page_content"] = document.page_content
+
+    def _metadata(self, slot) -> dict:
+        strings = self._strings.strings
+
+        def text(code):
+            return strings[code] if code >= 0 else None
+
+        def int_or_none(value):
+            return None if value == MISSING_ID else int(value)
+
+        kind = self._rating_kinds[slot]
+        rating = self.ratings[slot]
+        start, stop = self._theme_offsets[slot], self._theme_offsets[slot + 1]
+        text_start, text_stop = self._text_offsets[slot], self._text_offsets[slot + 1]
+        metadata = {
+            "studentId": int_or_none(self.student_ids[slot]),
+            "teacherId": int_or_none(self.teacher_ids[slot]),
+            "studentName": text(self._student_names[slot]),
+            "teacherName": text(self._teacher_names[slot]),
+            "rating": int(rating) if kind == _INT_RATING else float(rating) if kind == _FLOAT_RATING else None,
+            "review": str(self._text[text_start:text_stop], "utf-8"),
+            "themes": {
+                strings[term]: int(count)
+                for term, count in zip(self._theme_terms[start:stop], self._theme_counts[start:stop])
+            },
+            "themeLexicon": text(self._lexicons[slot]),
+        }
+        for key, value in self._extra.get(slot, {}).items():
+            if value is _Absent:
+                metadata.pop(key, None)
+            elif key != "page_content":
+                metadata[key] = value
+        return metadata
+
+    def _document(self, doc_id, slot) -> Document:
+        metadata = self._metadata(slot)
+        page_content = self._extra.get(slot, {}).get("page_content")
+        if page_content is None:
+            page_content = review_text(metadata)
+        return Document(id=doc_id, page_content=page_content, metadata=metadata)
+
+    def _free(self, slots):
+        for slot in slots:
+            self._extra.pop(slot, None)
+        self._freed += len(slots)
+        if self._freed > max(len(self._slots), 1024):
+            self._compact()
+
+    def _compact(self):
+        # Drop the freed slots and renumber the rest
+        keep = np.zeros(self._count, dtype=bool)
+        keep[np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))] = True
+        new_slots = np.cumsum(keep) - 1
+
+        for name in (
+            "student_ids", "teacher_ids", "ratings", "_rating_kinds",
+            "_student_names", "_teacher_names", "_lexicons",
+        ):
+            setattr(self, name, getattr(self, name)[: self._count][keep])
+
+        text_keep, self._text_offsets = _packed_keep(self._text_offsets[: self._count + 1], keep)
+        text = np.frombuffer(self._text, dtype=np.uint8)[: len(text_keep)]
+        self._text = bytearray(text[text_keep].tobytes())
+
+        theme_keep, self._theme_offsets = _packed_keep(self._theme_offsets[: self._count + 1], keep)
+        self._theme_terms = self._theme_terms[: len(theme_keep)][theme_keep]
+        self._theme_counts = self._theme_counts[: len(theme_keep)][theme_keep]
+
+        self._slots = {
+            doc_id: int(new_slots[slot]) for doc_id, slot in self._slots.items() if keep[slot]
+        }
+        self._extra = {
+            int(new_slots[slot]): extra for slot, extra in self._extra.items() if keep[slot]
+        }
+        self._count = int(keep.sum())
+        self._freed = 0
+        self._owns_tail = True
+
+    def __getstate__(self):
+        # Trim spare capacity and leave the lock out of snapshots. Every
+        # column, the text buffer included, is a contiguous array, so pickle
+        # protocol 5 can write it out of band.
+        with self._lock:
+            state = dict(self.__dict__)
+            count, themes = self._count, int(self._theme_offsets[self._count])
+            state["_text"] = np.frombuffer(self._text, dtype=np.uint8).copy()
+        del state["_lock"], state["_owns_tail"]
+        for name in (
+            "student_ids", "teacher_ids", "ratings", "_rating_kinds",
+            "_student_names", "_teacher_names", "_lexicons",
+        ):
+            state[name] = state[name][:count].copy()
+        state["_text_offsets"] = state["_text_offsets"][: count + 1].copy()
+        state["_theme_offsets"] = state["_theme_offsets"][: count + 1].copy()
+        state["_theme_terms"] = state["_theme_terms"][:themes].copy()
+        state["_theme_counts"] = state["_theme_counts"][:themes].copy()
+        return state
+
+    def __setstate__(self, state):
+        # Snapshots from before freed slots have none
+        self.__dict__.update({"_freed": 0, **state})
+        self._owns_tail = True
+        if isinstance(self._text, np.ndarray) and not self._text.flags.writeable:
+            # Mapped from a shared snapshot; such a docstore is only read
+            self._text = memoryview(self._text)
+        else:
+            self._text = bytearray(self._text)
+        self._lock = threading.Lock()
@@ -0,0 +1,125 @@
+"""Micro-batching of concurrent query embeddings.
+
+Requests that arrive within ``window`` seconds of each other (or until
+``max_batch`` are waiting) are embedded with one batch call and the vectors
+are fanned back out to the awaiting callers. Identical texts in a batch are
+embedded once. If the batch call fails, each text is retried on its own so
+one bad query only fails its own callers.
+"""
+
+from collections import deque
+import asyncio
+import time
+
+import numpy as np
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent ``embed`` calls into batched embedding requests"""
+
+    def __init__(self, embed_batch, window: float, max_batch: int):
+        # embed_batch: async callable taking a list of texts, returning vectors
+        self._embed_batch = embed_batch
+        self.window = window
+        self.max_batch = max(max_batch, 1)
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self.largest_batch = 0
+        self.flushes = {"window": 0, "full": 0}
+        self._queue_delays = deque(maxlen=1000)
+        self._batch_sizes = deque(maxlen=1000)
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0 and self.max_batch > 1
+
+    async def embed(self, text: str):
+        """Embed one query text as part of the next batch"""
+        if not self.enabled:
+            self.requests += 1
+            return (await self._embed_batch([text]))[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        self.requests += 1
+        if len(self._pending) >= self.max_batch:
+            self._flush("full")
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush, "window")
+        return await future
+
+    def _flush(self, reason):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.flushes[reason] += 1
+        task = asyncio.ensure_future(self._run(batch))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        dispatched = time.perf_counter()
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        self.batches += 1
+        self.texts += len(texts)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        self._batch_sizes.append(len(batch))
+        self._queue_delays.extend(dispatched - enqueued for _, _, enqueued in batch)
+
+        try:
+            vectors = dict(zip(texts, await self._embed_batch(texts)))
+        except Exception as e:
+            if len(texts) == 1:
+                vectors = {texts[0]: e}
+            else:
+                results = await asyncio.gather(
+                    *(self._embed_batch([text]) for text in texts), return_exceptions=True
+                )
+                vectors = {
+                    text: result if isinstance(result, BaseException) else result[0]
+                    for text, result in zip(texts, results)
+                }
+
+        for text, future, _ in batch:
+            # Callers that gave up (e.g. disconnected clients) are skipped
+            if future.done():
+                continue
+            value = vectors[text]
+            if isinstance(value, BaseException):
+                future.set_exception(value)
+            else:
+                future.set_result(value)
+
+    def stats(self):
+        """Batch size and queueing delay metrics for /stats"""
+        delays = np.array(self._queue_delays) * 1000
+        sizes = np.array(self._batch_sizes)
+        return {
+            "enabled": self.enabled,
+            "window_ms": round(self.window * 1000, 3),
+            "max_batch": self.max_batch,
+            "requests": self.requests,
+            "batches": self.batches,
+            "texts_embedded": self.texts,
+            "largest_batch": self.largest_batch,
+            "flushes": dict(self.flushes),
+            "recent_batch_size": {
+                "mean": round(float(sizes.mean()), 2) if len(sizes) else 0.0,
+                "p50": float(np.percentile(sizes, 50)) if len(sizes) else 0.0,
+                "max": int(sizes.max()) if len(sizes) else 0,
+            },
+            "recent_queue_delay_ms": {
+                "p50": round(float(np.percentile(delays, 50)), 3) if len(delays) else 0.0,
+                "p99": round(float(np.percentile(delays, 99)), 3) if len(delays) else 0.0,
+            },
+        }
@@ -0,0 +1,221 @@
+"""Persistent, content-addressed cache in front of an embeddings model.
+
+Vectors are stored in SQLite keyed by a hash of the model name and the exact
+text, so rebuilding the index never pays to embed the same review twice.
+The least recently used entries are evicted once the cache grows past
+``max_entries``. Hits only note their ``last_used`` time in memory; the
+notes are written with the next insert or once enough pile up, so a read
+never commits. The async methods run the SQLite work on a thread.
+"""
+
+from langchain_core.embeddings import Embeddings
+import asyncio
+import hashlib
+import inspect
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# SQLite limits the number of host parameters in a single statement
+_LOOKUP_CHUNK = 500
+
+# Hits whose last_used time is noted before it is written out
+_TOUCH_BATCH = 1000
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves repeated texts from a local cache"""
+
+    def __init__(self, underlying: Embeddings, model: str, path: str, max_entries: int):
+        self.underlying = underlying
+        self.model = model
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._touched = {}  # key -> last_used not yet written
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _key(self, kind: str, text: str) -> str:
+        # Query and document embeddings use different task types upstream
+        return hashlib.sha256(f"{kind}\0{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys):
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(unique_keys), _LOOKUP_CHUNK):
+                chunk = unique_keys[start:start + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            self._touched.update((key, now) for key in found)
+            if len(self._touched) >= _TOUCH_BATCH:
+                self._write_touched()
+                self._conn.commit()
+        return found
+
+    def _write_touched(self):
+        # Callers hold the lock and commit
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _store(self, items):
+        now = time.time()
+        rows = [
+            (key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items
+        ]
+        with self._lock:
+            # Eviction must see recent hits, so their times are written first
+            self._write_touched()
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._entries += self._conn.total_changes - before
+            if self._entries > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        # Trim to 90% so eviction is not triggered on every insert
+        excess = self._entries - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            " SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._entries -= excess
+        self.evictions += excess
+
+    def _split(self, kind, texts):
+        keys = [self._key(kind, text) for text in texts]
+        cached = self._lookup(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        hits = sum(1 for key in keys if key in cached)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return keys, cached, missing
+
+    def embed_documents(self, texts):
+        keys, cached, missing = self._split("document", texts)
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            new_items = list(zip(missing.keys(), vectors))
+            self._store(new_items)
+            cached.update(new_items)
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text):
+        keys, cached, missing = self._split("query", [text])
+        if missing:
+            vector = self.underlying.embed_query(text)
+            self._store([(keys[0], vector)])
+            return vector
+        return cached[keys[0]]
+
+    def embed_queries(self, texts):
+        """Embed several queries with one call, sharing the embed_query cache"""
+        keys, cached, missing = self._split("query", texts)
+        if missing:
+            vectors = _embed_query_batch(self.underlying, list(missing.values()))
+            new_items = list(zip(missing.keys(), vectors))
+            self._store(new_items)
+            cached.update(new_items)
+        return [cached[key] for key in keys]
+
+    async def aembed_queries(self, texts):
+        """Async variant of embed_queries"""
+        keys, cached, missing = await asyncio.to_thread(self._split, "query", texts)
+        if missing:
+            vectors = await _aembed_query_batch(self.underlying, list(missing.values()))
+            new_items = list(zip(missing.keys(), vectors))
+            await asyncio.to_thread(self._store, new_items)
+            cached.update(new_items)
+        return [cached[key] for key in keys]
+
+    async def aembed_documents(self, texts):
+        keys, cached, missing = await asyncio.to_thread(self._split, "document", texts)
+        if missing:
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+            new_items = list(zip(missing.keys(), vectors))
+            await asyncio.to_thread(self._store, new_items)
+            cached.update(new_items)
+        return [cached[key] for key in keys]
+
+    async def aembed_query(self, text):
+        keys, cached, missing = await asyncio.to_thread(self._split, "query", [text])
+        if missing:
+            vector = await self.underlying.aembed_query(text)
+            await asyncio.to_thread(self._store, [(keys[0], vector)])
+            return vector
+        return cached[keys[0]]
+
+    def stats(self):
+        """Hit/miss counters for /stats"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": self._entries,
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+        }
+
+
+def _embed_query_batch(embeddings, texts):
+    # embed_documents uses the document task type on models that have one;
+    # ask for query embeddings so results match embed_query
+    if "task_type" in inspect.signature(embeddings.embed_documents).parameters:
+        return embeddings.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+    return embeddings.embed_documents(texts)
+
+
+def embed_queries(embeddings, texts):
+    """Embed several queries with a single batch call"""
+    if isinstance(embeddings, CachedEmbeddings):
+        return embeddings.embed_queries(texts)
+    return _embed_query_batch(embeddings, texts)
+
+
+async def _aembed_query_batch(embeddings, texts):
+    if "task_type" in inspect.signature(embeddings.aembed_documents).parameters:
+        return await embeddings.aembed_documents(texts, task_type="RETRIEVAL_QUERY")
+    return await embeddings.aembed_documents(texts)
+
+
+async def aembed_queries(embeddings, texts):
+    """Async variant of embed_queries"""
+    if isinstance(embeddings, CachedEmbeddings):
+        return await embeddings.aembed_queries(texts)
+    return await _aembed_query_batch(embeddings, texts)
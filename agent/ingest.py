@@ -0,0 +1,261 @@
+"""Streaming, batched ingest of review documents into a FAISS vector store.
+
+Documents are pulled from an iterable (usually a Mongo cursor) in fixed-size
+batches and embedded concurrently on a bounded thread pool, with a shared
+rate limit and retries with exponential backoff. Finished batches are added
+to the index on the calling thread as they complete,
+so memory stays bounded by the number of in-flight batches and a batch that
+fails permanently only loses its own documents. A batch that fails while
+being added is rolled back, so the index, docstore and row mapping always
+hold the same documents.
+
+Indexes that need training (IVF) hold embedded batches back until enough
+vectors have arrived, train on them, then add everything held so far.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+import random
+import threading
+import time
+
+from langchain_community.vectorstores import FAISS
+import faiss
+import numpy as np
+
+from ann_index import (
+    create_index,
+    overlay_index,
+    train_index,
+    training_size,
+    truncate_index,
+)
+from columnar_docstore import ColumnarDocstore
+from settings import VECTOR_INDEX_TYPE
+
+
+class RateLimiter:
+    """Spaces out calls so at most ``rate`` start per second across threads"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait_for = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+
+def _batches(documents, batch_size):
+    iterator = iter(documents)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _embed_with_retry(embeddings, texts, limiter, max_retries, backoff):
+    attempt = 0
+    while True:
+        limiter.acquire()
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception:
+            if attempt >= max_retries:
+                raise
+            # Exponential backoff with jitter so parallel batches do not retry in lockstep
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+            attempt += 1
+
+
+def empty_vector_store(embeddings, dimension, index_type=VECTOR_INDEX_TYPE):
+    """Create an empty FAISS vector store with the configured index type"""
+    return FAISS(
+        embedding_function=embeddings,
+        index=create_index(dimension, index_type),
+        docstore=ColumnarDocstore(),
+        index_to_docstore_id={},
+    )
+
+
+def fork_vector_store(vector_store):
+    """Copy of a vector store to change while the original serves searches
+
+    The copy's index is an overlay on the original one and its docstore
+    shares the original's columns, so forking costs the id maps and the
+    changes made since the last compaction, not a second index.
+    """
+    index = vector_store.index
+    return FAISS(
+        embedding_function=vector_store.embedding_function,
+        # An untrained index is empty, and an overlay needs a trained base
+        index=overlay_index(index) if index.is_trained else faiss.clone_index(index),
+        docstore=vector_store.docstore.fork(),
+        index_to_docstore_id=dict(vector_store.index_to_docstore_id),
+    )
+
+
+def ingest_documents(
+    documents,
+    embeddings,
+    vector_store=None,
+    batch_size=256,
+    concurrency=4,
+    rate_limit=0.0,
+    max_retries=3,
+    backoff=1.0,
+    on_indexed=None,
+    progress=print,
+    total=None,
+):
+    """Embed documents in concurrent batches and add them to a vector store
+
+    ``vector_store`` is extended in place, or created from the first batch
+    when None. ``on_indexed`` is called with each batch of documents and
+    their vectors once it is in the index. Returns (vector_store, report);
+    the report lists the ids of documents whose batch failed after all
+    retries or could not be added, and, apart from those, errors raised by
+    ``on_indexed`` for batches that were indexed.
+    """
+    limiter = RateLimiter(rate_limit)
+    report = {
+        "batches": 0,
+        "indexed": 0,
+        "failed": 0,
+        "failed_ids": [],
+        "errors": [],
+        "callback_errors": [],
+    }
+    started = time.monotonic()
+
+    # Embedded batches waiting for the index to be trained
+    held = []
+
+    def add_to_index(batch, vectors):
+        ids = [doc.id for doc in batch]
+        duplicates = {doc_id for doc_id in ids if doc_id in vector_store.docstore}
+        if duplicates or len(set(ids)) < len(ids):
+            raise ValueError(
+                f"Batch has repeated or already indexed ids: {sorted(duplicates)[:5]}"
+            )
+        # Rows are numbered from the index size, not the mapping size: an
+        # overlay keeps the numbers of removed rows until it is compacted
+        rows = vector_store.index.ntotal
+        try:
+            matrix = np.array(vectors, dtype=np.float32)
+            if vector_store._normalize_L2:
+                faiss.normalize_L2(matrix)
+            vector_store.index.add(matrix)
+            vector_store.docstore.add({doc.id: doc for doc in batch})
+            vector_store.index_to_docstore_id.update(
+                {rows + offset: doc_id for offset, doc_id in enumerate(ids)}
+            )
+        except Exception:
+            # Undo whatever part of the add went through
+            vector_store.index = truncate_index(vector_store.index, rows)
+            for row in [row for row in vector_store.index_to_docstore_id if row >= rows]:
+                del vector_store.index_to_docstore_id[row]
+            added = [doc_id for doc_id in ids if doc_id in vector_store.docstore]
+            if added:
+                vector_store.docstore.delete(added)
+            raise
+        if on_indexed is not None:
+            try:
+                on_indexed(batch, vectors)
+            except Exception as e:
+                # The batch is in the index; only its bookkeeping failed
+                if len(report["callback_errors"]) < 10:
+                    report["callback_errors"].append(str(e))
+                print(f"✗ Post-index step failed for a batch of {len(batch)} reviews: {e}")
+
+    def flush_held():
+        """Train on the held batches and index them, returning how many were added"""
+        added = 0
+        try:
+            vectors = np.concatenate([np.asarray(v, dtype=np.float32) for _, v in held])
+            print(f"Training {type(vector_store.index).__name__} on {len(vectors)} vectors...")
+            vector_store.index = train_index(vector_store.index, vectors)
+            while held:
+                batch, batch_vectors = held[0]
+                add_to_index(batch, batch_vectors)
+                held.pop(0)
+                added += len(batch)
+        except Exception as e:
+            # A failed training step fails every batch held for it
+            for batch, _ in held:
+                record_failure(batch, e)
+            held.clear()
+        return added
+
+    def add_batch(batch, vectors):
+        """Add a batch to the index, returning how many documents were indexed"""
+        nonlocal vector_store
+        if vector_store is None:
+            vector_store = empty_vector_store(embeddings, len(vectors[0]))
+        if vector_store.index.is_trained:
+            add_to_index(batch, vectors)
+            return len(batch)
+        held.append((batch, vectors))
+        if sum(len(b) for b, _ in held) < training_size(vector_store.index):
+            return 0
+        return flush_held()
+
+    def record_failure(batch, e):
+        report["failed"] += len(batch)
+        report["failed_ids"].extend(doc.id for doc in batch)
+        if len(report["errors"]) < 10:
+            report["errors"].append(str(e))
+        print(f"✗ Batch of {len(batch)} reviews failed permanently: {e}")
+
+    def collect(done, pending):
+        for future in done:
+            batch = pending.pop(future)
+            report["batches"] += 1
+            try:
+                report["indexed"] += add_batch(batch, future.result())
+            except Exception as e:
+                record_failure(batch, e)
+            if progress is not None:
+                elapsed = time.monotonic() - started
+                done_count = report["indexed"] + report["failed"]
+                progress(
+                    f"Ingest progress: {done_count}"
+                    + (f"/{total}" if total else "")
+                    + f" reviews ({report['indexed']} indexed, {report['failed']} failed, "
+                    f"{elapsed:.1f}s elapsed)"
+                )
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = {}
+        for batch in _batches(documents, batch_size):
+            # Keep a bounded number of batches in flight to cap memory
+            while len(pending) >= concurrency * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done, pending)
+            future = executor.submit(
+                _embed_with_retry,
+                embeddings,
+                [doc.page_content for doc in batch],
+                limiter,
+                max_retries,
+                backoff,
+            )
+            pending[future] = batch
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done, pending)
+
+    # Fewer documents than a full training set: train on what arrived
+    if held:
+        report["indexed"] += flush_held()
+
+    report["elapsed"] = round(time.monotonic() - started, 2)
+    return vector_store, report
@@ -0,0 +1,175 @@
+"""Deterministic routing of structured questions straight to a tool.
+
+Questions such as "show me reviews for teacher ID 123" or "recommend
+teachers for math" map onto exactly one tool call, so running them through
+the ReAct prompt only adds LLM round trips. ``route`` recognises the common
+shapes with anchored patterns and returns the tool and its argument;
+anything open-ended (comparisons, explanations, several teachers, web
+questions) returns None and goes to the agent.
+
+An optional second stage compares the query embedding with a few example
+questions per intent and routes when the best match clears a similarity
+threshold, which catches phrasings the patterns miss.
+"""
+
+from typing import NamedTuple, Optional
+import asyncio
+import re
+
+import numpy as np
+
+
+class Route(NamedTuple):
+    intent: str  # teacher_reviews, recommendations or search_reviews
+    argument: str  # teacher id or the topic to search for
+    method: str  # rules or semantic
+
+
+_TEACHER = r"(?:teachers?|instructors?|professors?|profs?|tutors?|lecturers?)"
+
+# Questions the agent should reason about even if they look structured
+_OPEN_ENDED = re.compile(
+    r"\b(?:why|how come|explain|compare|comparison|versus|vs|difference|better than|"
+    r"worse than|news|latest|web|internet|online)\b",
+    re.IGNORECASE,
+)
+
+# "teacher 12", "teacher ID 12", "teacherId: 12", but not "teachers 4 stars"
+_TEACHER_ID = re.compile(
+    rf"\b{_TEACHER}\s*(?:id|#|no\.?|number)?\s*[:#=]?\s*(\d+)\b(?!\s*(?:stars?|\+|%|/|out of))",
+    re.IGNORECASE,
+)
+_REVIEW_WORDS = re.compile(
+    r"\b(?:reviews?|ratings?|rated|feedback|comments?|stats|statistics|analy[sz]e|"
+    r"analysis|show|get|list|see|say|said|think)\b",
+    re.IGNORECASE,
+)
+
+_RECOMMENDATION_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        rf"^(?:can you |could you |please )*(?:recommend|suggest)(?: me)?(?: (?:some|a|an|the|good|great|best|top))* {_TEACHER} (?:for|in|on|who|that|with) (?P<topic>.+)$",
+        rf"^(?:can you |could you |please )*(?:find|show|list|give|get)(?: me)?(?: (?:some|a|an|the))* (?:best|top|good|great|recommended) {_TEACHER} (?:for|in|on|who|that|with) (?P<topic>.+)$",
+        rf"^(?:who|which {_TEACHER}) (?:is|are) (?:the )?(?:best|top|good|great)(?: {_TEACHER})? (?:for|in|at|on) (?P<topic>.+)$",
+        rf"^which {_TEACHER} should i (?:take|pick|choose|go with) (?:for|in) (?P<topic>.+)$",
+        rf"^(?:the )?(?:best|top|good|great|recommended) {_TEACHER} (?:for|in|on|who|that|with) (?P<topic>.+)$",
+        r"^(?:recommend|suggest)(?: me)?(?: (?:some|a|an|the|good|great|best))* (?P<topic>.+?) (?:teachers?|instructors?|professors?|tutors?|courses?|classes?)$",
+    )
+]
+
+_SEARCH_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r"^what (?:do|did|does) (?:the )?(?:students?|people|reviewers?|reviews?) (?:say|said|think|mention|write)(?: about)? (?P<topic>.+)$",
+        r"^(?:find|show|search|search for|get|list)(?: me)?(?: (?:some|the|all|any))? reviews? (?:about|mentioning|that mention|which mention|on|for|of|with|where) (?P<topic>.+)$",
+        r"^(?:any |are there (?:any )?)?reviews? (?:about|mentioning|that mention|on|of|with) (?P<topic>.+)$",
+        r"^search reviews? for (?P<topic>.+)$",
+    )
+]
+
+# Example questions per intent for the optional embedding stage
+INTENT_EXAMPLES = {
+    "recommendations": [
+        "recommend teachers for calculus",
+        "which teacher is best for beginners",
+        "who should I take for organic chemistry",
+        "good professors for machine learning",
+    ],
+    "search_reviews": [
+        "what do students say about homework",
+        "reviews mentioning group projects",
+        "find reviews about exam difficulty",
+        "are lectures described as boring",
+    ],
+}
+
+
+def _clean(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().rstrip("?.!").strip()
+
+
+def _topic(match) -> str:
+    return match.group("topic").strip(" ,;:")
+
+
+def route(query: str) -> Optional[Route]:
+    """The tool call a structured question maps onto, or None for the agent"""
+    text = _clean(query)
+    if not text or _OPEN_ENDED.search(text):
+        return None
+
+    # Exactly one teacher id plus a request to see their reviews
+    teacher_ids = set(_TEACHER_ID.findall(text))
+    if len(teacher_ids) > 1:
+        return None
+    if teacher_ids:
+        if _REVIEW_WORDS.search(text) or len(text.split()) <= 4:
+            return Route("teacher_reviews", teacher_ids.pop(), "rules")
+        return None
+
+    for pattern in _RECOMMENDATION_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            return Route("recommendations", _topic(match), "rules")
+    for pattern in _SEARCH_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            return Route("search_reviews", _topic(match), "rules")
+    return None
+
+
+class IntentRouter:
+    """``route`` plus the optional nearest-intent fallback and routing counters"""
+
+    def __init__(self, aembed_query=None, threshold: float = 0.0):
+        # aembed_query: async callable embedding one query text
+        self._aembed_query = aembed_query
+        self.threshold = threshold
+        self._examples = None
+        self.routed = {}
+        self.fallbacks = 0
+
+    @property
+    def semantic(self) -> bool:
+        return self._aembed_query is not None and self.threshold > 0
+
+    async def aroute(self, query: str) -> Optional[Route]:
+        result = route(query)
+        if result is None and self.semantic and not _OPEN_ENDED.search(query):
+            result = await self._nearest_intent(query)
+        if result is None:
+            self.fallbacks += 1
+        else:
+            key = f"{result.intent}:{result.method}"
+            self.routed[key] = self.routed.get(key, 0) + 1
+        return result
+
+    async def _nearest_intent(self, query: str) -> Optional[Route]:
+        if self._examples is None:
+            intents = [intent for intent, texts in INTENT_EXAMPLES.items() for _ in texts]
+            texts = [text for texts in INTENT_EXAMPLES.values() for text in texts]
+            vectors = await asyncio.gather(*(self._aembed_query(text) for text in texts))
+            self._examples = (intents, _unit_rows(vectors))
+        intents, examples = self._examples
+        vector = _unit_rows([await self._aembed_query(query)])[0]
+        similarity = examples @ vector
+        best = int(np.argmax(similarity))
+        if similarity[best] < self.threshold:
+            return None
+        return Route(intents[best], _clean(query), "semantic")
+
+    def stats(self):
+        """Routing counters for /stats"""
+        routed = sum(self.routed.values())
+        total = routed + self.fallbacks
+        return {
+            "routed": dict(self.routed),
+            "fallbacks": self.fallbacks,
+            "routed_rate": round(routed / total, 4) if total else 0.0,
+            "semantic_threshold": self.threshold if self.semantic else None,
+        }
+
+
+def _unit_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
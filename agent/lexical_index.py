@@ -0,0 +1,335 @@
+"""BM25 inverted index over review text and teacher names.
+
+Built during ingest next to the FAISS index and kept in step with it the
+same way as ``TeacherIndex``: documents are added as their batch is
+indexed, and removed or replaced by the delta sync. Exact terms such as a
+teacher's name or "homework" are matched directly, which pure vector
+similarity serves poorly, and a lexical search needs no embedding call.
+
+Postings are compact ``array`` buffers of (slot, term frequency) per term.
+Removed documents are masked out and their postings are dropped in one pass
+once they outnumber the live ones. ``reciprocal_rank_fusion`` merges the
+BM25 ranking with the FAISS one.
+
+Pickling packs the postings and document ids into a few contiguous arrays
+that pickle protocol 5 writes out of band, so a snapshot can hand them to
+reader workers as read-only memory maps (see ``snapshot``). A loaded index
+is unpacked again on its first change.
+
+``fork`` copies the id maps and per-document arrays for a delta sync to
+change, and shares the posting lists until the copy appends to one.
+"""
+
+from array import array
+from collections import Counter
+import math
+import re
+import threading
+
+import numpy as np
+
+from vector_search import FilterColumns, filter_values
+
+_TOKEN = re.compile(r"\w+")
+
+# Words too common in reviews to be worth a posting list
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i if in is it its "
+    "me my of on or our she so that the their them they this to was we were with you your".split()
+)
+
+
+def tokenize(text) -> list:
+    """Lowercased word tokens without stopwords"""
+    return [
+        token for token in _TOKEN.findall((text or "").lower()) if token not in STOPWORDS
+    ]
+
+
+def _document_text(doc) -> str:
+    metadata = doc.metadata
+    if metadata.get("review") is None:
+        return doc.page_content
+    return f"{metadata.get('teacherName') or ''} {metadata['review']}"
+
+
+class _PackedPostings:
+    """Every posting list in one slots array and one frequencies array, read-only"""
+
+    def __init__(self, postings):
+        self.terms = {term: row for row, term in enumerate(postings)}
+        lengths = [len(slots) for slots, _ in postings.values()]
+        self.offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+
+        def packed(column):
+            buffers = [np.frombuffer(posting[column], dtype=np.int32) for posting in postings.values()]
+            return np.concatenate(buffers) if buffers else np.zeros(0, dtype=np.int32)
+
+        self.slots, self.frequencies = packed(0), packed(1)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def get(self, term):
+        row = self.terms.get(term)
+        if row is None:
+            return None
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return self.slots[start:end], self.frequencies[start:end]
+
+    def unpacked(self) -> dict:
+        return {
+            term: tuple(array("i", column.tobytes()) for column in self.get(term))
+            for term in self.terms
+        }
+
+
+class _PackedStrings:
+    """Strings in one UTF-8 buffer with offsets, read-only; None packs as ''"""
+
+    def __init__(self, strings):
+        encoded = [(text or "").encode("utf-8") for text in strings]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(data) for data in encoded], out=self.offsets[1:])
+        self.buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position):
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return self.buffer[start:end].tobytes().decode("utf-8")
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60) -> list:
+    """Ids from several best-first rankings, ordered by the sum of 1 / (k + rank)"""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=lambda doc_id: -scores[doc_id])
+
+
+class BM25Index:
+    """Okapi BM25 over the reviews of a vector store, addressed by document id"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self.slots = {}  # doc id -> slot
+        self.doc_ids = []  # slot -> doc id, None once removed
+        self.postings = {}  # term -> (slots, term frequencies)
+        self._shared = set()  # terms whose posting lists a fork also holds
+        self.lengths = np.zeros(0, dtype=np.int32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.teacher_ids = np.zeros(0, dtype=np.int64)
+        self.student_ids = np.zeros(0, dtype=np.int64)
+        self.ratings = np.zeros(0, dtype=np.float32)
+        self.live = 0
+        self.removed = 0
+        self.total_length = 0
+
+    @classmethod
+    def from_documents(cls, documents, k1: float = 1.2, b: float = 0.75):
+        """Index every document of an existing vector store"""
+        index = cls(k1, b)
+        batch = []
+        for doc in documents:
+            batch.append(doc)
+            if len(batch) >= 4096:
+                index.add(batch)
+                batch = []
+        index.add(batch)
+        return index
+
+    def __len__(self):
+        return self.live
+
+    def fork(self):
+        """Copy to change while this index keeps serving searches"""
+        with self._lock:
+            forked = BM25Index.__new__(BM25Index)
+            forked.__dict__.update(self.__dict__)
+            forked._lock = threading.Lock()
+            if self.slots is None:
+                # Packed arrays are never written; the fork unpacks its own on its first change
+                return forked
+            forked.slots = dict(self.slots)
+            forked.doc_ids = list(self.doc_ids)
+            forked.postings = dict(self.postings)
+            for name in ("lengths", "alive", "teacher_ids", "student_ids", "ratings"):
+                setattr(forked, name, getattr(self, name).copy())
+            self._shared = forked._shared = set(self.postings)
+        return forked
+
+    def __getstate__(self):
+        # Copies and pickles leave the lock and the id -> slot map behind,
+        # and trim spare capacity
+        with self._lock:
+            state = dict(self.__dict__)
+            if self.slots is not None:
+                state["postings"] = _PackedPostings(self.postings)
+                state["doc_ids"] = _PackedStrings(self.doc_ids)
+        del state["_lock"], state["slots"], state["_shared"]
+        count = len(state["doc_ids"])
+        for name in ("lengths", "alive", "teacher_ids", "student_ids", "ratings"):
+            state[name] = state[name][:count].copy()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.slots = None  # packed until the first change
+        self._shared = set()
+        self._lock = threading.Lock()
+
+    def _unpack(self):
+        # Callers hold the lock. Only a builder's index changes; a reader's
+        # maps the snapshot and is never written to
+        if self.slots is not None:
+            return
+        alive = self.alive
+        self.doc_ids = [self.doc_ids[slot] if alive[slot] else None for slot in range(len(alive))]
+        self.slots = {doc_id: slot for slot, doc_id in enumerate(self.doc_ids) if doc_id is not None}
+        self.postings = self.postings.unpacked()
+        self._shared = set()
+        for name in ("lengths", "alive", "teacher_ids", "student_ids", "ratings"):
+            setattr(self, name, np.array(getattr(self, name)))
+
+    def _grow(self, capacity):
+        def grown(array_, fill):
+            extra = np.full(capacity - len(array_), fill, dtype=array_.dtype)
+            return np.concatenate([array_, extra])
+
+        self.lengths = grown(self.lengths, 0)
+        self.alive = grown(self.alive, False)
+        self.teacher_ids = grown(self.teacher_ids, -1)
+        self.student_ids = grown(self.student_ids, -1)
+        self.ratings = grown(self.ratings, np.nan)
+
+    def add(self, documents):
+        """Index documents, replacing any already indexed under the same id"""
+        with self._lock:
+            self._unpack()
+            for doc in documents:
+                if doc.id in self.slots:
+                    self._remove(doc.id)
+                slot = len(self.doc_ids)
+                if slot >= len(self.alive):
+                    self._grow(max(1024, 2 * len(self.alive)))
+                terms = Counter(tokenize(_document_text(doc)))
+                for term, frequency in terms.items():
+                    posting = self.postings.get(term)
+                    if posting is None:
+                        posting = self.postings[term] = (array("i"), array("i"))
+                    elif term in self._shared:
+                        # Copied on the first append, so the other index never sees it
+                        posting = self.postings[term] = tuple(array("i", column) for column in posting)
+                        self._shared.discard(term)
+                    posting[0].append(slot)
+                    posting[1].append(frequency)
+                length = sum(terms.values())
+                self.slots[doc.id] = slot
+                self.doc_ids.append(doc.id)
+                self.lengths[slot] = length
+                self.alive[slot] = True
+                self.teacher_ids[slot], self.student_ids[slot], self.ratings[slot] = (
+                    filter_values(doc.metadata)
+                )
+                self.live += 1
+                self.total_length += length
+
+    def remove(self, ids):
+        """Drop documents by id; unknown ids are ignored"""
+        with self._lock:
+            self._unpack()
+            for doc_id in ids:
+                if doc_id in self.slots:
+                    self._remove(doc_id)
+            if self.removed > max(self.live, 1024):
+                self._compact()
+
+    def _remove(self, doc_id):
+        slot = self.slots.pop(doc_id)
+        self.doc_ids[slot] = None
+        self.alive[slot] = False
+        self.live -= 1
+        self.removed += 1
+        self.total_length -= int(self.lengths[slot])
+
+    def _compact(self):
+        # Renumber the live slots and drop removed documents from every posting list
+        count = len(self.doc_ids)
+        keep = self.alive[:count]
+        new_slots = (np.cumsum(keep) - 1).astype(np.int32)
+        for term in list(self.postings):
+            slots, frequencies = (np.array(column, dtype=np.int32) for column in self.postings[term])
+            kept = keep[slots]
+            if not kept.any():
+                del self.postings[term]
+                continue
+            self.postings[term] = (
+                array("i", new_slots[slots[kept]].tobytes()),
+                array("i", frequencies[kept].tobytes()),
+            )
+        self.doc_ids = [doc_id for doc_id in self.doc_ids if doc_id is not None]
+        self.slots = {doc_id: slot for slot, doc_id in enumerate(self.doc_ids)}
+        for name in ("lengths", "alive", "teacher_ids", "student_ids", "ratings"):
+            setattr(self, name, getattr(self, name)[:count][keep])
+        self.removed = 0
+        self._shared = set()
+
+    def search(self, query: str, k: int, filters=None) -> list:
+        """Up to k (doc id, BM25 score) pairs, best first, matching the filters"""
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or not self.live:
+                return []
+            average_length = self.total_length / self.live
+            matched_slots, matched_scores = [], []
+            for term in terms:
+                posting = self.postings.get(term)
+                if posting is None:
+                    continue
+                # Copies, so the buffers can keep growing while results are read
+                slots = np.array(posting[0], dtype=np.int32)
+                frequencies = np.array(posting[1], dtype=np.float32)
+                live = self.alive[slots]
+                df = int(live.sum())
+                if not df:
+                    continue
+                slots, frequencies = slots[live], frequencies[live]
+                idf = math.log(1.0 + (self.live - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * self.lengths[slots] / average_length)
+                matched_slots.append(slots)
+                matched_scores.append(idf * frequencies * (self.k1 + 1.0) / (frequencies + norm))
+            if not matched_slots:
+                return []
+
+            candidates, positions = np.unique(np.concatenate(matched_slots), return_inverse=True)
+            scores = np.bincount(positions, weights=np.concatenate(matched_scores))
+            if filters:
+                columns = FilterColumns(
+                    self.teacher_ids[candidates],
+                    self.student_ids[candidates],
+                    self.ratings[candidates],
+                )
+                mask = columns.mask(dict(filters))
+                candidates, scores = candidates[mask], scores[mask]
+            if not len(candidates):
+                return []
+
+            k = min(k, len(candidates))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return [(self.doc_ids[candidates[i]], float(scores[i])) for i in top]
+
+    def stats(self):
+        """Index size for /stats"""
+        return {
+            "documents": self.live,
+            "terms": len(self.postings),
+            "removed_pending_compaction": self.removed,
+            "average_length": round(self.total_length / self.live, 2) if self.live else 0.0,
+        }
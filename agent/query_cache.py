@@ -0,0 +1,62 @@
+"""In-memory LRU+TTL caches for query embeddings and search results.
+
+Result keys include the index version, and the result cache is cleared
+whenever the index is rebuilt or delta-synced, so a cached answer never
+outlives the index it was computed from.
+"""
+
+from cachetools import TTLCache
+import re
+import threading
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query used as a cache key"""
+    return _WHITESPACE.sub(" ", query).strip().lower()
+
+
+class QueryCache:
+    """Thread-safe LRU cache with a per-entry TTL and hit/miss counters"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=max(maxsize, 1), ttl=ttl)
+        self._lock = threading.Lock()
+        self.enabled = maxsize > 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._cache[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        with self._lock:
+            size = len(self._cache)
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": size,
+            "max_size": self._cache.maxsize if self.enabled else 0,
+            "ttl_seconds": self._cache.ttl,
+        }
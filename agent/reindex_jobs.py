@@ -0,0 +1,172 @@
+"""Background reindex jobs with ids, progress and status.
+
+``POST /cache-reviews`` queues a job and returns its id at once; jobs run one
+at a time on a background thread, so reindexes never overlap, and
+``GET /cache-reviews/{job_id}`` reports their status and progress. A job
+builds the new index version next to the live one and publishes it with one
+swap (see ``agent.sync_reviews_to_vector_store``), so searches keep using
+the old version until then and a failed job leaves it serving.
+
+A queued job already covers every change made before it runs, so asking for
+a job while one of the same mode is queued returns that job.
+
+With a shared index (see ``shared_index``) jobs are JSON files in
+``<VECTOR_SNAPSHOT_DIR>/jobs``: any worker can queue a job and report its
+status, and only the builder worker runs them, from ``run_pending``.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+import json
+import os
+import threading
+import uuid
+
+JOB_MODES = ("delta", "full")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+@dataclass
+class ReindexJob:
+    id: str
+    mode: str
+    status: str = "queued"  # queued -> running -> succeeded | failed
+    created_at: str = field(default_factory=_now)
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    progress: Optional[str] = None
+    result: Optional[dict] = None  # added, updated, removed and total reviews
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class ReindexJobs:
+    """Queue and run reindex jobs one at a time, keeping the most recent ones"""
+
+    def __init__(self, run, directory=None, keep: int = 100):
+        self._run = run  # mode -> result dict; raises on failure
+        self.directory = Path(directory) if directory else None
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # id -> job, oldest first
+        self._current = None
+        self._executor = None if directory else ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="reindex"
+        )
+
+    def submit(self, mode: str) -> ReindexJob:
+        """Queue a job, or return the queued job of the same mode"""
+        if mode not in JOB_MODES:
+            raise ValueError(f"Unknown reindex mode: {mode}")
+        with self._lock:
+            for job in self._list():
+                if job.mode == mode and job.status == "queued":
+                    return job
+            job = ReindexJob(uuid.uuid4().hex, mode)
+            self._save(job)
+            self._prune()
+        if self._executor is not None:
+            self._executor.submit(self._execute, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ReindexJob]:
+        with self._lock:
+            if self.directory is None:
+                return self._jobs.get(job_id)
+            return self._read(self.directory / f"{job_id}.json")
+
+    def list(self) -> list:
+        """Jobs, newest first"""
+        with self._lock:
+            return self._list()[::-1]
+
+    def run_pending(self):
+        """Run queued job files in order; called by the builder worker"""
+        for job in [job for job in self.list()[::-1] if job.status == "queued"]:
+            self._execute(job)
+
+    def fail_interrupted(self):
+        """Fail jobs left running by a builder that exited; called by its successor"""
+        with self._lock:
+            for job in self._list():
+                if job.status == "running":
+                    job.status, job.finished_at = "failed", _now()
+                    job.error = "Interrupted: the worker running it exited"
+                    self._save(job)
+
+    def report(self, message: str):
+        """Record progress of the running job"""
+        with self._lock:
+            if self._current is not None:
+                self._current.progress = message
+                self._save(self._current)
+
+    def stats(self):
+        jobs = self.list()
+        return {
+            "running": next((job.id for job in jobs if job.status == "running"), None),
+            "queued": sum(job.status == "queued" for job in jobs),
+            "last_finished": next((job.to_dict() for job in jobs if job.finished), None),
+        }
+
+    def _execute(self, job):
+        with self._lock:
+            job.status, job.started_at = "running", _now()
+            self._current = job
+            self._save(job)
+        try:
+            result, error, status = self._run(job.mode), None, "succeeded"
+        except Exception as e:
+            result, error, status = None, str(e), "failed"
+        with self._lock:
+            job.status, job.result, job.error, job.finished_at = status, result, error, _now()
+            self._current = None
+            self._save(job)
+        print(f"{'✓' if status == 'succeeded' else '✗'} Reindex job {job.id} ({job.mode}) {status}")
+
+    # Storage; callers hold the lock
+
+    def _save(self, job):
+        if self.directory is None:
+            self._jobs[job.id] = job
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{job.id}.json"
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(job.to_dict()))
+        os.replace(tmp_path, path)
+
+    def _read(self, path):
+        try:
+            return ReindexJob(**json.loads(path.read_text()))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _list(self):
+        if self.directory is None:
+            return list(self._jobs.values())
+        if not self.directory.exists():
+            return []
+        jobs = (self._read(path) for path in self.directory.glob("*.json"))
+        return sorted((job for job in jobs if job is not None), key=lambda job: job.created_at)
+
+    def _prune(self):
+        finished = [job for job in self._list() if job.finished]
+        for job in finished[: max(len(finished) - self.keep, 0)]:
+            if self.directory is None:
+                del self._jobs[job.id]
+            else:
+                (self.directory / f"{job.id}.json").unlink(missing_ok=True)
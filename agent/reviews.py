@@ -0,0 +1,41 @@
+from langchain.schema import Document
+import hashlib
+
+from themes import theme_features
+
+# Review fields kept in each document's metadata; a change to any of them re-indexes the review
+INDEXED_FIELDS = ("studentId", "teacherId", "studentName", "teacherName", "rating", "review")
+
+
+def review_doc_id(review) -> str:
+    """Stable vector store id for a review"""
+    return str(review.get("_id"))
+
+
+def review_text(review) -> str:
+    """Text representation of a review used for embedding"""
+    text = f"Student: {review.get('studentName', 'Unknown')} | "
+    text += f"Teacher: {review.get('teacherName', 'Unknown')} | "
+    text += f"Rating: {review.get('rating', 'N/A')} | "
+    text += f"Review: {review.get('review', 'No review text')}"
+    return text
+
+
+def review_to_document(review) -> Document:
+    """Convert a review from MongoDB into a vector store document"""
+    return Document(
+        id=review_doc_id(review),
+        page_content=review_text(review),
+        metadata={
+            **{field: review.get(field) for field in INDEXED_FIELDS},
+            **theme_features(review.get("review")),
+        },
+    )
+
+
+def document_hash(doc) -> str:
+    """Hash of a document's text and indexed fields, used to detect changed reviews"""
+    digest = hashlib.sha256(doc.page_content.encode("utf-8"))
+    for field in INDEXED_FIELDS:
+        digest.update(f"\0{field}={doc.metadata.get(field)!r}".encode("utf-8"))
+    return digest.hexdigest()
@@ -0,0 +1,80 @@
+"""Batching of searches that become ready together.
+
+The query embedding batcher resolves a whole batch of callers at once, and
+each of them then needs a FAISS search on the sync worker pool. Run one by
+one, those searches queue behind each other on the pool and contend for the
+GIL, so latency grows with the number of requests in flight. Searches
+submitted during the same event loop iteration are run instead as one
+``search_many`` call per group of identical search parameters. No window is
+waited for: a lone search is dispatched on the next iteration.
+"""
+
+import asyncio
+
+
+class SearchBatcher:
+    """Coalesces searches submitted in one event loop iteration into batch calls"""
+
+    def __init__(self, search_many, max_batch: int):
+        # search_many: async callable (group, queries, vectors) -> one result per query
+        self._search_many = search_many
+        self.max_batch = max(max_batch, 1)
+        self._pending = {}  # group -> [(query, vector, future)]
+        self._scheduled = False
+        self._tasks = set()
+
+        self.requests = 0
+        self.batches = 0
+        self.largest_batch = 0
+
+    async def search(self, group, query, vector):
+        """Search one query vector as part of the next batch for ``group``
+
+        ``group`` must be hashable and holds every search parameter besides
+        the query and its vector.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(group, []).append((query, vector, future))
+        self.requests += 1
+        if not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self):
+        self._scheduled = False
+        pending, self._pending = self._pending, {}
+        for group, items in pending.items():
+            for start in range(0, len(items), self.max_batch):
+                task = asyncio.ensure_future(self._run(group, items[start:start + self.max_batch]))
+                # Keep a reference so the task is not garbage collected mid-flight
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, group, batch):
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            results = await self._search_many(
+                group, [query for query, _, _ in batch], [vector for _, vector, _ in batch]
+            )
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, _, future), result in zip(batch, results):
+            # Callers that gave up (e.g. disconnected clients) are skipped
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        """Batch counters for /stats"""
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
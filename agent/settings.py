@@ -0,0 +1,97 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv(".env")
+
+# Embedding model used for every vector in the review index
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "models/embedding-001")
+
+# Field compared against the delta sync watermark to find modified reviews
+REVIEWS_UPDATED_FIELD = os.environ.get("REVIEWS_UPDATED_FIELD", "updatedAt")
+
+# Without change streams (standalone MongoDB), seconds between delta syncs that scan every review id for deletions
+REVIEWS_DELETE_SCAN_INTERVAL = float(os.environ.get("REVIEWS_DELETE_SCAN_INTERVAL", "3600"))
+
+# On-disk vector index snapshots
+VECTOR_SNAPSHOT_DIR = os.environ.get("VECTOR_SNAPSHOT_DIR", "snapshots")
+VECTOR_SNAPSHOT_KEEP = int(os.environ.get("VECTOR_SNAPSHOT_KEEP", "3"))
+VECTOR_SNAPSHOT_MMAP = os.environ.get("VECTOR_SNAPSHOT_MMAP", "1") == "1"
+
+# Multiple API workers: one elected worker builds and snapshots the index, the others map it read-only
+SHARED_INDEX = os.environ.get("SHARED_INDEX", "0") == "1"
+SHARED_INDEX_POLL_INTERVAL = float(os.environ.get("SHARED_INDEX_POLL_INTERVAL", "2"))  # seconds
+
+# Finished background reindex jobs kept for GET /cache-reviews/{job_id}
+REINDEX_JOB_HISTORY = int(os.environ.get("REINDEX_JOB_HISTORY", "100"))
+
+# Persistent embedding cache shared by ingest and the search tools
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+
+# Streaming ingest pipeline
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "256"))
+INGEST_CONCURRENCY = int(os.environ.get("INGEST_CONCURRENCY", "4"))
+INGEST_RATE_LIMIT = float(os.environ.get("INGEST_RATE_LIMIT", "0"))  # batches/s, 0 = unlimited
+INGEST_MAX_RETRIES = int(os.environ.get("INGEST_MAX_RETRIES", "3"))
+
+# Worker threads for blocking work on the async request path
+SYNC_WORKERS = int(os.environ.get("SYNC_WORKERS", "8"))
+
+# Page sizes for /teacher-reviews
+TEACHER_REVIEWS_PAGE_SIZE = int(os.environ.get("TEACHER_REVIEWS_PAGE_SIZE", "50"))
+TEACHER_REVIEWS_MAX_PAGE_SIZE = int(os.environ.get("TEACHER_REVIEWS_MAX_PAGE_SIZE", "500"))
+
+# In-memory query caches (size 0 disables a cache)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", "10000"))
+QUERY_EMBEDDING_CACHE_TTL = float(os.environ.get("QUERY_EMBEDDING_CACHE_TTL", "3600"))
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "5000"))
+RESULT_CACHE_TTL = float(os.environ.get("RESULT_CACHE_TTL", "300"))
+
+# Vector index type (flat, ivf or hnsw) and its build and default search parameters
+VECTOR_INDEX_TYPE = os.environ.get("VECTOR_INDEX_TYPE", "flat").lower()
+VECTOR_IVF_NLIST = int(os.environ.get("VECTOR_IVF_NLIST", "1024"))
+VECTOR_IVF_NPROBE = int(os.environ.get("VECTOR_IVF_NPROBE", "16"))
+VECTOR_HNSW_M = int(os.environ.get("VECTOR_HNSW_M", "32"))
+VECTOR_HNSW_EF_CONSTRUCTION = int(os.environ.get("VECTOR_HNSW_EF_CONSTRUCTION", "80"))
+VECTOR_HNSW_EF_SEARCH = int(os.environ.get("VECTOR_HNSW_EF_SEARCH", "64"))
+
+# Delta syncs change an overlay on the served index; past this share of added and removed rows it is folded back in (an HNSW rebuild)
+VECTOR_OVERLAY_MAX_FRACTION = float(os.environ.get("VECTOR_OVERLAY_MAX_FRACTION", "0.1"))
+
+# JSON file with {"positive": [...], "negative": [...]} theme terms; empty uses the built-in lexicon
+THEME_LEXICON_PATH = os.environ.get("THEME_LEXICON_PATH", "")
+
+# Maximum number of queries in one /search-reviews/batch or /recommendations/batch request
+BATCH_MAX_QUERIES = int(os.environ.get("BATCH_MAX_QUERIES", "100"))
+
+# Micro-batching of concurrent query embeddings on the async path (window 0 disables)
+QUERY_EMBED_BATCH_WINDOW_MS = float(os.environ.get("QUERY_EMBED_BATCH_WINDOW_MS", "5"))
+QUERY_EMBED_BATCH_MAX = int(os.environ.get("QUERY_EMBED_BATCH_MAX", "64"))
+
+# Persistent agent answer cache (empty path disables); a similarity above 1 disables semantic matches
+ANSWER_CACHE_PATH = os.environ.get("ANSWER_CACHE_PATH", "answer_cache.sqlite3")
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_SIMILARITY = float(os.environ.get("ANSWER_CACHE_SIMILARITY", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "10000"))
+
+# Agent execution limits: concurrent runs, waiting requests, and seconds per request including the wait
+AGENT_MAX_IN_FLIGHT = int(os.environ.get("AGENT_MAX_IN_FLIGHT", "4"))
+AGENT_MAX_QUEUE = int(os.environ.get("AGENT_MAX_QUEUE", "32"))
+AGENT_TIMEOUT = float(os.environ.get("AGENT_TIMEOUT", "60"))
+
+# Review search: hybrid (BM25 fused with FAISS by reciprocal rank), vector or lexical
+SEARCH_MODE = os.environ.get("SEARCH_MODE", "hybrid").lower()
+BM25_K1 = float(os.environ.get("BM25_K1", "1.2"))
+BM25_B = float(os.environ.get("BM25_B", "0.75"))
+HYBRID_RRF_K = int(os.environ.get("HYBRID_RRF_K", "60"))
+HYBRID_CANDIDATES = int(os.environ.get("HYBRID_CANDIDATES", "4"))  # candidates per result from each ranker
+
+# Seconds hybrid search waits for a query embedding before answering lexically (0 waits indefinitely)
+HYBRID_EMBED_TIMEOUT = float(os.environ.get("HYBRID_EMBED_TIMEOUT", "3"))
+
+# Share of a teacher's recommendation score given to query relevance; the rest goes to rating and themes
+TEACHER_RANK_RELEVANCE_WEIGHT = float(os.environ.get("TEACHER_RANK_RELEVANCE_WEIGHT", "0.7"))
+
+# Route structured questions straight to a tool; a threshold above 0 also routes by nearest example intent
+ROUTER_ENABLED = os.environ.get("ROUTER_ENABLED", "1") == "1"
+ROUTER_SEMANTIC_THRESHOLD = float(os.environ.get("ROUTER_SEMANTIC_THRESHOLD", "0"))
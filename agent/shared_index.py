@@ -0,0 +1,72 @@
+"""Builder election for API workers sharing one snapshot.
+
+With ``uvicorn --workers N`` every worker process imports the agent. In
+shared mode (``SHARED_INDEX=1``) only the worker holding an exclusive lock
+on ``<VECTOR_SNAPSHOT_DIR>/builder.lock`` embeds reviews, syncs with MongoDB
+and writes snapshots. Every other worker maps the current snapshot version
+read-only and swaps in each new version the builder publishes, so the index
+pages are held once in the page cache however many workers there are. The
+OS releases the lock when the builder exits, and the next worker to poll
+takes over.
+
+Readers cannot write to their index; the reindex jobs they queue (see
+``reindex_jobs``) are run by the builder.
+"""
+
+from pathlib import Path
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _try_lock(lock_file) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+class BuilderLock:
+    """Non-blocking exclusive lock electing the one index builder"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self) -> bool:
+        """Try to become the builder; True if this process holds the lock"""
+        if self._file is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.path, "a+")
+        if not _try_lock(lock_file):
+            lock_file.close()
+            return False
+        # Record the holder for operators; the lock itself is what counts
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._file = lock_file
+        return True
+
+    def holder(self):
+        """pid recorded by the current builder, or None"""
+        try:
+            return int(self.path.read_text().strip())
+        except (OSError, ValueError):
+            return None
+
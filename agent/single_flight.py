@@ -0,0 +1,52 @@
+"""Coalescing of identical in-flight requests.
+
+When several callers ask for the same key while a computation for it is
+still running, they all await that one computation instead of starting
+their own. The entry is dropped as soon as the computation finishes, so
+nothing is cached here: a result lives on only in whatever cache the
+computation fills, and an exception is raised to every waiter of that run
+and the next caller starts afresh.
+"""
+
+import asyncio
+
+
+class SingleFlight:
+    """Shares one running task per key between concurrent async callers"""
+
+    def __init__(self):
+        self._tasks = {}
+        self.calls = 0
+        self.executions = 0
+        self.errors = 0
+
+    async def do(self, key, func, *args):
+        """Await ``func(*args)``, or the run already in flight for ``key``"""
+        self.calls += 1
+        task = self._tasks.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(func(*args))
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        # A caller that goes away (e.g. a disconnected client) must not
+        # cancel the run the other waiters are sharing
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Retrieve the exception so it is not reported as unhandled when
+        # every waiter has already gone
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def stats(self):
+        """Coalescing counters for /stats"""
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.calls - self.executions,
+            "errors": self.errors,
+            "in_flight": len(self._tasks),
+        }
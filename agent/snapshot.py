@@ -0,0 +1,447 @@
+"""Versioned on-disk snapshots of the review vector store.
+
+Layout::
+
+    <VECTOR_SNAPSHOT_DIR>/
+        CURRENT            name of the live version, e.g. "v3"
+        v3/
+            index.faiss    FAISS index
+            added.faiss    with a delta sync overlay (``overlay`` in the
+            removed.npy    manifest), its added rows and removed row numbers;
+                           index.faiss then holds the overlay's base
+            index.pkl      columnar docstore, index_to_docstore_id, teacher
+                           index and BM25 index
+            columns.bin    their arrays pickled out of band, 64-byte aligned
+            sync.json      delta sync watermark and per-document hashes
+            manifest.json  format version, embedding model, index type, file sizes
+                           and checksums, and the (offset, length) of each array
+                           in columns.bin
+
+A version directory is never modified once ``CURRENT`` names it, so worker
+processes can map it read-only (``load_snapshot(read_only=True)``) and share
+one copy of the index pages through the page cache, the teacher and BM25
+indexes included, so readers build nothing. Loads check file sizes
+against the manifest; hashing every file is left to ``verify=True``, which
+the builder passes once per version.
+
+Run ``python snapshot.py build --input reviews.jsonl`` to build a snapshot
+offline from a ``mongoexport`` (JSONL) or ``mongodump`` (BSON) file.
+"""
+
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from bson import ObjectId, decode_file_iter, json_util
+from datetime import datetime, timezone
+from mmap import ACCESS_READ, mmap as memory_map
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+
+import faiss
+import numpy as np
+
+from ann_index import OverlayIndex, index_kind, make_writable
+from columnar_docstore import ColumnarDocstore
+from ingest import ingest_documents
+from lexical_index import BM25Index
+from reviews import document_hash, review_to_document
+from settings import (
+    BM25_B,
+    BM25_K1,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_MODEL,
+    INGEST_BATCH_SIZE,
+    INGEST_CONCURRENCY,
+    INGEST_MAX_RETRIES,
+    INGEST_RATE_LIMIT,
+    VECTOR_INDEX_TYPE,
+    VECTOR_SNAPSHOT_DIR,
+    VECTOR_SNAPSHOT_KEEP,
+    VECTOR_SNAPSHOT_MMAP,
+)
+from teacher_index import TeacherIndex
+
+# Bump whenever the snapshot layout or document schema changes
+SNAPSHOT_FORMAT_VERSION = 5
+
+# Format 1 pickled an InMemoryDocstore, which is converted on load; formats
+# 1 and 2 pickle the docstore arrays in band; formats before 4 have no
+# teacher or BM25 index, which the loader then rebuilds; formats before 5
+# have no overlay
+READABLE_FORMAT_VERSIONS = (1, 2, 3, 4, 5)
+
+INDEX_FILES = ("index.faiss", "index.pkl", "columns.bin", "sync.json")
+OVERLAY_FILES = ("added.faiss", "removed.npy")
+
+# Alignment of each array in columns.bin
+COLUMN_ALIGNMENT = 64
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is missing, corrupt or stale"""
+
+
+def _file_checksum(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _dump_sync_state(sync_state) -> dict:
+    last_id = sync_state.get("last_id")
+    last_synced_at = sync_state.get("last_synced_at")
+    last_delete_scan_at = sync_state.get("last_delete_scan_at")
+    return {
+        "last_id": str(last_id) if last_id is not None else None,
+        "last_synced_at": last_synced_at.isoformat() if last_synced_at else None,
+        "doc_hashes": sync_state.get("doc_hashes", {}),
+        "retry_ids": sync_state.get("retry_ids", []),
+        "deletes_resume_token": json_util.dumps(sync_state.get("deletes_resume_token")),
+        "last_delete_scan_at": last_delete_scan_at.isoformat() if last_delete_scan_at else None,
+    }
+
+
+def _load_sync_state(data) -> dict:
+    return {
+        "last_id": ObjectId(data["last_id"]) if data.get("last_id") else None,
+        "last_synced_at": (
+            datetime.fromisoformat(data["last_synced_at"])
+            if data.get("last_synced_at")
+            else None
+        ),
+        "doc_hashes": data.get("doc_hashes", {}),
+        "retry_ids": data.get("retry_ids", []),
+        "deletes_resume_token": json_util.loads(data.get("deletes_resume_token") or "null"),
+        "last_delete_scan_at": (
+            datetime.fromisoformat(data["last_delete_scan_at"])
+            if data.get("last_delete_scan_at")
+            else None
+        ),
+    }
+
+
+def _write_text_atomic(path: Path, text: str):
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(text)
+    os.replace(tmp_path, path)
+
+
+def current_version(snapshot_dir=VECTOR_SNAPSHOT_DIR):
+    """Return the name of the live snapshot version, or None"""
+    pointer = Path(snapshot_dir) / "CURRENT"
+    if not pointer.exists():
+        return None
+    return pointer.read_text().strip() or None
+
+
+def _next_version(root: Path) -> str:
+    numbers = [
+        int(child.name[1:])
+        for child in root.iterdir()
+        if child.is_dir() and child.name.startswith("v") and child.name[1:].isdigit()
+    ]
+    return f"v{max(numbers, default=0) + 1}"
+
+
+def _prune(root: Path, keep: int):
+    versions = sorted(
+        (
+            child
+            for child in root.iterdir()
+            if child.is_dir() and child.name.startswith("v") and child.name[1:].isdigit()
+        ),
+        key=lambda child: int(child.name[1:]),
+    )
+    for old in versions[:-keep] if keep > 0 else []:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def _write_store(vector_store, teachers, lexical, path: Path):
+    """Write the index, docstore and search indexes, returning the columns.bin layout"""
+    index = vector_store.index
+    if isinstance(index, OverlayIndex):
+        faiss.write_index(index.added, str(path / "added.faiss"))
+        np.save(path / "removed.npy", index.removed)
+        index = index.base
+    faiss.write_index(index, str(path / "index.faiss"))
+    buffers = []
+    with open(path / "index.pkl", "wb") as f:
+        pickle.dump(
+            (vector_store.docstore, vector_store.index_to_docstore_id, teachers, lexical),
+            f,
+            protocol=5,
+            buffer_callback=buffers.append,
+        )
+    layout = []
+    with open(path / "columns.bin", "wb") as f:
+        for buffer in buffers:
+            f.write(b"\0" * (-f.tell() % COLUMN_ALIGNMENT))
+            data = buffer.raw()
+            layout.append([f.tell(), data.nbytes])
+            f.write(data)
+    return layout
+
+
+def _read_store(path: Path, layout, read_only):
+    """Unpickle the docstore, id mapping and search indexes, mapping columns.bin when read-only"""
+    with open(path / "index.pkl", "rb") as f:
+        data = f.read()
+    if layout is None:
+        return pickle.loads(data)
+
+    columns_path = path / "columns.bin"
+    if read_only and columns_path.stat().st_size:
+        with open(columns_path, "rb") as f:
+            columns = memory_map(f.fileno(), 0, access=ACCESS_READ)
+    else:
+        columns = bytearray(columns_path.read_bytes())
+    view = memoryview(columns)
+    return pickle.loads(data, buffers=[view[offset : offset + size] for offset, size in layout])
+
+
+def save_snapshot(
+    vector_store,
+    sync_state,
+    snapshot_dir=VECTOR_SNAPSHOT_DIR,
+    embedding_model=EMBEDDING_MODEL,
+    teachers=None,
+    lexical=None,
+):
+    """Write the vector store as a new snapshot version and make it current"""
+    root = Path(snapshot_dir)
+    root.mkdir(parents=True, exist_ok=True)
+    version = _next_version(root)
+
+    # Write into a staging directory so readers never see a partial version
+    staging = root / f".{version}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir()
+    layout = _write_store(vector_store, teachers, lexical, staging)
+    (staging / "sync.json").write_text(json.dumps(_dump_sync_state(sync_state)))
+
+    overlay = isinstance(vector_store.index, OverlayIndex)
+    files = INDEX_FILES + (OVERLAY_FILES if overlay else ())
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "embedding_model": embedding_model,
+        "documents": len(vector_store.index_to_docstore_id),
+        "dimension": vector_store.index.d,
+        "index_type": index_kind(vector_store.index),
+        "overlay": overlay,
+        "sizes": {name: (staging / name).stat().st_size for name in files},
+        "checksums": {name: _file_checksum(staging / name) for name in files},
+        "buffers": layout,
+    }
+    (staging / "manifest.json").write_text(json.dumps(manifest, indent=2))
+
+    os.replace(staging, root / version)
+    _write_text_atomic(root / "CURRENT", version)
+    _prune(root, VECTOR_SNAPSHOT_KEEP)
+    print(f"✓ Saved vector store snapshot {version} ({manifest['documents']} documents)")
+    return manifest
+
+
+def load_snapshot(
+    embeddings,
+    snapshot_dir=VECTOR_SNAPSHOT_DIR,
+    embedding_model=EMBEDDING_MODEL,
+    mmap=VECTOR_SNAPSHOT_MMAP,
+    index_type=VECTOR_INDEX_TYPE,
+    read_only=False,
+    verify=False,
+):
+    """Load the current snapshot, returning (vector_store, sync_state, manifest, indexes)
+
+    ``read_only`` maps the index and docstore arrays in place, shared with
+    every other process mapping the same version. Nothing may be added to or
+    removed from such a store: FAISS aborts the process on a write to a
+    mapped index. Files are checked against the manifest sizes, and with
+    ``verify`` against its checksums too, which reads every byte. Raises
+    SnapshotError when there is no usable snapshot. ``indexes`` is the
+    (teachers, lexical) pair saved with the store; either is None when the
+    snapshot has none.
+    """
+    version = current_version(snapshot_dir)
+    if version is None:
+        raise SnapshotError("No snapshot found")
+
+    path = Path(snapshot_dir) / version
+    try:
+        manifest = json.loads((path / "manifest.json").read_text())
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"Unreadable manifest for {version}: {e}")
+
+    if manifest.get("format_version") not in READABLE_FORMAT_VERSIONS:
+        raise SnapshotError(
+            f"Snapshot {version} has format {manifest.get('format_version')}, "
+            f"expected {SNAPSHOT_FORMAT_VERSION}"
+        )
+    if manifest.get("embedding_model") != embedding_model:
+        raise SnapshotError(
+            f"Snapshot {version} was built with {manifest.get('embedding_model')}, "
+            f"current model is {embedding_model}"
+        )
+    # Snapshots from before configurable index types are all flat
+    if manifest.get("index_type", "flat") != index_type:
+        raise SnapshotError(
+            f"Snapshot {version} has a {manifest.get('index_type', 'flat')} index, "
+            f"VECTOR_INDEX_TYPE is {index_type}"
+        )
+    # Snapshots from before recorded sizes only have checksums
+    for name in manifest.get("checksums", {}):
+        size = manifest.get("sizes", {}).get(name)
+        if not (path / name).exists() or size not in (None, (path / name).stat().st_size):
+            raise SnapshotError(f"Missing or truncated file {version}/{name}")
+    if verify:
+        for name, checksum in manifest.get("checksums", {}).items():
+            if _file_checksum(path / name) != checksum:
+                raise SnapshotError(f"Checksum mismatch for {version}/{name}")
+
+    # Without verify a damaged file is only noticed when it fails to parse
+    try:
+        if read_only:
+            index = faiss.read_index(str(path / "index.faiss"), faiss.IO_FLAG_MMAP_IFC)
+        else:
+            flags = faiss.IO_FLAG_MMAP if mmap else 0
+            index = faiss.read_index(str(path / "index.faiss"), flags)
+        if manifest.get("overlay"):
+            # The overlay's own rows are few and read into memory; its base is
+            # never written to, so it can stay mapped
+            index = OverlayIndex(
+                index,
+                faiss.read_index(str(path / "added.faiss")),
+                np.load(path / "removed.npy"),
+            )
+        elif not read_only:
+            index = make_writable(index)
+        docstore, index_to_docstore_id, *indexes = _read_store(
+            path, manifest.get("buffers"), read_only
+        )
+        sync_state = _load_sync_state(json.loads((path / "sync.json").read_text()))
+    except (RuntimeError, ValueError, KeyError, pickle.UnpicklingError) as e:
+        raise SnapshotError(f"Unreadable snapshot {version}: {e}")
+    if isinstance(docstore, InMemoryDocstore):
+        docstore = ColumnarDocstore.from_docstore(docstore)
+    vector_store = FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+    mode = "read-only shared" if read_only else f"mmap={mmap}"
+    print(f"✓ Loaded vector store snapshot {version} ({manifest['documents']} documents, {mode})")
+    return vector_store, sync_state, manifest, tuple(indexes) or (None, None)
+
+
+def read_export(path, fmt=None):
+    """Yield reviews from a mongoexport JSONL file or a mongodump BSON file"""
+    fmt = fmt or ("bson" if str(path).endswith(".bson") else "jsonl")
+    if fmt == "bson":
+        with open(path, "rb") as f:
+            yield from decode_file_iter(f)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json_util.loads(line)
+
+
+def build_from_export(path, embeddings, fmt=None, exported_at=None):
+    """Build a vector store, sync state, teacher index and BM25 index from a Mongo export"""
+    doc_hashes = {}
+    newest = {"id": None}
+    teachers = TeacherIndex()
+    lexical = BM25Index(BM25_K1, BM25_B)
+
+    def on_indexed(batch, vectors):
+        teachers.add(batch, vectors)
+        lexical.add(batch)
+        for doc in batch:
+            doc_hashes[doc.id] = document_hash(doc)
+            if ObjectId.is_valid(doc.id):
+                review_id = ObjectId(doc.id)
+                if newest["id"] is None or review_id > newest["id"]:
+                    newest["id"] = review_id
+
+    print(f"Embedding reviews from {path}...")
+    documents = (review_to_document(review) for review in read_export(path, fmt))
+    vector_store, report = ingest_documents(
+        documents,
+        embeddings,
+        batch_size=INGEST_BATCH_SIZE,
+        concurrency=INGEST_CONCURRENCY,
+        rate_limit=INGEST_RATE_LIMIT,
+        max_retries=INGEST_MAX_RETRIES,
+        on_indexed=on_indexed,
+    )
+    if vector_store is None:
+        raise SnapshotError(f"No reviews could be embedded from {path}")
+
+    sync_state = {
+        "last_id": newest["id"],
+        # Reviews modified after the export are picked up by the first delta sync
+        "last_synced_at": exported_at,
+        "doc_hashes": doc_hashes,
+        "retry_ids": report["failed_ids"],
+    }
+    return vector_store, sync_state, teachers, lexical
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage vector store snapshots")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    build = subcommands.add_parser("build", help="Build a snapshot from a Mongo export")
+    build.add_argument("--input", required=True, help="mongoexport JSONL or mongodump BSON file")
+    build.add_argument("--format", choices=["jsonl", "bson"], help="Input format (default: by extension)")
+    build.add_argument("--out", default=VECTOR_SNAPSHOT_DIR, help="Snapshot directory")
+    build.add_argument(
+        "--exported-at",
+        help="ISO timestamp of the export (default: input file modification time)",
+    )
+
+    subcommands.add_parser("info", help="Show the current snapshot manifest").add_argument(
+        "--dir", default=VECTOR_SNAPSHOT_DIR, help="Snapshot directory"
+    )
+
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        version = current_version(args.dir)
+        if version is None:
+            print("No snapshot found")
+            return 1
+        print((Path(args.dir) / version / "manifest.json").read_text())
+        return 0
+
+    from langchain_google_genai.embeddings import GoogleGenerativeAIEmbeddings
+    from embedding_cache import CachedEmbeddings
+
+    if args.exported_at:
+        exported_at = datetime.fromisoformat(args.exported_at)
+    else:
+        exported_at = datetime.fromtimestamp(os.path.getmtime(args.input), timezone.utc)
+
+    # Shares the live API's cache, so rebuilding from an export re-embeds only new texts
+    embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL)
+    if EMBEDDING_CACHE_PATH:
+        embeddings = CachedEmbeddings(
+            embeddings,
+            model=EMBEDDING_MODEL,
+            path=EMBEDDING_CACHE_PATH,
+            max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+        )
+    vector_store, sync_state, teachers, lexical = build_from_export(
+        args.input, embeddings, args.format, exported_at
+    )
+    save_snapshot(vector_store, sync_state, args.out, teachers=teachers, lexical=lexical)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,283 @@
+"""One aggregated embedding per teacher for catalog-wide recommendations.
+
+Each teacher's vector is the rating-weighted centroid of their review
+embeddings, so highly rated reviews pull it further. The index keeps running
+sums (weighted vector sum, weights, ratings, theme counts) that are updated
+with +1/-1 as reviews are ingested, replaced or removed, the same way
+``TeacherStatsDelta`` maintains the Mongo stats. Ranking scores every
+teacher in one matrix-vector product instead of grouping the few reviews
+nearest to the query.
+
+The sums and the centroid matrix pickle out of band, so a snapshot can hand
+them to reader workers as read-only memory maps (see ``snapshot``).
+"""
+
+import threading
+
+import numpy as np
+
+from ann_index import reconstruct_rows
+from settings import TEACHER_RANK_RELEVANCE_WEIGHT
+from themes import LEXICON, review_themes
+
+# Weight of a review without a numeric rating, as if rated 3/5
+_UNRATED_WEIGHT = 0.6
+
+
+def _weight(rating) -> float:
+    if isinstance(rating, (int, float)) and rating > 0:
+        return rating / 5.0
+    return _UNRATED_WEIGHT
+
+
+def cosine_relevance(queries, vectors):
+    """Cosine similarity of each query to each vector, mapped to [0, 1]"""
+    def unit(matrix):
+        matrix = np.asarray(matrix, dtype=np.float32).reshape(len(matrix), -1)
+        return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    return (unit(queries) @ unit(vectors).T + 1.0) / 2.0
+
+
+def rating_quality(average_ratings, positive, negative, review_counts):
+    """Average rating nudged by net theme mentions per review, scaled to [0, 1]"""
+    net_rate = (np.asarray(positive) - np.asarray(negative)) / np.asarray(review_counts)
+    return np.clip((np.asarray(average_ratings) + net_rate * 0.1) / 5.0, 0.0, 1.0)
+
+
+def blend_scores(relevance, quality, relevance_weight=TEACHER_RANK_RELEVANCE_WEIGHT):
+    """Recommendation scores in [0, 1] from relevance and quality
+
+    Similarities fall in a narrow band, so each query's relevance is first
+    rescaled to [0, 1] across its candidate teachers (the last axis).
+    """
+    low = relevance.min(axis=-1, keepdims=True)
+    span = relevance.max(axis=-1, keepdims=True) - low
+    scaled = np.divide(relevance - low, span, out=np.ones_like(relevance), where=span > 0)
+    return relevance_weight * scaled + (1.0 - relevance_weight) * quality
+
+
+class TeacherIndex:
+    """Per-teacher running sums and the centroid matrix derived from them"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.slots = {}
+        self.teacher_ids = []
+        self.names = []
+        self.dimension = None
+        self.vector_sums = np.zeros((0, 0))
+        self.weights = np.zeros(0)
+        self.review_counts = np.zeros(0, dtype=np.int64)
+        self.rating_sums = np.zeros(0)
+        self.rating_counts = np.zeros(0, dtype=np.int64)
+        self.positive = np.zeros(0, dtype=np.int64)
+        self.negative = np.zeros(0, dtype=np.int64)
+        self._matrix = None
+
+    @classmethod
+    def from_vector_store(cls, vector_store, chunk_size=65536):
+        """Rebuild the sums from every review in a vector store"""
+        teachers = cls()
+        items = list(vector_store.index_to_docstore_id.items())
+        for start in range(0, len(items), chunk_size):
+            rows, ids = zip(*items[start:start + chunk_size])
+            docs = [vector_store.docstore.search(doc_id) for doc_id in ids]
+            teachers.add(docs, reconstruct_rows(vector_store.index, list(rows)))
+        return teachers
+
+    def __len__(self):
+        return int((self.review_counts > 0).sum())
+
+    def fork(self):
+        """Copy to change while this index keeps serving rankings"""
+        with self._lock:
+            forked = TeacherIndex.__new__(TeacherIndex)
+            forked.__dict__.update(self.__dict__)
+            forked._lock = threading.Lock()
+            forked.slots = dict(self.slots)
+            forked.teacher_ids = list(self.teacher_ids)
+            forked.names = list(self.names)
+            for name in (
+                "vector_sums", "weights", "review_counts", "rating_sums",
+                "rating_counts", "positive", "negative",
+            ):
+                setattr(forked, name, getattr(self, name).copy())
+        return forked
+
+    def __getstate__(self):
+        # Copies and pickles leave the lock behind, trim spare capacity and
+        # carry the centroid matrix, so a loaded index needs no rebuild
+        matrix = self._centroids()
+        with self._lock:
+            state = dict(self.__dict__)
+        del state["_lock"]
+        count = len(self.teacher_ids)
+        for name in (
+            "vector_sums", "weights", "review_counts", "rating_sums",
+            "rating_counts", "positive", "negative",
+        ):
+            state[name] = state[name][:count].copy()
+        state["_matrix"] = matrix
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _slot(self, teacher_id, name):
+        slot = self.slots.get(teacher_id)
+        if slot is None:
+            slot = len(self.teacher_ids)
+            self.slots[teacher_id] = slot
+            self.teacher_ids.append(teacher_id)
+            self.names.append(name)
+            if slot >= len(self.weights):
+                self._grow(max(16, 2 * len(self.weights)))
+        elif name:
+            self.names[slot] = name
+        return slot
+
+    def _grow(self, capacity):
+        def grown(array):
+            extra = capacity - array.shape[0]
+            return np.concatenate([array, np.zeros((extra,) + array.shape[1:], array.dtype)])
+
+        self.vector_sums = grown(self.vector_sums)
+        self.weights = grown(self.weights)
+        self.review_counts = grown(self.review_counts)
+        self.rating_sums = grown(self.rating_sums)
+        self.rating_counts = grown(self.rating_counts)
+        self.positive = grown(self.positive)
+        self.negative = grown(self.negative)
+
+    def add(self, documents, vectors, sign=1):
+        """Count reviews and their embeddings in (sign=1) or out (sign=-1)"""
+        vectors = np.asarray(vectors, dtype=np.float64)
+        with self._lock:
+            if self.dimension is None and len(vectors):
+                self.dimension = vectors.shape[1]
+                self.vector_sums = np.zeros((len(self.weights), self.dimension))
+            for doc, vector in zip(documents, vectors):
+                metadata = doc.metadata
+                teacher_id = metadata.get("teacherId")
+                if teacher_id is None:
+                    continue
+                slot = self._slot(teacher_id, metadata.get("teacherName") if sign > 0 else None)
+                rating = metadata.get("rating")
+                weight = _weight(rating)
+                self.vector_sums[slot] += sign * weight * vector
+                self.weights[slot] += sign * weight
+                self.review_counts[slot] += sign
+                if isinstance(rating, (int, float)):
+                    self.rating_sums[slot] += sign * rating
+                    self.rating_counts[slot] += sign
+                positive, negative = LEXICON.polarity(review_themes(metadata))
+                self.positive[slot] += sign * positive
+                self.negative[slot] += sign * negative
+            self._matrix = None
+
+    def _centroids(self):
+        # Unit-length centroids of teachers with reviews, rebuilt after each change
+        with self._lock:
+            if self._matrix is None:
+                count = len(self.teacher_ids)
+                active = np.flatnonzero(self.review_counts[:count] > 0)
+                centroids = self.vector_sums[active] / self.weights[active, None]
+                norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+                centroids = (centroids / np.maximum(norms, 1e-12)).astype(np.float32)
+                review_counts = self.review_counts[active]
+                rating_counts = self.rating_counts[active]
+                self._matrix = {
+                    "slots": active,
+                    "centroids": centroids,
+                    "review_counts": review_counts,
+                    "average_ratings": np.divide(
+                        self.rating_sums[active],
+                        rating_counts,
+                        out=np.zeros(len(active)),
+                        where=rating_counts > 0,
+                    ),
+                    "positive": self.positive[active],
+                    "negative": self.negative[active],
+                    "teacher_ids": [self.teacher_ids[slot] for slot in active],
+                    "names": [self.names[slot] for slot in active],
+                }
+            return self._matrix
+
+    def rank(
+        self,
+        query_vector,
+        limit,
+        teacher_id=None,
+        min_rating=None,
+        max_rating=None,
+        relevance_weight=TEACHER_RANK_RELEVANCE_WEIGHT,
+    ):
+        """Score every teacher against a query and return the top ``limit``
+
+        relevance is the cosine similarity of the query and the teacher's
+        centroid mapped to [0, 1], and the score blends it with the rating
+        and themes quality (see ``blend_scores``), ``relevance_weight`` going
+        to relevance. Rating bounds apply to the average rating.
+        """
+        return self.rank_many(
+            [query_vector], limit, teacher_id, min_rating, max_rating, relevance_weight
+        )[0]
+
+    def rank_many(
+        self,
+        query_vectors,
+        limit,
+        teacher_id=None,
+        min_rating=None,
+        max_rating=None,
+        relevance_weight=TEACHER_RANK_RELEVANCE_WEIGHT,
+    ):
+        """``rank`` for several queries with one matrix product"""
+        matrix = self._centroids()
+        if not len(matrix["slots"]):
+            return [[] for _ in query_vectors]
+
+        relevance = cosine_relevance(query_vectors, matrix["centroids"])
+        review_counts = matrix["review_counts"]
+        average_ratings = matrix["average_ratings"]
+        quality = rating_quality(
+            average_ratings, matrix["positive"], matrix["negative"], review_counts
+        )
+
+        candidates = np.ones(len(review_counts), dtype=bool)
+        if teacher_id is not None:
+            candidates &= matrix["slots"] == self.slots.get(teacher_id, -1)
+        if min_rating is not None:
+            candidates &= average_ratings >= min_rating
+        if max_rating is not None:
+            candidates &= average_ratings <= max_rating
+        candidates = np.flatnonzero(candidates)
+        if not len(candidates):
+            return [[] for _ in query_vectors]
+
+        relevance = relevance[:, candidates]
+        scores = blend_scores(relevance, quality[candidates], relevance_weight)
+
+        limit = min(limit, len(candidates))
+        results = []
+        for query_relevance, query_scores in zip(relevance, scores):
+            top = np.argpartition(-query_scores, limit - 1)[:limit]
+            top = top[np.argsort(-query_scores[top], kind="stable")]
+            results.append(
+                [
+                    {
+                        "teacher_name": matrix["names"][i] or "Unknown",
+                        "teacher_id": matrix["teacher_ids"][i],
+                        "average_rating": round(float(average_ratings[i]), 2),
+                        "review_count": int(review_counts[i]),
+                        "positive_themes": int(matrix["positive"][i]),
+                        "negative_themes": int(matrix["negative"][i]),
+                        "relevance": round(float(query_relevance[j]), 4),
+                        "recommendation_score": round(float(query_scores[j]), 4),
+                    }
+                    for j, i in zip(top, candidates[top])
+                ]
+            )
+        return results
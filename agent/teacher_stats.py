@@ -0,0 +1,209 @@
+"""Materialized per-teacher review statistics.
+
+One document per teacher in the ``teacher_stats`` collection, kept up to
+date incrementally as reviews are ingested, replaced or removed:
+
+    {
+        "teacherId": 1,
+        "teacherName": "Dr. Smith",
+        "reviewCount": 2,
+        "ratingCount": 2,
+        "ratingSum": 9,
+        "averageRating": 4.5,
+        "ratingHistogram": {"4": 1, "5": 1},
+        "lastReviewAt": datetime,
+        "themes": {"clear": 1, "helpful": 1},
+    }
+
+``lastReviewAt`` only moves forward; removing a teacher's newest review does
+not roll it back.
+"""
+
+from bson import ObjectId
+from datetime import datetime, timezone
+from pymongo import ASCENDING, DESCENDING, ReplaceOne, UpdateMany, UpdateOne
+
+from themes import review_themes
+
+STATS_COLLECTION = "teacher_stats"
+
+_AVERAGE_PIPELINE = [
+    {
+        "$set": {
+            "averageRating": {
+                "$cond": [
+                    {"$gt": ["$ratingCount", 0]},
+                    {"$round": [{"$divide": ["$ratingSum", "$ratingCount"]}, 2]},
+                    0,
+                ]
+            }
+        }
+    }
+]
+
+
+def ensure_indexes(raw_db):
+    """Create the indexes used for lookups and the leaderboard"""
+    stats = raw_db[STATS_COLLECTION]
+    stats.create_index([("teacherId", ASCENDING)], unique=True)
+    stats.create_index([("averageRating", DESCENDING), ("reviewCount", DESCENDING)])
+
+
+class TeacherStatsDelta:
+    """Accumulates per-teacher increments for a batch of review documents"""
+
+    def __init__(self):
+        self.teachers = {}
+
+    def add(self, documents, sign=1):
+        """Count documents in (sign=1) or out (sign=-1) of the stats"""
+        for doc in documents:
+            metadata = doc.metadata
+            teacher_id = metadata.get("teacherId")
+            if teacher_id is None:
+                continue
+
+            entry = self.teachers.setdefault(
+                teacher_id, {"name": None, "inc": {}, "last_review_at": None}
+            )
+            inc = entry["inc"]
+            inc["reviewCount"] = inc.get("reviewCount", 0) + sign
+
+            rating = metadata.get("rating")
+            if isinstance(rating, (int, float)):
+                bucket = f"ratingHistogram.{int(round(rating))}"
+                inc["ratingCount"] = inc.get("ratingCount", 0) + sign
+                inc["ratingSum"] = inc.get("ratingSum", 0) + sign * rating
+                inc[bucket] = inc.get(bucket, 0) + sign
+
+            for theme, count in review_themes(metadata).items():
+                key = f"themes.{theme}"
+                inc[key] = inc.get(key, 0) + sign * count
+
+            if sign > 0:
+                entry["name"] = metadata.get("teacherName") or entry["name"]
+                if doc.id and ObjectId.is_valid(doc.id):
+                    created = ObjectId(doc.id).generation_time
+                    if entry["last_review_at"] is None or created > entry["last_review_at"]:
+                        entry["last_review_at"] = created
+        return self
+
+    def _operations(self):
+        operations = []
+        now = datetime.now(timezone.utc)
+        for teacher_id, entry in self.teachers.items():
+            update = {"$inc": entry["inc"], "$set": {"updatedAt": now}}
+            if entry["name"]:
+                update["$set"]["teacherName"] = entry["name"]
+            if entry["last_review_at"] is not None:
+                update["$max"] = {"lastReviewAt": entry["last_review_at"]}
+            operations.append(UpdateOne({"teacherId": teacher_id}, update, upsert=True))
+        return operations
+
+    def apply(self, raw_db):
+        """Apply the accumulated increments to the stats collection"""
+        if not self.teachers:
+            return
+        stats = raw_db[STATS_COLLECTION]
+        teacher_ids = list(self.teachers)
+        stats.bulk_write(
+            self._operations()
+            + [UpdateMany({"teacherId": {"$in": teacher_ids}}, _AVERAGE_PIPELINE)],
+            ordered=True,
+        )
+        stats.delete_many({"teacherId": {"$in": teacher_ids}, "reviewCount": {"$lte": 0}})
+
+    def replace_all(self, raw_db):
+        """Replace the whole collection with these totals (after a full rebuild)"""
+        stats = raw_db[STATS_COLLECTION]
+        now = datetime.now(timezone.utc)
+        operations = []
+        for teacher_id, entry in self.teachers.items():
+            document = {
+                "teacherId": teacher_id,
+                "teacherName": entry["name"],
+                "reviewCount": 0,
+                "ratingCount": 0,
+                "ratingSum": 0,
+                "ratingHistogram": {},
+                "themes": {},
+                "lastReviewAt": entry["last_review_at"],
+                "updatedAt": now,
+            }
+            for key, value in entry["inc"].items():
+                if "." in key:
+                    group, name = key.split(".", 1)
+                    document[group][name] = value
+                else:
+                    document[key] = value
+            document["averageRating"] = (
+                round(document["ratingSum"] / document["ratingCount"], 2)
+                if document["ratingCount"]
+                else 0
+            )
+            operations.append(ReplaceOne({"teacherId": teacher_id}, document, upsert=True))
+
+        if operations:
+            stats.bulk_write(operations, ordered=False)
+        stats.delete_many({"teacherId": {"$nin": list(self.teachers)}})
+
+
+def _format(stats) -> dict:
+    return {
+        "teacher_id": stats["teacherId"],
+        "teacher_name": stats.get("teacherName", "Unknown"),
+        "total_reviews": stats.get("reviewCount", 0),
+        "average_rating": stats.get("averageRating", 0),
+        "rating_histogram": stats.get("ratingHistogram", {}),
+        "last_review_at": (
+            stats["lastReviewAt"].isoformat() if stats.get("lastReviewAt") else None
+        ),
+        # Terms dropped from the lexicon linger with a zero count
+        "themes": {term: count for term, count in stats.get("themes", {}).items() if count},
+    }
+
+
+def _aggregate_pipeline(teacher_id):
+    # Fallback for teachers whose stats have not been materialized yet
+    return [
+        {"$match": {"teacherId": teacher_id}},
+        {
+            "$group": {
+                "_id": None,
+                "teacherId": {"$first": "$teacherId"},
+                "teacherName": {"$first": "$teacherName"},
+                "reviewCount": {"$sum": 1},
+                "averageRating": {"$avg": "$rating"},
+            }
+        },
+        {"$set": {"averageRating": {"$round": [{"$ifNull": ["$averageRating", 0]}, 2]}}},
+    ]
+
+
+def get_teacher_stats(raw_db, teacher_id):
+    """Stats for one teacher, or None if they have no reviews"""
+    stats = raw_db[STATS_COLLECTION].find_one({"teacherId": teacher_id}, {"_id": 0})
+    if stats is None:
+        stats = next(raw_db.reviews.aggregate(_aggregate_pipeline(teacher_id)), None)
+    return _format(stats) if stats else None
+
+
+async def aget_teacher_stats(async_db, teacher_id):
+    """Stats for one teacher from the async client, or None if they have no reviews"""
+    stats = await async_db[STATS_COLLECTION].find_one({"teacherId": teacher_id}, {"_id": 0})
+    if stats is None:
+        cursor = await async_db.reviews.aggregate(_aggregate_pipeline(teacher_id))
+        results = await cursor.to_list()
+        stats = results[0] if results else None
+    return _format(stats) if stats else None
+
+
+async def aget_leaderboard(async_db, limit=10, min_reviews=1):
+    """Top teachers by average rating, then by number of reviews"""
+    cursor = (
+        async_db[STATS_COLLECTION]
+        .find({"reviewCount": {"$gte": min_reviews}}, {"_id": 0})
+        .sort([("averageRating", DESCENDING), ("reviewCount", DESCENDING)])
+        .limit(limit)
+    )
+    return [_format(stats) for stats in await cursor.to_list()]
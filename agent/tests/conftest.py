@@ -0,0 +1,83 @@
+"""Shared fixtures: the agent modules on sys.path and deterministic embeddings
+
+Run from ``agent/`` with ``python -m pytest -q``.
+"""
+
+from pathlib import Path
+import hashlib
+import sys
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ann_index import compact_overlay, remove_documents  # noqa: E402
+from ingest import empty_vector_store, fork_vector_store, ingest_documents  # noqa: E402
+from reviews import review_to_document  # noqa: E402
+
+DIMENSION = 16
+
+WORDS = ("homework", "exams", "patient", "strict", "funny", "boring", "clear", "late")
+
+
+class FakeEmbeddings(Embeddings):
+    """Embeddings seeded by a hash of the text, so equal texts get equal vectors"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def _vector(self, text):
+        seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(DIMENSION).astype("float32").tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def make_review(i, text=None, rating=None):
+    return {
+        "_id": f"r{i:05d}",
+        "studentId": f"s{i % 7}",
+        "studentName": f"Student {i % 7}",
+        "teacherId": f"t{i % 5}",
+        "teacherName": f"Teacher {i % 5}",
+        "rating": rating if rating is not None else i % 5 + 1,
+        "review": text or f"{WORDS[i % len(WORDS)]} and {WORDS[(i * 3) % len(WORDS)]} {i}",
+    }
+
+
+def make_documents(ids, **fields):
+    return [review_to_document(make_review(i, **fields)) for i in ids]
+
+
+def build(embeddings, ids, index_type="flat", **kwargs):
+    store = empty_vector_store(embeddings, DIMENSION, index_type)
+    store, report = ingest_documents(
+        make_documents(ids), embeddings, store, batch_size=32, backoff=0, progress=None, **kwargs
+    )
+    return store, report
+
+
+def delta_sync(store, lexical, stale_ids, new_docs, max_fraction=0.1):
+    """The steps of agent.sync_reviews_to_vector_store on a fork of ``store``"""
+    store, lexical = fork_vector_store(store), lexical.fork()
+    if stale_ids:
+        remove_documents(store, stale_ids)
+        lexical.remove(stale_ids)
+    if new_docs:
+        store, report = ingest_documents(new_docs, store.embedding_function, store, progress=None)
+        assert report["failed"] == 0
+        lexical.add(new_docs)
+    compact_overlay(store, max_fraction)
+    return store, lexical
+
+
+@pytest.fixture
+def embeddings():
+    return FakeEmbeddings()
@@ -0,0 +1,67 @@
+import asyncio
+
+import numpy as np
+
+from answer_cache import AnswerCache, index_fingerprint
+
+
+def _cache(tmp_path, threshold=0.95, max_entries=100, ttl=3600):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite3"), ttl, threshold, max_entries)
+    cache.set_index("v1")
+    return cache
+
+
+def test_fingerprint_depends_on_content_and_parts():
+    hashes = {"a": "1", "b": "2"}
+    assert index_fingerprint(hashes, "flat") == index_fingerprint(dict(reversed(hashes.items())), "flat")
+    assert index_fingerprint(hashes, "flat") != index_fingerprint({**hashes, "b": "3"}, "flat")
+    assert index_fingerprint(hashes, "flat") != index_fingerprint(hashes, "hnsw")
+
+
+def test_exact_and_semantic_hits(tmp_path):
+    cache = _cache(tmp_path)
+    vector = np.array([1.0, 0.0, 0.0])
+    cache.put("Who grades fairly?", vector, "Teacher 1", "v1")
+
+    assert cache.get_exact("  who GRADES fairly? ") == "Teacher 1"
+    assert cache.get_similar([0.99, 0.05, 0.0]) == "Teacher 1"
+    assert cache.get_similar([0.0, 1.0, 0.0]) is None
+    stats = cache.stats()
+    assert (stats["exact_hits"], stats["semantic_hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_answers_of_another_index_are_dropped_and_survive_a_restart(tmp_path):
+    cache = _cache(tmp_path)
+    cache.put("question", [1.0, 0.0], "answer", "v1")
+    cache.put("stale", [0.0, 1.0], "old answer", "v0")
+    assert cache.get_exact("stale") is None
+
+    reopened = _cache(tmp_path)
+    assert reopened.get_exact("question") == "answer"
+    assert reopened.get_similar([1.0, 0.0]) == "answer"
+
+    reopened.set_index("v2")
+    assert reopened.get_exact("question") is None
+    assert reopened.stats()["invalidated"] == 1
+
+
+def test_eviction_keeps_recently_used_answers(tmp_path):
+    cache = _cache(tmp_path, max_entries=10)
+    for i in range(10):
+        cache.put(f"q{i}", [1.0, float(i)], f"a{i}", "v1")
+    assert cache.get_exact("q0") == "a0"
+    cache.put("q10", [1.0, 10.0], "a10", "v1")
+
+    assert cache.stats()["entries"] == 9
+    assert cache.get_exact("q0") == "a0"
+    assert cache.get_exact("q1") is None
+
+
+def test_async_methods_use_the_same_store(tmp_path):
+    cache = _cache(tmp_path)
+
+    async def main():
+        await cache.aput("question", [1.0, 0.0], "answer", "v1")
+        return await cache.aget_exact("question"), await cache.aget_similar([1.0, 0.0])
+
+    assert asyncio.run(main()) == ("answer", "answer")
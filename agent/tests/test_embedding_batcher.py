@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from embedding_batcher import EmbeddingBatcher
+
+
+def _batcher(window=0.01, max_batch=8, fail=()):
+    calls = []
+
+    async def embed_batch(texts):
+        calls.append(list(texts))
+        if any(text in fail for text in texts):
+            raise RuntimeError(f"cannot embed {texts}")
+        return [[float(len(text))] for text in texts]
+
+    return EmbeddingBatcher(embed_batch, window, max_batch), calls
+
+
+def test_concurrent_texts_share_one_batch_and_duplicates_are_embedded_once():
+    batcher, calls = _batcher()
+
+    async def main():
+        return await asyncio.gather(*(batcher.embed(text) for text in ["a", "bb", "a", "ccc"]))
+
+    assert asyncio.run(main()) == [[1.0], [2.0], [1.0], [3.0]]
+    assert calls == [["a", "bb", "ccc"]]
+    assert batcher.stats()["flushes"] == {"window": 1, "full": 0}
+
+
+def test_full_batch_flushes_before_the_window():
+    batcher, calls = _batcher(window=10, max_batch=2)
+
+    async def main():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.embed(text) for text in ["a", "b", "c", "d"])), 1
+        )
+
+    assert len(asyncio.run(main())) == 4
+    assert calls == [["a", "b"], ["c", "d"]]
+    assert batcher.stats()["flushes"]["full"] == 2
+
+
+def test_failed_batch_falls_back_to_single_texts():
+    batcher, calls = _batcher(fail={"bad"})
+
+    async def main():
+        return await asyncio.gather(
+            *(batcher.embed(text) for text in ["good", "bad"]), return_exceptions=True
+        )
+
+    good, bad = asyncio.run(main())
+    assert good == [4.0]
+    assert isinstance(bad, RuntimeError)
+    assert calls == [["good", "bad"], ["good"], ["bad"]]
+
+
+def test_disabled_batcher_embeds_each_call():
+    batcher, calls = _batcher(window=0)
+
+    async def main():
+        return await asyncio.gather(batcher.embed("a"), batcher.embed("b"))
+
+    assert asyncio.run(main()) == [[1.0], [1.0]]
+    assert calls == [["a"], ["b"]]
+    assert not batcher.stats()["enabled"]
+
+
+def test_single_text_failure_is_raised():
+    batcher, _ = _batcher(fail={"bad"})
+    with pytest.raises(RuntimeError):
+        asyncio.run(batcher.embed("bad"))
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from ann_index import OverlayIndex, index_kind, search_index
+from conftest import build, delta_sync, make_documents
+from ingest import ingest_documents
+from lexical_index import BM25Index
+
+INDEX_TYPES = ("flat", "ivf", "hnsw")
+
+
+def nearest_ids(store, texts, k=1):
+    queries = np.array(store.embedding_function.embed_documents(texts), dtype=np.float32)
+    _, rows = search_index(store.index, queries, k)
+    return [[store.index_to_docstore_id[int(row)] for row in hits if row >= 0] for hits in rows]
+
+
+def assert_consistent(store):
+    """Every mapped row holds its document's vector and every document is mapped"""
+    mapping = store.index_to_docstore_id
+    assert len(mapping) == len(store.docstore)
+    texts = [store.docstore.search(doc_id).page_content for doc_id in mapping.values()]
+    found = nearest_ids(store, texts, k=3)
+    hits = sum(doc_id in ids for doc_id, ids in zip(mapping.values(), found))
+    # HNSW search is approximate
+    assert hits >= 0.95 * len(mapping)
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_ingest_indexes_every_document(embeddings, index_type):
+    store, report = build(embeddings, range(300), index_type)
+    assert (report["indexed"], report["failed"]) == (300, 0)
+    assert index_kind(store.index) == index_type
+    assert store.index.ntotal == 300
+    assert_consistent(store)
+
+
+def test_failed_batches_are_reported_and_the_rest_indexed(embeddings):
+    fail = make_documents([7])[0].page_content
+    real = embeddings.embed_documents
+
+    def embed_documents(texts):
+        if fail in texts:
+            raise RuntimeError("quota exceeded")
+        return real(texts)
+
+    embeddings.embed_documents = embed_documents
+    store, report = build(embeddings, range(100), max_retries=1)
+    assert report["failed"] == 32
+    assert make_documents([7])[0].id in report["failed_ids"]
+    assert report["indexed"] == 68 == len(store.index_to_docstore_id)
+
+
+def test_already_indexed_ids_are_rejected(embeddings):
+    store, _ = build(embeddings, range(10))
+    store, report = ingest_documents(make_documents([3]), embeddings, store, progress=None)
+    assert report["failed"] == 1
+    assert store.index.ntotal == 10
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_delta_sync_forks_leave_the_published_store_unchanged(embeddings, index_type):
+    store, _ = build(embeddings, range(300), index_type)
+    lexical = BM25Index.from_documents(store.docstore.documents())
+    before = dict(store.index_to_docstore_id)
+
+    updated = make_documents([5], text="brand new words about zebras")
+    removed = [doc.id for doc in make_documents([1, 2])]
+    synced, synced_lexical = delta_sync(
+        store, lexical, removed + [updated[0].id], make_documents([300, 301]) + updated
+    )
+
+    assert isinstance(synced.index, OverlayIndex)
+    assert store.index_to_docstore_id == before and store.index.ntotal == 300
+    assert store.docstore.search(updated[0].id).page_content != updated[0].page_content
+    assert len(lexical) == 300
+
+    ids = set(synced.index_to_docstore_id.values())
+    assert len(ids) == 300 and not ids & set(removed)
+    assert synced.docstore.search(updated[0].id).page_content == updated[0].page_content
+    assert nearest_ids(synced, [updated[0].page_content])[0] == [updated[0].id]
+    assert [doc_id for doc_id, _ in synced_lexical.search("zebras", 5)] == [updated[0].id]
+    assert lexical.search("zebras", 5) == []
+    assert_consistent(synced)
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_overlay_is_compacted_once_it_grows(embeddings, index_type):
+    store, _ = build(embeddings, range(200), index_type)
+    lexical = BM25Index.from_documents(store.docstore.documents())
+
+    # 10 changes a round pass 12% of 200 documents on the third, which folds the overlay
+    overlays = []
+    for start in range(200, 220, 5):
+        stale = [doc.id for doc in make_documents(range(start - 200, start - 195))]
+        store, lexical = delta_sync(
+            store, lexical, stale, make_documents(range(start, start + 5)), max_fraction=0.12
+        )
+        overlays.append(isinstance(store.index, OverlayIndex))
+        assert_consistent(store)
+
+    assert overlays == [True, True, False, True]
+    assert index_kind(store.index) == index_type
+    assert store.index.ntotal == 205
+    assert len(store.index_to_docstore_id) == 200 == len(lexical)
@@ -0,0 +1,39 @@
+import time
+
+from query_cache import QueryCache, normalize_query
+
+
+def test_normalize_query_ignores_case_and_whitespace():
+    assert normalize_query("  Strict   Math\tTeacher ") == "strict math teacher"
+
+
+def test_hits_misses_and_lru_eviction():
+    cache = QueryCache(maxsize=2, ttl=60)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (2, 2, 2)
+
+
+def test_entries_expire_after_ttl():
+    cache = QueryCache(maxsize=4, ttl=0.05)
+    cache.set("a", 1)
+    time.sleep(0.1)
+    assert cache.get("a") is None
+
+
+def test_clear_and_disabled_cache():
+    cache = QueryCache(maxsize=4, ttl=60)
+    cache.set("a", 1)
+    cache.clear()
+    assert cache.get("a") is None
+
+    disabled = QueryCache(maxsize=0, ttl=60)
+    disabled.set("a", 1)
+    assert disabled.get("a") is None
+    assert disabled.stats()["max_size"] == 0
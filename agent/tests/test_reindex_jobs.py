@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from reindex_jobs import ReindexJobs
+
+
+def _wait(jobs, job_id):
+    for _ in range(500):
+        job = jobs.get(job_id)
+        if job.finished:
+            return job
+        threading.Event().wait(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_job_runs_in_the_background_and_reports_its_result():
+    release = threading.Event()
+    jobs = None
+
+    def run(mode):
+        jobs.report("halfway")
+        release.wait(5)
+        return {"mode": mode, "added": 1}
+
+    jobs = ReindexJobs(run)
+    job = jobs.submit("delta")
+    for _ in range(500):
+        if jobs.get(job.id).progress == "halfway":
+            break
+        threading.Event().wait(0.01)
+    assert jobs.get(job.id).status == "running"
+    assert jobs.stats()["running"] == job.id
+
+    release.set()
+    done = _wait(jobs, job.id)
+    assert done.status == "succeeded"
+    assert done.result == {"mode": "delta", "added": 1}
+    assert done.started_at and done.finished_at
+
+
+def test_queued_job_of_the_same_mode_is_reused():
+    release = threading.Event()
+    jobs = ReindexJobs(lambda mode: release.wait(5) and {"mode": mode})
+    running = jobs.submit("delta")
+    queued = jobs.submit("delta")
+    assert jobs.submit("delta").id == queued.id
+    assert jobs.submit("full").id != queued.id
+
+    release.set()
+    for job in (running, queued):
+        assert _wait(jobs, job.id).status == "succeeded"
+
+
+def test_failed_job_records_the_error():
+    def run(mode):
+        raise RuntimeError("mongo down")
+
+    jobs = ReindexJobs(run)
+    job = _wait(jobs, jobs.submit("full").id)
+    assert (job.status, job.error, job.result) == ("failed", "mongo down", None)
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        ReindexJobs(lambda mode: {}).submit("partial")
+
+
+def test_shared_jobs_run_from_files_and_interrupted_jobs_fail(tmp_path):
+    ran = []
+    builder = ReindexJobs(lambda mode: ran.append(mode) or {"mode": mode}, directory=tmp_path)
+    reader = ReindexJobs(lambda mode: {}, directory=tmp_path)
+
+    job = reader.submit("delta")
+    assert builder.get(job.id).status == "queued"
+    builder.run_pending()
+    assert ran == ["delta"]
+    assert reader.get(job.id).status == "succeeded"
+
+    stuck = reader.submit("full")
+    stuck.status = "running"
+    reader._save(stuck)
+    builder.fail_interrupted()
+    assert reader.get(stuck.id).status == "failed"
+
+
+def test_old_finished_jobs_are_pruned():
+    jobs = ReindexJobs(lambda mode: {}, keep=2)
+    ids = [_wait(jobs, jobs.submit("delta").id).id for _ in range(4)]
+    remaining = [job.id for job in jobs.list()]
+    assert ids[-1] in remaining and ids[0] not in remaining
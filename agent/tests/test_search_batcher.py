@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from search_batcher import SearchBatcher
+
+
+def _batcher(max_batch=8):
+    calls = []
+
+    async def search_many(group, queries, vectors):
+        calls.append((group, list(queries)))
+        if "bad" in queries:
+            raise RuntimeError("search failed")
+        return [f"{group}:{query}:{vector}" for query, vector in zip(queries, vectors)]
+
+    return SearchBatcher(search_many, max_batch), calls
+
+
+def test_searches_submitted_together_run_as_one_batch_per_group():
+    batcher, calls = _batcher()
+
+    async def main():
+        return await asyncio.gather(
+            batcher.search("g1", "a", 1), batcher.search("g2", "b", 2), batcher.search("g1", "c", 3)
+        )
+
+    assert asyncio.run(main()) == ["g1:a:1", "g2:b:2", "g1:c:3"]
+    assert sorted(calls) == [("g1", ["a", "c"]), ("g2", ["b"])]
+    assert batcher.stats() == {"requests": 3, "batches": 2, "mean_batch": 1.5, "largest_batch": 2}
+
+
+def test_batches_are_split_at_max_batch():
+    batcher, calls = _batcher(max_batch=2)
+
+    async def main():
+        return await asyncio.gather(*(batcher.search("g", str(i), i) for i in range(5)))
+
+    assert len(asyncio.run(main())) == 5
+    assert [len(queries) for _, queries in calls] == [2, 2, 1]
+
+
+def test_lone_search_is_not_held_back():
+    batcher, _ = _batcher()
+    assert asyncio.run(asyncio.wait_for(batcher.search("g", "a", 1), 0.5)) == "g:a:1"
+
+
+def test_failed_batch_fails_each_of_its_searches():
+    batcher, _ = _batcher()
+
+    async def main():
+        return await asyncio.gather(
+            batcher.search("g", "a", 1), batcher.search("g", "bad", 2), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(batcher.search("g", "bad", 1))
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_run():
+    flight = SingleFlight()
+    runs = []
+
+    async def compute(value):
+        runs.append(value)
+        await asyncio.sleep(0.01)
+        return value * 2
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", compute, 21) for _ in range(5)))
+
+    assert asyncio.run(main()) == [42] * 5
+    assert runs == [21]
+    assert flight.stats()["coalesced"] == 4
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_distinct_keys_run_separately():
+    flight = SingleFlight()
+
+    async def compute(value):
+        await asyncio.sleep(0)
+        return value
+
+    async def main():
+        return await asyncio.gather(flight.do("a", compute, 1), flight.do("b", compute, 2))
+
+    assert asyncio.run(main()) == [1, 2]
+    assert flight.stats()["executions"] == 2
+
+
+def test_error_reaches_every_waiter_and_is_not_kept():
+    flight = SingleFlight()
+    attempts = []
+
+    async def compute():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise RuntimeError("boom")
+        return "ok"
+
+    async def main():
+        results = await asyncio.gather(
+            *(flight.do("key", compute) for _ in range(3)), return_exceptions=True
+        )
+        return results, await flight.do("key", compute)
+
+    results, retried = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retried == "ok"
+    assert flight.stats()["errors"] == 1
+
+
+def test_cancelled_caller_does_not_cancel_shared_run():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("key", compute))
+        second = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"
@@ -0,0 +1,115 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+from bson import ObjectId
+
+from ann_index import OverlayIndex, search_index
+from conftest import build, delta_sync, make_documents
+from lexical_index import BM25Index
+from snapshot import SnapshotError, current_version, load_snapshot, save_snapshot
+from teacher_index import TeacherIndex
+
+MODEL = "models/test-embedding"
+
+
+def sync_state(store):
+    return {
+        "last_id": ObjectId(),
+        "last_synced_at": datetime.now(timezone.utc),
+        "doc_hashes": {doc_id: "hash" for doc_id in store.index_to_docstore_id.values()},
+        "retry_ids": ["r00001"],
+        "deletes_resume_token": {"_data": "token"},
+        "last_delete_scan_at": None,
+    }
+
+
+def save(store, directory, lexical=None):
+    lexical = lexical or BM25Index.from_documents(store.docstore.documents())
+    teachers = TeacherIndex.from_vector_store(store)
+    state = sync_state(store)
+    manifest = save_snapshot(store, state, directory, MODEL, teachers, lexical)
+    return manifest, state
+
+
+def assert_same_store(loaded, store):
+    assert loaded.index_to_docstore_id == store.index_to_docstore_id
+    assert loaded.index.ntotal == store.index.ntotal
+    for doc_id in list(store.index_to_docstore_id.values())[::25]:
+        original, copy = store.docstore.search(doc_id), loaded.docstore.search(doc_id)
+        assert (copy.page_content, copy.metadata) == (original.page_content, original.metadata)
+    queries = np.array(
+        store.embedding_function.embed_documents(["homework", "exams"]), dtype=np.float32
+    )
+    assert (search_index(loaded.index, queries, 5)[1] == search_index(store.index, queries, 5)[1]).all()
+
+
+@pytest.mark.parametrize("index_type", ("flat", "ivf", "hnsw"))
+@pytest.mark.parametrize("read_only", (False, True))
+def test_round_trip(embeddings, tmp_path, index_type, read_only):
+    store, _ = build(embeddings, range(120), index_type)
+    manifest, state = save(store, tmp_path)
+    assert manifest["documents"] == 120
+    assert (manifest["index_type"], manifest["overlay"]) == (index_type, False)
+
+    loaded, loaded_state, _, (teachers, lexical) = load_snapshot(
+        embeddings, tmp_path, MODEL, index_type=index_type, read_only=read_only, verify=True
+    )
+    assert_same_store(loaded, store)
+    assert loaded_state == state
+    assert len(lexical) == 120
+    rebuilt = BM25Index.from_documents(store.docstore.documents())
+    assert lexical.search("homework", 3) == rebuilt.search("homework", 3)
+    assert teachers is not None
+
+
+@pytest.mark.parametrize("read_only", (False, True))
+def test_overlay_round_trip(embeddings, tmp_path, read_only):
+    store, _ = build(embeddings, range(120))
+    lexical = BM25Index.from_documents(store.docstore.documents())
+    stale = [doc.id for doc in store.docstore.documents()][:4]
+    synced, synced_lexical = delta_sync(store, lexical, stale[:3], make_documents(range(120, 124)), 0.5)
+    assert isinstance(synced.index, OverlayIndex)
+    manifest, _ = save(synced, tmp_path, synced_lexical)
+    assert manifest["overlay"] and manifest["documents"] == 121
+
+    loaded, _, _, (_, loaded_lexical) = load_snapshot(
+        embeddings, tmp_path, MODEL, index_type="flat", read_only=read_only
+    )
+    assert isinstance(loaded.index, OverlayIndex)
+    assert_same_store(loaded, synced)
+    assert len(loaded_lexical) == 121
+
+    # A writable load can be synced again; a read-only one is replaced by a full load
+    if not read_only:
+        again, _ = delta_sync(loaded, loaded_lexical, stale[3:4], make_documents([124]), 0.5)
+        assert len(again.index_to_docstore_id) == 121
+
+
+def test_versions_are_published_and_pruned(embeddings, tmp_path):
+    store, _ = build(embeddings, range(20))
+    versions = [save(store, tmp_path)[0]["version"] for _ in range(5)]
+    assert current_version(tmp_path) == versions[-1]
+    assert sorted(path.name for path in tmp_path.glob("v*")) == sorted(versions[-3:])
+
+
+def test_unusable_snapshots_raise(embeddings, tmp_path):
+    with pytest.raises(SnapshotError):
+        load_snapshot(embeddings, tmp_path, MODEL)
+
+    store, _ = build(embeddings, range(20))
+    manifest, _ = save(store, tmp_path)
+    with pytest.raises(SnapshotError):
+        load_snapshot(embeddings, tmp_path, "models/other-embedding")
+    with pytest.raises(SnapshotError):
+        load_snapshot(embeddings, tmp_path, MODEL, index_type="hnsw")
+
+    index_file = tmp_path / manifest["version"] / "index.faiss"
+    data = bytearray(index_file.read_bytes())
+    data[-1] ^= 0xFF
+    index_file.write_bytes(bytes(data))
+    with pytest.raises(SnapshotError):
+        load_snapshot(embeddings, tmp_path, MODEL, index_type="flat", verify=True)
+    index_file.write_bytes(bytes(data[:-8]))
+    with pytest.raises(SnapshotError):
+        load_snapshot(embeddings, tmp_path, MODEL, index_type="flat")
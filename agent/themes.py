@@ -0,0 +1,111 @@
+"""Theme lexicon and per-review theme features.
+
+Each review's theme counts are computed once when it is converted into a
+vector store document and stored in its metadata next to the lexicon
+version that produced them:
+
+    {"themes": {"clear": 1, "helpful": 2}, "themeLexicon": "3f9a..."}
+
+Teacher stats and the teacher index aggregate these counts instead of
+scanning review text per request. Set THEME_LEXICON_PATH to a JSON file of
+the form ``{"positive": [...], "negative": [...]}`` to change the lexicon;
+reviews tagged with another version are recomputed at startup.
+"""
+
+import hashlib
+import json
+import re
+
+from settings import THEME_LEXICON_PATH
+
+# Words counted as positive or negative signals in review text
+POSITIVE_THEMES = [
+    "excellent",
+    "great",
+    "amazing",
+    "wonderful",
+    "helpful",
+    "clear",
+    "engaging",
+    "knowledgeable",
+]
+NEGATIVE_THEMES = [
+    "difficult",
+    "hard",
+    "confusing",
+    "boring",
+    "unclear",
+    "unhelpful",
+]
+
+
+class ThemeLexicon:
+    """Positive and negative theme terms compiled into one word-boundary regex"""
+
+    def __init__(self, positive, negative):
+        self.positive = frozenset(term.lower() for term in positive)
+        self.negative = frozenset(term.lower() for term in negative)
+        canonical = json.dumps(
+            {"positive": sorted(self.positive), "negative": sorted(self.negative)}
+        )
+        self.version = hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+        # Longest first, so multi-word terms win over their prefixes
+        terms = sorted(self.positive | self.negative, key=len, reverse=True)
+        self._pattern = re.compile(
+            r"\b(" + "|".join(re.escape(term) for term in terms) + r")\b"
+            if terms
+            else r"(?!)"
+        )
+
+    def count(self, text) -> dict:
+        """Count whole-word theme occurrences in one pass over the text"""
+        counts = {}
+        for match in self._pattern.finditer((text or "").lower()):
+            term = match.group(1)
+            counts[term] = counts.get(term, 0) + 1
+        return counts
+
+    def polarity(self, themes) -> tuple:
+        """(positive, negative) mention totals for a theme count dict"""
+        positive = sum(count for term, count in themes.items() if term in self.positive)
+        negative = sum(count for term, count in themes.items() if term in self.negative)
+        return positive, negative
+
+
+def load_lexicon(path=THEME_LEXICON_PATH) -> ThemeLexicon:
+    """The configured lexicon, or the built-in one when no path is set"""
+    if not path:
+        return ThemeLexicon(POSITIVE_THEMES, NEGATIVE_THEMES)
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    return ThemeLexicon(config.get("positive", []), config.get("negative", []))
+
+
+DEFAULT_LEXICON = ThemeLexicon(POSITIVE_THEMES, NEGATIVE_THEMES)
+LEXICON = load_lexicon()
+
+
+def extract_themes(text) -> dict:
+    """Count whole-word theme occurrences in a review"""
+    return LEXICON.count(text)
+
+
+def theme_features(review_text) -> dict:
+    """Metadata fields holding a review's theme counts and lexicon version"""
+    return {"themes": LEXICON.count(review_text), "themeLexicon": LEXICON.version}
+
+
+def review_themes(metadata) -> dict:
+    """Stored theme counts of a review document
+
+    Documents indexed before features were stored were counted with the
+    built-in lexicon, so that is what they are recomputed with.
+    """
+    if "themes" in metadata:
+        return metadata["themes"]
+    return DEFAULT_LEXICON.count(metadata.get("review"))
+
+
+def is_stale(metadata) -> bool:
+    """Whether a document's theme features come from another lexicon"""
+    return metadata.get("themeLexicon") != LEXICON.version
@@ -0,0 +1,153 @@
+"""Typed results and errors of the review tools.
+
+The tools return these objects instead of JSON strings. HTTP endpoints
+serialize ``payload()`` once with orjson; only the agent-facing LangChain
+tools render ``to_text()``, a compact plain-text form that costs the LLM far
+fewer tokens than indented JSON. Failures are raised as ``ToolError``
+subclasses carrying a machine-readable code and an HTTP status.
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import wraps
+from typing import List, Optional
+
+
+class ToolError(Exception):
+    """A tool call that could not produce a result"""
+
+    code = "internal"
+    status_code = 500
+
+
+class NotReadyError(ToolError):
+    code = "not_ready"
+    status_code = 503
+
+
+class InvalidArgumentError(ToolError):
+    code = "invalid_argument"
+    status_code = 400
+
+
+class NotFoundError(ToolError):
+    code = "not_found"
+    status_code = 404
+
+
+@contextmanager
+def tool_errors(message: str):
+    """Re-raise unexpected exceptions as a ToolError prefixed with ``message``"""
+    try:
+        yield
+    except ToolError:
+        raise
+    except Exception as e:
+        raise ToolError(f"{message}: {e}") from e
+
+
+@dataclass
+class ReviewSearch:
+    """Reviews nearest to a query"""
+
+    reviews: List[dict]  # student, teacher, rating, review, content
+    mode: str = "vector"  # how the reviews were retrieved: hybrid, vector or lexical
+
+    def payload(self):
+        return self.reviews
+
+    def to_text(self) -> str:
+        if not self.reviews:
+            return "No relevant reviews found."
+        lines = [f"{len(self.reviews)} relevant reviews:"]
+        for review in self.reviews:
+            lines.append(
+                f"- {review['teacher']} rated {review['rating']} by {review['student']}: "
+                f"{review['review']}"
+            )
+        return "\n".join(lines)
+
+
+@dataclass
+class Recommendations:
+    """Teachers ranked for a query, from nearby reviews or the teacher index"""
+
+    query: str
+    recommendations: List[dict]
+    summary: str
+    reviews_analyzed: Optional[int] = None
+    teachers_ranked: Optional[int] = None
+
+    def payload(self) -> dict:
+        data = {"query": self.query}
+        if self.reviews_analyzed is not None:
+            data["total_reviews_analyzed"] = self.reviews_analyzed
+        if self.teachers_ranked is not None:
+            data["total_teachers_ranked"] = self.teachers_ranked
+        data["recommendations"] = self.recommendations
+        data["summary"] = self.summary
+        return data
+
+    def to_text(self) -> str:
+        if not self.recommendations:
+            return self.summary
+        lines = [self.summary]
+        for rank, teacher in enumerate(self.recommendations, 1):
+            lines.append(
+                f"{rank}. {teacher['teacher_name']} (id {teacher['teacher_id']}): "
+                f"score {teacher['recommendation_score']}, average rating "
+                f"{teacher['average_rating']} from {teacher['review_count']} reviews, "
+                f"themes +{teacher['positive_themes']}/-{teacher['negative_themes']}"
+            )
+        return "\n".join(lines)
+
+
+@dataclass
+class TeacherReviews:
+    """One page of a teacher's reviews with their stats"""
+
+    page: dict  # teacher stats, reviews and next_cursor
+
+    def payload(self) -> dict:
+        return self.page
+
+    def to_text(self) -> str:
+        page = self.page
+        lines = [
+            f"{page.get('teacher_name', 'Unknown')} (id {page['teacher_id']}): average rating "
+            f"{page.get('average_rating', 'N/A')} from {page.get('total_reviews', len(page['reviews']))} reviews"
+        ]
+        if page.get("themes"):
+            themes = sorted(page["themes"].items(), key=lambda item: -item[1])
+            lines.append("Themes: " + ", ".join(f"{term} x{count}" for term, count in themes))
+        for review in page["reviews"]:
+            lines.append(f"- {review['student']} rated {review['rating']}: {review['review']}")
+        if page.get("next_cursor"):
+            lines.append(f"More reviews after cursor {page['next_cursor']}")
+        return "\n".join(lines)
+
+
+def as_text(tool):
+    """Agent-facing wrapper: a tool's compact text, or its error message"""
+
+    @wraps(tool)
+    def run(*args, **kwargs):
+        try:
+            return tool(*args, **kwargs).to_text()
+        except ToolError as e:
+            return str(e)
+
+    return run
+
+
+def as_atext(tool):
+    """Async variant of as_text"""
+
+    @wraps(tool)
+    async def run(*args, **kwargs):
+        try:
+            return (await tool(*args, **kwargs)).to_text()
+        except ToolError as e:
+            return str(e)
+
+    return run
@@ -0,0 +1,149 @@
+"""Top-k search over the review index with metadata prefiltering.
+
+Filters are evaluated against per-row metadata columns (NumPy arrays aligned
+with FAISS row ids) and handed to FAISS as an ``IDSelectorBitmap``, so a
+filtered query returns exactly k matching hits in a single search instead of
+over-fetching and filtering in Python. With an IVF or HNSW index the search
+is approximate, and a very selective filter may need a higher ``effort`` to
+fill all k slots.
+"""
+
+import threading
+
+import numpy as np
+
+from ann_index import search_index
+from columnar_docstore import ColumnarDocstore
+
+FILTER_KEYS = ("teacher_id", "student_id", "min_rating", "max_rating")
+
+
+class FilterColumns:
+    """Metadata arrays indexed by FAISS row id"""
+
+    def __init__(self, teacher_ids, student_ids, ratings):
+        self.teacher_ids = teacher_ids
+        self.student_ids = student_ids
+        self.ratings = ratings
+
+    @classmethod
+    def from_vector_store(cls, vector_store):
+        size = vector_store.index.ntotal
+        docstore = vector_store.docstore
+        if isinstance(docstore, ColumnarDocstore):
+            # Gathered from the docstore columns; only overridden rows are read one by one
+            teacher_ids, student_ids, ratings, rows = docstore.filter_columns(
+                vector_store.index_to_docstore_id, size
+            )
+        else:
+            teacher_ids = np.full(size, -1, dtype=np.int64)
+            student_ids = np.full(size, -1, dtype=np.int64)
+            ratings = np.full(size, np.nan, dtype=np.float32)
+            rows = vector_store.index_to_docstore_id.items()
+        for row, doc_id in rows:
+            teacher_ids[row], student_ids[row], ratings[row] = filter_values(
+                docstore.search(doc_id).metadata
+            )
+        return cls(teacher_ids, student_ids, ratings)
+
+    def mask(self, filters) -> np.ndarray:
+        """Boolean mask of rows matching every filter"""
+        mask = np.ones(len(self.ratings), dtype=bool)
+        if filters.get("teacher_id") is not None:
+            mask &= self.teacher_ids == filters["teacher_id"]
+        if filters.get("student_id") is not None:
+            mask &= self.student_ids == filters["student_id"]
+        # NaN ratings never satisfy a rating bound
+        if filters.get("min_rating") is not None:
+            mask &= self.ratings >= filters["min_rating"]
+        if filters.get("max_rating") is not None:
+            mask &= self.ratings <= filters["max_rating"]
+        return mask
+
+
+def _as_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def filter_values(metadata):
+    """(teacher id, student id, rating) of a review as stored in filter columns"""
+    rating = metadata.get("rating")
+    return (
+        _as_int(metadata.get("teacherId")),
+        _as_int(metadata.get("studentId")),
+        rating if isinstance(rating, (int, float)) else np.nan,
+    )
+
+
+def normalize_filters(filters):
+    """Drop unset filters; returns a hashable tuple usable in cache keys, or None"""
+    if not filters:
+        return None
+    items = tuple(
+        (key, filters[key]) for key in FILTER_KEYS if filters.get(key) is not None
+    )
+    return items or None
+
+
+class FilterColumnsCache:
+    """Builds filter columns once per index version"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key = None
+        self._columns = None
+
+    def get(self, vector_store, version):
+        key = (id(vector_store), version)
+        with self._lock:
+            if self._key != key:
+                self._columns = FilterColumns.from_vector_store(vector_store)
+                self._key = key
+            return self._columns
+
+
+def search_rows(vector_store, embeddings, k, filters=None, columns=None, effort=None):
+    """FAISS (distances, rows) arrays for several query vectors; row -1 marks an empty slot"""
+    index = vector_store.index
+    queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+    no_hits = np.zeros((len(queries), 0), dtype=np.float32)
+    if index.ntotal == 0:
+        return no_hits, no_hits.astype(np.int64)
+
+    mask = None
+    if filters:
+        mask = columns.mask(dict(filters))
+        matches = int(mask.sum())
+        if matches == 0:
+            return no_hits, no_hits.astype(np.int64)
+        k = min(k, matches)
+
+    k = min(k, index.ntotal)
+    return search_index(index, queries, k, mask, effort)
+
+
+def search_by_vectors(vector_store, embeddings, k, filters=None, columns=None, effort=None):
+    """Search several query vectors with one FAISS call
+
+    Returns one list of up to k (Document, distance) pairs per query, in
+    order; the filters apply to every query.
+    """
+    distances, rows = search_rows(vector_store, embeddings, k, filters, columns, effort)
+    docstore = vector_store.docstore
+    mapping = vector_store.index_to_docstore_id
+    return [
+        [
+            (docstore.search(mapping[int(row)]), float(distance))
+            for distance, row in zip(query_distances, query_rows)
+            if row != -1
+        ]
+        for query_distances, query_rows in zip(distances, rows)
+    ]
+
+
+def search_by_vector(vector_store, embedding, k, filters=None, columns=None, effort=None):
+    """Return up to k (Document, distance) pairs matching the filters"""
+    return search_by_vectors(vector_store, [embedding], k, filters, columns, effort)[0]